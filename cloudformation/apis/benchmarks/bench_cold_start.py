@@ -0,0 +1,175 @@
+"""
+コールドスタートのベンチマーク
+
+関数ごとに新しいPythonプロセスで lambda_function を読み込み、
+インポート時間・最初の呼び出し（AWSを呼ばない経路）の時間・インポート時に作成されたクライアント数、
+および遅延作成したクライアント・テーブルを全て作成した場合の時間を計測する。
+AWS_ENDPOINT_URL を到達不能なアドレスに向けるため、誤ってAWSを呼び出すことはない。
+
+    python benchmarks/bench_cold_start.py [--runs 5] [--only Public,Organization]
+    python benchmarks/bench_cold_start.py --save benchmarks/cold_start_baseline.json
+    python benchmarks/bench_cold_start.py --baseline benchmarks/cold_start_baseline.json [--tolerance 0.3]
+
+--baseline を指定すると、インポート時間が許容幅を超えて悪化した関数、
+またはインポート時にクライアントを作成している関数がある場合に終了コード1で終了する。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# 最初の呼び出しに使うイベント（AWSを呼び出さずに応答する経路）。Noneの関数はインポートのみ計測する
+FUNCTIONS = {
+    'Account': {'httpMethod': 'GET', 'path': '/account', 'requestContext': {}},
+    'Bedrock': {'httpMethod': 'OPTIONS', 'resource': '/bedrock/advice', 'path': '/bedrock/advice'},
+    'Member': {'httpMethod': 'OPTIONS', 'resource': '/member', 'path': '/member'},
+    'Organization': {'httpMethod': 'OPTIONS', 'resource': '/organization', 'path': '/organization'},
+    'Payment': {'httpMethod': 'OPTIONS', 'path': '/payment/unknown', 'body': '{}'},
+    'Public': {'httpMethod': 'OPTIONS', 'resource': '/public/organization'},
+    'ReportAggregate': {'Records': []},
+    'SES': {'httpMethod': 'OPTIONS', 'resource': '/ses', 'path': '/ses'},
+    'Schedule': None,
+    'SecureParameter': {'httpMethod': 'OPTIONS', 'resource': '/secure/verify'},
+    'SendRequest': {},
+    'UserTasks': {'httpMethod': 'OPTIONS', 'resource': '/user-tasks', 'path': '/user-tasks'},
+    'WeeklyReport': {'httpMethod': 'OPTIONS', 'resource': '/weekly-report'}
+}
+
+ENVIRONMENT = {
+    'STAGE': 'bench',
+    'TZ': 'Asia/Tokyo',
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'AWS_ENDPOINT_URL': 'http://127.0.0.1:9',
+    'AWS_MAX_ATTEMPTS': '1',
+    'USER_POOL_ID': 'ap-northeast-1_bench',
+    'USER_POOL_REGION': 'ap-northeast-1',
+    'WEB_PUSH_PLATFORM_ARN': 'arn:aws:sns:ap-northeast-1:000000000000:app/GCM/bench',
+    'JWT_SECRET_PARAMETER': '/bench/jwt-secret',
+    'STRIPE_SECRET_KEY': 'sk_test_bench',
+    'INSTRUMENTATION_SAMPLE_RATE': '0'
+}
+
+# 子プロセスで実行する計測スクリプト
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+from common import aws_clients
+
+result = {
+    'importMs': (imported - started) * 1000,
+    'clientsAtImport': len(aws_clients._clients) + len(aws_clients._resources)
+}
+
+event = json.loads(sys.argv[1])
+if event is not None:
+    class Context:
+        aws_request_id = 'bench'
+        function_name = 'bench'
+        def get_remaining_time_in_millis(self):
+            return 30000
+    started = time.perf_counter()
+    try:
+        lambda_function.lambda_handler(event, Context())
+    except Exception as e:
+        result['invokeError'] = type(e).__name__
+    result['firstInvokeMs'] = (time.perf_counter() - started) * 1000
+
+# 遅延作成にしたクライアント・テーブルを全て作成した場合のコスト（AWSを使う最初の要求が負担する分）
+proxies = [value for value in vars(lambda_function).values() if isinstance(value, aws_clients.LazyProxy)]
+started = time.perf_counter()
+for proxy in proxies:
+    proxy._resolve()
+result['lazyClients'] = len(proxies)
+result['clientInitMs'] = (time.perf_counter() - started) * 1000
+print(json.dumps(result))
+'''
+
+def run_once(function, event):
+    env = {**os.environ, **ENVIRONMENT}
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(SRC_DIR, 'layer'), os.path.join(SRC_DIR, function)])
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(event)],
+        cwd=os.path.join(SRC_DIR, function), env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'unknown error'
+        return {'error': error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def measure(function, event, runs):
+    samples = [run_once(function, event) for _ in range(runs)]
+    errors = [sample['error'] for sample in samples if 'error' in sample]
+    if errors:
+        return {'function': function, 'error': errors[0]}
+
+    result = {'function': function}
+    for key in ('importMs', 'firstInvokeMs', 'clientInitMs'):
+        values = [sample[key] for sample in samples if key in sample]
+        if values:
+            result[key] = round(statistics.median(values), 1)
+    result['clientsAtImport'] = max(sample['clientsAtImport'] for sample in samples)
+    result['lazyClients'] = samples[0]['lazyClients']
+    if 'invokeError' in samples[0]:
+        result['invokeError'] = samples[0]['invokeError']
+    return result
+
+def check_regressions(results, baseline, tolerance):
+    failures = []
+    for result in results:
+        if 'error' in result:
+            continue
+        if result['clientsAtImport']:
+            failures.append(f"{result['function']}: {result['clientsAtImport']} client(s) created at import time")
+        previous = baseline.get(result['function'])
+        if previous and 'importMs' in previous and result['importMs'] > previous['importMs'] * (1 + tolerance):
+            failures.append(f"{result['function']}: import {result['importMs']}ms > baseline {previous['importMs']}ms (+{tolerance:.0%})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--only', help='計測する関数名（カンマ区切り）')
+    parser.add_argument('--save', help='結果をベースラインとして保存するファイル')
+    parser.add_argument('--baseline', help='比較するベースラインのファイル')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='インポート時間の許容悪化率')
+    args = parser.parse_args()
+
+    functions = args.only.split(',') if args.only else list(FUNCTIONS)
+    results = [measure(function, FUNCTIONS[function], args.runs) for function in functions]
+
+    for result in results:
+        if 'error' in result:
+            print(f"{result['function']:>16}: skipped ({result['error']})")
+            continue
+        line = f"{result['function']:>16}: import={result['importMs']:7.1f}ms"
+        if 'firstInvokeMs' in result:
+            line += f" firstInvoke={result['firstInvokeMs']:6.1f}ms"
+        line += f" clientsAtImport={result['clientsAtImport']} lazy={result['lazyClients']} clientInit={result['clientInitMs']:6.1f}ms"
+        if 'invokeError' in result:
+            line += f" (invoke raised {result['invokeError']})"
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({result['function']: result for result in results if 'error' not in result}, f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_regressions(results, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+DynamoDBアイテムの数値変換のベンチマーク
+
+入れ子の週次報告アイテムについて、Decimal→floatの変換を
+JSONの往復変換・従来の再帰関数（isinstanceで分岐）・common.dynamo_types で比較する。
+float→Decimal（書き込み前）と、Streamsの低レベル形式の復元も計測する。
+
+    python benchmarks/bench_dynamo_types.py [--reports 300]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'layer'))
+
+from boto3.dynamodb.types import TypeSerializer  # noqa: E402
+from common import dynamo_types  # noqa: E402
+from common.utils import decimal_default_proc  # noqa: E402
+
+def make_item(i):
+    return {
+        'memberUuid': f'0c5f6a3e-8d3b-4b8e-9a40-{i:012d}',
+        'organizationId': 'example-org',
+        'weekString': f'2024-W{i % 52 + 1:02d}',
+        'status': 'approved',
+        'projects': [
+            {'name': '基幹システム刷新プロジェクト', 'workItems': [
+                {'content': '受注管理画面の詳細設計レビュー対応'},
+                {'content': '在庫引当バッチの性能改善と負荷試験の実施'}
+            ]},
+            {'name': '社内問い合わせ対応', 'workItems': [{'content': 'アカウント発行手順の問い合わせ対応'}]}
+        ],
+        'overtimeHours': Decimal('6.5'),
+        'issues': 'レビュー指摘が想定より多く、設計書の修正に時間を要した。',
+        'improvements': '事前にチェックリストを用いてセルフレビューを行う。',
+        'rating': {'achievement': Decimal(3), 'stress': Decimal(2), 'disability': Decimal(3)},
+        'stressHelp': '',
+        'feedbacks': [{'content': '引き続きお願いします。', 'createdAt': '2024-10-04T10:00:00+09:00'}],
+        'createdAt': '2024-10-04T09:00:00+09:00',
+        'approvedAt': '2024-10-05T09:00:00+09:00'
+    }
+
+def json_round_trip(obj):
+    return json.loads(json.dumps(obj, default=decimal_default_proc))
+
+def legacy_replace_decimals(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {k: legacy_replace_decimals(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_replace_decimals(v) for v in obj]
+    return obj
+
+def legacy_float_to_decimal(obj):
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: legacy_float_to_decimal(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_float_to_decimal(v) for v in obj]
+    return obj
+
+def best_ms(func, number=20):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+def report(title, cases):
+    print(title)
+    baseline = None
+    for label, func in cases:
+        ms = best_ms(func)
+        baseline = baseline or ms
+        print(f"  {label:>24}: {ms:7.3f}ms ({baseline / ms:4.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reports', type=int, default=300)
+    args = parser.parse_args()
+
+    items = [make_item(i) for i in range(args.reports)]
+    assert dynamo_types.decimal_to_float(items) == json_round_trip(items)
+    report('Decimal -> float', [
+        ('json round trip', lambda: json_round_trip(items)),
+        ('recursive isinstance', lambda: legacy_replace_decimals(items)),
+        ('decimal_to_float', lambda: dynamo_types.decimal_to_float(items))
+    ])
+
+    floats = dynamo_types.decimal_to_float(items)
+    assert dynamo_types.float_to_decimal(floats) == legacy_float_to_decimal(floats)
+    report('float -> Decimal', [
+        ('recursive isinstance', lambda: legacy_float_to_decimal(floats)),
+        ('float_to_decimal', lambda: dynamo_types.float_to_decimal(floats))
+    ])
+
+    serializer = TypeSerializer()
+    images = [{k: serializer.serialize(v) for k, v in item.items()} for item in items]
+    report('stream image -> item', [
+        ('TypeDeserializer + round trip', lambda: json_round_trip([dynamo_types.deserialize_image(image) for image in images])),
+        ('TypeDeserializer', lambda: [dynamo_types.deserialize_image(image) for image in images]),
+        ('TypeDeserializer + decimal_to_float', lambda: [dynamo_types.decimal_to_float(dynamo_types.deserialize_image(image)) for image in images])
+    ])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+全APIハンドラーのオフラインベンチマーク・回帰テスト
+
+moto（DynamoDB・SES・SNS・SQS・Cognito・SSM）とBedrock・Stripeのフェイクを使い、
+メンバー数10・100・1,000名の組織（それぞれ3年・2年・1年分の報告）に対して
+handler_routes.ROUTES の各ルートを実行する。
+ルート・組織の規模ごとに、レイテンシ（p50・p95）、1リクエストあたりのAWS呼び出し数、
+DynamoDBの読み込み・書き込みユニット（推定値）を出力する。
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_handlers.py [--scales 10,100] [--iterations 20] [--only report.,public.]
+    python benchmarks/bench_handlers.py --iterations 3 --save benchmarks/handler_baseline.json
+    python benchmarks/bench_handlers.py --only payment. --save benchmarks/handler_baseline.json  # 該当ルートのみ更新
+    python benchmarks/bench_handlers.py --baseline benchmarks/handler_baseline.json [--latency-tolerance 0.5]
+
+--baseline を指定すると、AWS呼び出し数・読み込み/書き込みユニットが増えたルート、
+成功していたルートが失敗するようになったルート、
+およびp95レイテンシが許容幅を超えて悪化したルート（--no-latency で無効）がある場合に終了コード1で終了する。
+呼び出し数・ユニットは環境に依存しないため、CIではこちらを主な判定に使う。
+
+規模ごとに別のプロセス・別のmoto環境で実行する。
+motoのGSIのクエリはテーブル全体を走査するため、レイテンシにはmoto自体のコストが含まれ、
+1,000名の組織（投入に1分程度、GSIのクエリ1回に数秒）は --iterations 3 程度で実行する。
+motoのトランザクション（TransactWriteItems）は全テーブルを複製するため、1,000名の組織では1回に20秒・2GB程度かかる。
+メモリが足りない環境では、トランザクションを使うルート（public.report.post・put）の1,000名を --iterations 1 で別に実行する。
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import handler_fixtures
+from handler_fixtures import Context, Environment, FakeStripeHttpClient, load_function, quiet
+from handler_routes import ROUTES
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(ratio * (len(ordered) - 1))))
+    return ordered[index]
+
+def load_functions(names, recorder):
+    """関数を読み込む（依存パッケージがない関数はスキップの理由を返す）"""
+    modules, skipped = {}, {}
+    for name in sorted(set(names)):
+        try:
+            module = load_function(name)
+        except ImportError as e:
+            skipped[name] = f'{type(e).__name__}: {e}'
+            continue
+        if name == 'Payment':
+            module.stripe.default_http_client = module.InstrumentedHttpClient(FakeStripeHttpClient(recorder))
+        modules[name] = module
+    return modules, skipped
+
+def run_route(route, module, org, recorder, iterations, warmup):
+    event = route.event(org)
+    latencies, calls, reads, writes, statuses = [], [], [], [], set()
+
+    for index in range(warmup + iterations):
+        if route.setup:
+            route.setup(org)
+        recorder.reset()
+        measured = index >= warmup
+        recorder.enabled = measured
+        started = time.perf_counter()
+        with quiet():
+            try:
+                response = module.lambda_handler(json.loads(json.dumps(event)), Context())
+                status = response.get('statusCode', 200) if isinstance(response, dict) else 200
+            except Exception as e:
+                status = type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+        recorder.enabled = False
+        if measured:
+            latencies.append(elapsed)
+            calls.append(dict(recorder.calls))
+            reads.append(recorder.read_units)
+            writes.append(recorder.write_units)
+            statuses.add(status)
+
+    # 呼び出し数・ユニットは反復ごとに同じになる想定だが、揺れる場合は最大値を採る
+    call_counts = {}
+    for sample in calls:
+        for name, count in sample.items():
+            call_counts[name] = max(call_counts.get(name, 0), count)
+    return {
+        'p50Ms': round(statistics.median(latencies), 2),
+        'p95Ms': round(percentile(latencies, 0.95), 2),
+        'calls': sum(call_counts.values()),
+        'callsByOperation': dict(sorted(call_counts.items())),
+        'rcu': round(max(reads), 1),
+        'wcu': round(max(writes), 1),
+        'status': sorted(str(s) for s in statuses)
+    }
+
+def is_success(statuses):
+    return all(s.isdigit() and int(s) < 400 for s in statuses)
+
+def check_regressions(results, baseline, latency_tolerance):
+    failures = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if not previous or 'skipped' in result or 'skipped' in previous:
+            continue
+        for metric in ('calls', 'rcu', 'wcu'):
+            if result[metric] > previous[metric]:
+                failures.append(f"{key}: {metric} {result[metric]} > baseline {previous[metric]} {result['callsByOperation'] if metric == 'calls' else ''}".rstrip())
+        if is_success(previous['status']) and not is_success(result['status']):
+            failures.append(f"{key}: status {result['status']} (baseline {previous['status']})")
+        if latency_tolerance is not None and result['p95Ms'] > previous['p95Ms'] * (1 + latency_tolerance):
+            failures.append(f"{key}: p95 {result['p95Ms']}ms > baseline {previous['p95Ms']}ms (+{latency_tolerance:.0%})")
+    return failures
+
+def run_scale(members, args, routes):
+    """1つの規模の組織を投入して全ルートを実行する（motoのGSIのクエリはテーブル全体を走査するため、規模ごとに環境を分ける）"""
+    started = time.perf_counter()
+    env = Environment([members], args.years).start()
+    print(f"seeded {members} member organization in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    try:
+        modules, skipped = load_functions([route.function for route in routes], env.recorder)
+        results = {}
+        for route in routes:
+            key = f'{route.name}@{members}'
+            if route.function in skipped:
+                results[key] = {'skipped': skipped[route.function]}
+                continue
+            results[key] = run_route(route, modules[route.function], env.organizations[members], env.recorder, args.iterations, args.warmup)
+        return results
+    finally:
+        env.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default=','.join(str(s) for s in handler_fixtures.SCALES), help='組織のメンバー数（カンマ区切り）')
+    parser.add_argument('--years', type=int, help='報告の年数（既定は規模ごとの値）')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--only', help='実行するルート名の前方一致（カンマ区切り）')
+    parser.add_argument('--save', help='結果をベースラインとして保存するファイル')
+    parser.add_argument('--baseline', help='比較するベースラインのファイル')
+    parser.add_argument('--latency-tolerance', type=float, default=0.5, help='p95レイテンシの許容悪化率')
+    parser.add_argument('--no-latency', action='store_true', help='レイテンシを回帰の判定に使わない')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(',')]
+    prefixes = args.only.split(',') if args.only else None
+    routes = [route for route in ROUTES if not prefixes or any(route.name.startswith(p) for p in prefixes)]
+
+    if args.worker:
+        # handlerのログは計測の妨げになるため抑止する
+        logging.disable(logging.CRITICAL)
+        print(json.dumps(run_scale(scales[0], args, routes)))
+        return
+
+    results = {}
+    for members in scales:
+        command = [sys.executable, os.path.abspath(__file__), '--worker', '--scales', str(members),
+                   '--iterations', str(args.iterations), '--warmup', str(args.warmup)]
+        if args.years:
+            command += ['--years', str(args.years)]
+        if args.only:
+            command += ['--only', args.only]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+        results.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    # ルート順に並べ替えて表示する
+    order = {route.name: index for index, route in enumerate(routes)}
+    results = dict(sorted(results.items(), key=lambda item: (order[item[0].split('@')[0]], int(item[0].split('@')[1]))))
+
+    for key, result in results.items():
+        if 'skipped' in result:
+            print(f"{key:>44}: skipped ({result['skipped']})")
+            continue
+        print(
+            f"{key:>44}: p50={result['p50Ms']:8.2f}ms p95={result['p95Ms']:8.2f}ms "
+            f"calls={result['calls']:4d} rcu={result['rcu']:7.1f} wcu={result['wcu']:5.1f} status={','.join(result['status'])}"
+        )
+
+    if args.save:
+        saved = {}
+        if (args.only or args.scales != parser.get_default('scales')) and os.path.exists(args.save):
+            # 一部のルート・規模のみ実行した場合は、既存のベースラインの該当部分だけを更新する
+            with open(args.save) as f:
+                saved = json.load(f)
+        saved.update(results)
+        with open(args.save, 'w') as f:
+            json.dump(saved, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_regressions(results, baseline, None if args.no_latency else args.latency_tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
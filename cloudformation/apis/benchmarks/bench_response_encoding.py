@@ -0,0 +1,85 @@
+"""
+レスポンスエンコードのベンチマーク
+
+DynamoDBから読み込んだ形（数値がDecimal）の週次報告一覧について、
+従来の create_response（json.dumps + default関数、ASCIIエスケープ）と
+現在のエンコーダー（標準json・orjson）の出力サイズ・時間、および圧縮後のサイズ・時間を比較する。
+
+    python benchmarks/bench_response_encoding.py [--members 50] [--weeks 12]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'layer'))
+
+from common import utils  # noqa: E402
+
+def make_reports(members, weeks):
+    """メンバー×週の週次報告（export・stats相当の一覧）を生成する"""
+    reports = []
+    for m in range(members):
+        for w in range(weeks):
+            reports.append({
+                'memberUuid': f'0c5f6a3e-8d3b-4b8e-9a40-{m:012d}',
+                'organizationId': 'example-org',
+                'weekString': f'2024-W{w + 1:02d}',
+                'status': 'approved',
+                'projects': [
+                    {'name': '基幹システム刷新プロジェクト', 'workItems': [
+                        {'content': '受注管理画面の詳細設計レビュー対応'},
+                        {'content': '在庫引当バッチの性能改善と負荷試験の実施'}
+                    ]},
+                    {'name': '社内問い合わせ対応', 'workItems': [{'content': 'アカウント発行手順の問い合わせ対応'}]}
+                ],
+                'overtimeHours': Decimal('6.5') + w,
+                'issues': 'レビュー指摘が想定より多く、設計書の修正に時間を要した。',
+                'improvements': '事前にチェックリストを用いてセルフレビューを行う。',
+                'rating': {'achievement': Decimal(3 + w % 2), 'stress': Decimal(2 + w % 3), 'disability': Decimal(3)},
+                'stressHelp': '',
+                'feedbacks': [{'content': '引き続きお願いします。', 'createdAt': '2024-10-04T10:00:00+09:00'}],
+                'createdAt': '2024-10-04T09:00:00+09:00',
+                'approvedAt': '2024-10-05T09:00:00+09:00'
+            })
+    return reports
+
+def legacy_encode(body):
+    return json.dumps(body, default=utils.decimal_default_proc).encode('utf-8')
+
+def best_time(func, number=20):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--weeks', type=int, default=12)
+    args = parser.parse_args()
+
+    body = {'reports': make_reports(args.members, args.weeks)}
+    encoders = [('legacy', legacy_encode), ('stdlib', utils._encode_json_stdlib)]
+    if utils.orjson is not None:
+        encoders.append(('orjson', utils._encode_json_orjson))
+    else:
+        print('orjson is not installed; skipping')
+
+    baseline = None
+    for label, encoder in encoders:
+        data = encoder(body)
+        assert json.loads(data) == json.loads(legacy_encode(body))
+        ms = best_time(lambda: encoder(body))
+        baseline = baseline or ms
+        print(f"{label:>8}: bytes={len(data):9d} encode={ms:7.2f}ms ({baseline / ms:4.1f}x)")
+
+    data = utils.encode_json(body)
+    for label, encoding in [('gzip', 'gzip')] + ([('br', 'br')] if utils.brotli is not None else []):
+        compressed = utils.compress_body(data, encoding)
+        ms = best_time(lambda: utils.compress_body(data, encoding))
+        print(f"{label:>8}: bytes={len(compressed):9d} ({len(compressed) / len(data):.0%}) compress={ms:7.2f}ms")
+    ms = best_time(lambda: utils.create_response(200, body, accept_encoding='gzip'))
+    print(f"create_response (compression {'on' if utils.RESPONSE_COMPRESSION_ENABLED else 'off'}): {ms:.2f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+サマリープロンプトのベンチマーク
+
+従来形式（報告をそのままJSONで列挙）と簡潔形式のプロンプトについて、
+概算入力トークン数とプロンプト生成時間を比較する。
+--live を指定するとBedrockを実際に呼び出し、応答時間も比較する（AWS認証情報が必要）。
+
+    python benchmarks/bench_summary_prompt.py [--weeks 6] [--budget 1500] [--live]
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'Bedrock'))
+
+from prompt_generator import create_summary_prompt  # noqa: E402
+from summary_serializer import estimate_tokens  # noqa: E402
+
+def make_reports(weeks):
+    """Bedrock関数が受け取る形（replace_decimals後）の週次報告を生成する"""
+    reports = []
+    for i in range(weeks):
+        week = f'2024-W{40 + i:02d}'
+        if i == 2:
+            reports.append({'memberUuid': 'm-1', 'weekString': week, 'status': 'none'})
+            continue
+        reports.append({
+            'memberUuid': '0c5f6a3e-8d3b-4b8e-9a40-2f1d3c4b5a6e',
+            'organizationId': 'example-org',
+            'weekString': week,
+            'status': 'approved',
+            'projects': [
+                {'name': '基幹システム刷新プロジェクト', 'workItems': [
+                    {'content': f'受注管理画面の詳細設計レビュー対応（{i + 1}回目）'},
+                    {'content': '在庫引当バッチの性能改善と負荷試験の実施'}
+                ]},
+                {'name': '社内問い合わせ対応', 'workItems': [
+                    {'content': 'アカウント発行手順の問い合わせ対応'}
+                ]}
+            ],
+            'overtimeHours': 6.5 + i,
+            'issues': 'レビュー指摘が想定より多く、設計書の修正に時間を要した。' * 3,
+            'improvements': '事前にチェックリストを用いてセルフレビューを行い、指摘件数を減らす。' * 2,
+            'rating': {'achievement': 3 + i % 2, 'stress': 2 + i % 3, 'disability': 3},
+            'stressHelp': '業務量の調整について相談したい。' if i % 2 else '',
+            'feedbacks': [
+                {'content': '設計レビューの進め方は良かったです。引き続きお願いします。', 'createdAt': '2024-10-04T10:00:00+09:00'}
+            ],
+            'createdAt': '2024-10-04T09:00:00+09:00',
+            'approvedAt': '2024-10-05T09:00:00+09:00'
+        })
+    return reports
+
+def measure(label, build, live):
+    prompt = build()
+    seconds = min(timeit.repeat(build, number=200, repeat=5)) / 200
+    result = {
+        'label': label,
+        'chars': len(prompt),
+        'tokens': estimate_tokens(prompt),
+        'buildMs': seconds * 1000
+    }
+    if live:
+        from bedrock_client import invoke_claude
+        started = time.monotonic()
+        invoke_claude(prompt)
+        result['invokeMs'] = (time.monotonic() - started) * 1000
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weeks', type=int, default=6)
+    parser.add_argument('--budget', type=int, default=1500)
+    parser.add_argument('--live', action='store_true')
+    args = parser.parse_args()
+
+    reports = make_reports(args.weeks)
+    results = [
+        measure('json', lambda: create_summary_prompt(reports, report_format='json'), args.live),
+        measure('compact', lambda: create_summary_prompt(reports, report_format='compact', token_budget=args.budget), args.live)
+    ]
+
+    baseline = results[0]
+    for result in results:
+        line = f"{result['label']:>8}: chars={result['chars']:6d} tokens~{result['tokens']:6d} ({result['tokens'] / baseline['tokens']:.0%}) build={result['buildMs']:.3f}ms"
+        if 'invokeMs' in result:
+            line += f" invoke={result['invokeMs']:.0f}ms"
+        print(line)
+
+if __name__ == '__main__':
+    main()
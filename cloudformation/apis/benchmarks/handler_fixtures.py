@@ -0,0 +1,653 @@
+"""
+ハンドラーベンチマークのローカル環境
+
+moto でDynamoDB・SES・SNS・SQS・Cognito・SSMを、フェイクでBedrock・Stripeを置き換え、
+resources/template.yaml と同じ定義のテーブルに合成データを投入する。
+AWS呼び出しの回数と、DynamoDBの読み込み・書き込みユニットの推定値を記録する。
+"""
+import hashlib
+import hmac
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APIS_DIR = os.path.join(BENCH_DIR, '..')
+SRC_DIR = os.path.join(APIS_DIR, 'src')
+RESOURCES_TEMPLATE = os.path.join(APIS_DIR, '..', 'resources', 'template.yaml')
+
+STAGE = 'bench'
+REGION = 'ap-northeast-1'
+SENDER = 'no-reply@example.com'
+
+# handlerの読み込み前に設定する環境変数（AWSの資格情報はダミー）
+ENVIRONMENT = {
+    'STAGE': STAGE,
+    'TZ': 'Asia/Tokyo',
+    'AWS_DEFAULT_REGION': REGION,
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'INSTRUMENTATION_SAMPLE_RATE': '0',
+    'BEDROCK_STREAMING_ENABLED': 'false',
+    'JWT_SECRET_PARAMETER': f'/weekly-report/{STAGE}/jwt-secret-key',
+    'STRIPE_SECRET_KEY': 'sk_test_bench',
+    'STRIPE_WEBHOOK_SECRET': 'whsec_bench'
+}
+
+# 組織の規模（メンバー数・報告の年数）
+SCALES = {
+    10: 3,
+    100: 2,
+    1000: 1
+}
+
+# ------------------------------------------------------------------
+# テーブル定義
+# ------------------------------------------------------------------
+
+class _TemplateLoader(yaml.SafeLoader):
+    """CloudFormationの短縮形の関数（!Sub など）を値のまま読み込むローダー"""
+
+def _construct_tag(loader, suffix, node):
+    if isinstance(node, yaml.ScalarNode):
+        return loader.construct_scalar(node)
+    if isinstance(node, yaml.SequenceNode):
+        return loader.construct_sequence(node, deep=True)
+    return loader.construct_mapping(node, deep=True)
+
+_TemplateLoader.add_multi_constructor('!', _construct_tag)
+
+def load_table_definitions():
+    """resources/template.yaml からDynamoDBテーブルの定義を読み込む"""
+    with open(RESOURCES_TEMPLATE) as f:
+        template = yaml.load(f, Loader=_TemplateLoader)
+
+    definitions = []
+    for resource in template['Resources'].values():
+        if resource.get('Type') != 'AWS::DynamoDB::Table':
+            continue
+        properties = resource['Properties']
+        definition = {
+            'TableName': properties['TableName'].replace('${Stage}', STAGE),
+            'KeySchema': properties['KeySchema'],
+            'AttributeDefinitions': properties['AttributeDefinitions'],
+            'BillingMode': 'PAY_PER_REQUEST'
+        }
+        if properties.get('GlobalSecondaryIndexes'):
+            definition['GlobalSecondaryIndexes'] = [
+                {'IndexName': index['IndexName'], 'KeySchema': index['KeySchema'], 'Projection': index['Projection']}
+                for index in properties['GlobalSecondaryIndexes']
+            ]
+        if properties.get('StreamSpecification'):
+            definition['StreamSpecification'] = {'StreamEnabled': True, **properties['StreamSpecification']}
+        definitions.append(definition)
+    return definitions
+
+# ------------------------------------------------------------------
+# DynamoDBのキャパシティ推定
+# ------------------------------------------------------------------
+
+def attribute_value_size(value):
+    """型付き形式（{'S': ...}）の属性値のサイズ（バイト）"""
+    (kind, data), = value.items()
+    if kind == 'S':
+        return len(data.encode('utf-8'))
+    if kind == 'N':
+        digits = len(data.lstrip('-').replace('.', '').strip('0')) or 1
+        return (digits + 1) // 2 + 1
+    if kind == 'B':
+        return len(data) * 3 // 4
+    if kind in ('BOOL', 'NULL'):
+        return 1
+    if kind == 'SS':
+        return sum(len(v.encode('utf-8')) for v in data)
+    if kind == 'NS':
+        return sum(attribute_value_size({'N': v}) for v in data)
+    if kind == 'BS':
+        return sum(len(v) * 3 // 4 for v in data)
+    if kind == 'M':
+        return 3 + sum(len(k.encode('utf-8')) + attribute_value_size(v) + 1 for k, v in data.items())
+    if kind == 'L':
+        return 3 + sum(attribute_value_size(v) + 1 for v in data)
+    return 0
+
+def item_size(item):
+    return sum(len(name.encode('utf-8')) + attribute_value_size(value) for name, value in item.items())
+
+def read_units(size, consistent=False):
+    return max(1, math.ceil(size / 4096)) * (1.0 if consistent else 0.5)
+
+def write_units(size):
+    return max(1, math.ceil(size / 1024))
+
+class CallRecorder:
+    """
+    botocoreのイベントでAWS呼び出しの回数を数え、DynamoDBの消費ユニットを推定する
+
+    読み込みは返却されたアイテムのキーからmotoに保存された完全なアイテムのサイズを引き
+    （射影しても基本テーブルの読み込みユニットは減らないため）、
+    キーを含まない射影・KEYS_ONLYのインデックスでは返却されたサイズを使う。
+    書き込みは変更前後の大きい方のサイズで算出し、トランザクションは2倍とする。
+    """
+
+    def __init__(self):
+        from moto.core import DEFAULT_ACCOUNT_ID
+        from moto.dynamodb.models import dynamodb_backends
+        self._backend = dynamodb_backends[DEFAULT_ACCOUNT_ID][REGION]
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.read_units = 0.0
+        self.write_units = 0.0
+
+    def record(self, name, count=1):
+        """botocoreを通らない呼び出し（Stripeのフェイクなど）を記録する"""
+        if self.enabled:
+            self.calls[name] += count
+
+    def install(self, events):
+        events.register('before-call', self._before_call, unique_id='bench-recorder-before-call')
+        events.register('after-call', self._after_call, unique_id='bench-recorder-after-call')
+
+    # --- botocoreイベント ---
+
+    def _before_call(self, params, model, context, **kwargs):
+        if not self.enabled:
+            return
+        service = model.service_model.service_name
+        self.calls[f'{service}.{model.name}'] += 1
+        if service == 'dynamodb':
+            request = json.loads(params['body'] or b'{}')
+            context['bench_request'] = request
+            context['bench_old_sizes'] = self._old_sizes(model.name, request)
+
+    def _after_call(self, http_response, model, context, **kwargs):
+        request = context.get('bench_request')
+        if not self.enabled or request is None or http_response.status_code >= 300:
+            return
+        # parsed はリソースAPIで復元済みの場合があるため、低レベル形式の応答本文を使う
+        response = json.loads(http_response.content or b'{}')
+        reads, writes = self._consumed_units(model.name, request, response, context.get('bench_old_sizes', {}))
+        self.read_units += reads
+        self.write_units += writes
+
+    # --- サイズの参照 ---
+
+    def _table(self, table_name):
+        return self._backend.get_table(table_name)
+
+    def _stored_size(self, table_name, key):
+        from moto.dynamodb.models.dynamo_type import DynamoType
+        table = self._table(table_name)
+        hash_key = key.get(table.hash_key_attr)
+        range_key = key.get(table.range_key_attr) if table.range_key_attr else None
+        if hash_key is None or (table.range_key_attr and range_key is None):
+            return None
+        try:
+            item = table.get_item(DynamoType(hash_key), DynamoType(range_key) if range_key else None)
+        except Exception:
+            return None
+        return item.size() if item else 0
+
+    def _old_sizes(self, operation, request):
+        sizes = {}
+        if operation in ('PutItem', 'UpdateItem', 'DeleteItem'):
+            key = request.get('Key') or request.get('Item') or {}
+            sizes[0] = self._stored_size(request['TableName'], key) or 0
+        elif operation == 'BatchWriteItem':
+            index = 0
+            for table_name, requests in request['RequestItems'].items():
+                for write in requests:
+                    key = write.get('DeleteRequest', {}).get('Key') or write.get('PutRequest', {}).get('Item')
+                    sizes[index] = self._stored_size(table_name, key) or 0
+                    index += 1
+        elif operation == 'TransactWriteItems':
+            for index, write in enumerate(request['TransactItems']):
+                (kind, body), = write.items()
+                key = body.get('Key') or body.get('Item') or {}
+                sizes[index] = self._stored_size(body['TableName'], key) or 0
+        return sizes
+
+    def _read_size(self, table_name, index_name, items):
+        projection_all = True
+        if index_name:
+            table = self._table(table_name)
+            index = next((i for i in table.global_indexes if i.name == index_name), None)
+            projection_all = index is not None and index.projection.get('ProjectionType') == 'ALL'
+        total = 0
+        for item in items:
+            size = self._stored_size(table_name, item) if projection_all else None
+            total += item_size(item) if size is None else size
+        return total
+
+    def _consumed_units(self, operation, request, response, old_sizes):
+        consistent = bool(request.get('ConsistentRead'))
+        if operation == 'GetItem':
+            size = self._stored_size(request['TableName'], request['Key']) or 0
+            return read_units(size, consistent), 0
+        if operation == 'BatchGetItem':
+            reads = 0
+            for table_name, keys in request['RequestItems'].items():
+                for key in keys['Keys']:
+                    reads += read_units(self._stored_size(table_name, key) or 0, keys.get('ConsistentRead', False))
+            return reads, 0
+        if operation in ('Query', 'Scan'):
+            size = self._read_size(request['TableName'], request.get('IndexName'), response.get('Items', []))
+            return read_units(size, consistent), 0
+        if operation == 'TransactGetItems':
+            reads = 0
+            for get in request['TransactItems']:
+                reads += 2 * read_units(self._stored_size(get['Get']['TableName'], get['Get']['Key']) or 0, True)
+            return reads, 0
+        if operation in ('PutItem', 'UpdateItem'):
+            key = request.get('Key') or request.get('Item')
+            new_size = self._stored_size(request['TableName'], key) or 0
+            return 0, write_units(max(old_sizes.get(0, 0), new_size))
+        if operation == 'DeleteItem':
+            return 0, write_units(old_sizes.get(0, 0))
+        if operation == 'BatchWriteItem':
+            writes = 0
+            index = 0
+            for table_name, requests in request['RequestItems'].items():
+                for write in requests:
+                    new_size = item_size(write['PutRequest']['Item']) if 'PutRequest' in write else 0
+                    writes += write_units(max(old_sizes.get(index, 0), new_size))
+                    index += 1
+            return 0, writes
+        if operation == 'TransactWriteItems':
+            writes = 0
+            for index, write in enumerate(request['TransactItems']):
+                (kind, body), = write.items()
+                new_size = item_size(body['Item']) if kind == 'Put' else old_sizes.get(index, 0)
+                writes += 2 * write_units(max(old_sizes.get(index, 0), new_size))
+            return 0, writes
+        return 0, 0
+
+# ------------------------------------------------------------------
+# Bedrock・Stripeのフェイク
+# ------------------------------------------------------------------
+
+FAKE_CLAUDE_TEXT = json.dumps({
+    'summary': '直近の週次報告では、残業時間が安定しており達成度も高い水準を維持しています。',
+    'insights': {
+        'positive': [{'title': '達成度の維持', 'description': '高い達成度を継続しています。', 'score': 0.8}],
+        'negative': [{'title': 'レビュー負荷', 'description': 'レビュー指摘への対応に時間を要しています。', 'score': 0.4}]
+    }
+}, ensure_ascii=False)
+
+def fake_bedrock_response(request, **kwargs):
+    """bedrock-runtime の InvokeModel に固定の応答を返す（before-sendで実際の送信を置き換える）"""
+    from botocore.awsrequest import AWSResponse
+    from moto.core.botocore_stubber import MockRawResponse
+    body = json.dumps({
+        'content': [{'type': 'text', 'text': FAKE_CLAUDE_TEXT}],
+        'usage': {'input_tokens': 1200, 'output_tokens': 400}
+    }).encode('utf-8')
+    return AWSResponse(request.url, 200, {'Content-Type': 'application/json'}, MockRawResponse(body))
+
+class FakeStripeHttpClient:
+    """
+    Stripe APIのフェイク（stripe.default_http_client として使う）
+
+    請求書は24件（2年分）で、それぞれに返金のある支払いを持たせる。
+    請求書の一覧は limit・starting_after によるページングと、返金の展開（data.charge.refunds）に対応する。
+    """
+    name = 'bench-fake'
+
+    def __init__(self, recorder, invoices=24):
+        self.recorder = recorder
+        self.invoices = invoices
+
+    def request_with_retries(self, method, url, headers, post_data=None):
+        parsed = urlparse(url)
+        path = parsed.path
+        self.recorder.record(f"stripe.{method.upper()} {re.sub(r'/[a-z]+_[A-Za-z0-9]+', '/{id}', path)}")
+        return json.dumps(self._respond(path, parse_qs(parsed.query))), 200, {'request-id': 'req_bench'}
+
+    def close(self):
+        pass
+
+    def _list(self, url, data):
+        return {'object': 'list', 'url': url, 'has_more': False, 'data': data}
+
+    def _line(self, index, start):
+        return {
+            'object': 'line_item', 'id': f'il_{index}', 'amount': 1000, 'type': 'subscription',
+            'description': '1 × 週次報告 ビジネスプラン', 'period': {'start': start, 'end': start + 2592000}
+        }
+
+    def _refund(self, now):
+        return {'object': 'refund', 'id': 're_bench', 'amount': 500, 'status': 'succeeded', 'created': now}
+
+    def _invoices(self, path, query, now):
+        expand = [value for key, values in query.items() if key.startswith('expand[') for value in values]
+        limit = int(query.get('limit', ['10'])[0])
+        start = int(query['starting_after'][0].split('_')[1]) + 1 if 'starting_after' in query else 0
+        invoices = [{
+            'object': 'invoice', 'id': f'in_{i}', 'status': 'paid',
+            'charge': {
+                'object': 'charge', 'id': f'ch_{i}',
+                'refunds': self._list(f'/v1/charges/ch_{i}/refunds', [self._refund(now)])
+            } if 'data.charge.refunds' in expand else f'ch_{i}',
+            'hosted_invoice_url': f'https://invoice.stripe.com/i/{i}',
+            'lines': self._list(f'/v1/invoices/in_{i}/lines', [self._line(i, now - i * 2592000)])
+        } for i in range(start, min(start + limit, self.invoices))]
+        return {**self._list(path, invoices), 'has_more': start + limit < self.invoices}
+
+    def _respond(self, path, query):
+        now = int(datetime.now().timestamp())
+        if path == '/v1/customers':
+            return self._list(path, [{'object': 'customer', 'id': 'cus_bench', 'email': 'admin@example.com'}])
+        if path == '/v1/payment_methods':
+            return self._list(path, [{
+                'object': 'payment_method', 'id': 'pm_bench',
+                'card': {'brand': 'visa', 'last4': '4242', 'exp_month': 12, 'exp_year': 2030}
+            }])
+        if path == '/v1/subscriptions':
+            return self._list(path, [fake_subscription()])
+        if path == '/v1/invoices/upcoming':
+            return {'object': 'invoice', 'lines': self._list('/v1/invoices/upcoming/lines', [self._line(0, now)])}
+        if path == '/v1/invoices':
+            return self._invoices(path, query, now)
+        if path == '/v1/refunds':
+            return self._list(path, [self._refund(now)])
+        return {'object': 'unknown'}
+
+def fake_subscription(customer='cus_bench', status='active', plan_id='business', account_count=5, subscription_id='sub_bench'):
+    """Stripeのサブスクリプション"""
+    now = int(time.time())
+    return {
+        'object': 'subscription', 'id': subscription_id, 'customer': customer, 'status': status,
+        'metadata': {'plan_id': plan_id, 'account_count': str(account_count)},
+        'current_period_start': now - 86400, 'current_period_end': now + 29 * 86400, 'cancel_at_period_end': False,
+        'items': {'object': 'list', 'url': '/v1/subscription_items', 'has_more': False, 'data': []}
+    }
+
+def fake_invoice(customer='cus_bench', status='paid', invoice_id='in_bench', subscription_id='sub_bench'):
+    """Stripeの請求書"""
+    return {
+        'object': 'invoice', 'id': invoice_id, 'customer': customer, 'subscription': subscription_id,
+        'status': status, 'amount_due': 4500, 'amount_paid': 4500 if status == 'paid' else 0
+    }
+
+def stripe_event(event_type, obj, created=None):
+    """Stripeのイベント（Webhookで届く本文）"""
+    return {
+        'object': 'event', 'id': f'evt_{uuid.uuid4().hex[:24]}', 'type': event_type,
+        'created': created or int(time.time()), 'api_version': '2023-10-16', 'livemode': False,
+        'data': {'object': obj}
+    }
+
+def sign_stripe_payload(payload, secret=ENVIRONMENT['STRIPE_WEBHOOK_SECRET'], timestamp=None):
+    """Stripe-Signature ヘッダーの値（Stripeと同じく「タイムスタンプ.本文」のHMAC-SHA256）"""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode('utf-8'), f'{timestamp}.{payload}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+# ------------------------------------------------------------------
+# 合成データ
+# ------------------------------------------------------------------
+
+def week_strings(count, end=None):
+    """終了日（既定は今日）を含む週までの count 週分の 'YYYY-WNN'（古い順）"""
+    end = end or datetime.now()
+    weeks = []
+    for i in range(count):
+        year, week, _ = (end - timedelta(weeks=i)).isocalendar()
+        weeks.append(f'{year}-W{week:02d}')
+    return list(reversed(weeks))
+
+def organization_id(members):
+    return f'bench-{members}'
+
+def member_uuid(org_id, index):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f'{org_id}/member/{index}'))
+
+def make_member(org_id, index):
+    return {
+        'memberUuid': member_uuid(org_id, index),
+        'id': f'm{index:04d}',
+        'organizationId': org_id,
+        'name': f'メンバー{index:04d}',
+        'email': f'member{index}@example.com',
+        'extraInfo': {},
+        'projects': [
+            {'name': '基幹システム刷新プロジェクト', 'workItems': []},
+            {'name': '社内問い合わせ対応', 'workItems': []}
+        ],
+        'adviceTickets': 1000000
+    }
+
+def make_report(org_id, uuid_, week, rng):
+    achievement = rng.randint(1, 5)
+    return {
+        'memberUuid': uuid_,
+        'organizationId': org_id,
+        'weekString': week,
+        'status': rng.choice(['approved', 'approved', 'feedback', 'pending']),
+        'projects': [
+            {'name': '基幹システム刷新プロジェクト', 'workItems': [
+                {'content': '受注管理画面の詳細設計レビュー対応'},
+                {'content': '在庫引当バッチの性能改善と負荷試験の実施'}
+            ]},
+            {'name': '社内問い合わせ対応', 'workItems': [{'content': 'アカウント発行手順の問い合わせ対応'}]}
+        ],
+        'overtimeHours': Decimal(str(rng.choice([0, 2.5, 5, 8, 12.5, 20]))),
+        'issues': 'レビュー指摘が想定より多く、設計書の修正に時間を要した。',
+        'improvements': '事前にチェックリストを用いてセルフレビューを行う。',
+        'rating': {'achievement': achievement, 'stress': rng.randint(1, 5), 'disability': rng.randint(1, 5)},
+        'stressHelp': '',
+        'feedbacks': [],
+        'createdAt': f'{week}T09:00:00+09:00',
+        'approvedAt': None
+    }
+
+class Environment:
+    """
+    motoのモック上に、テーブル・メールアドレス・プッシュ通知・キュー・ユーザープールと合成データを用意する
+    """
+
+    def __init__(self, scales, years=None):
+        self.scales = scales
+        self.years = years
+        self.organizations = {}
+        self.recorder = None
+        self._mock = None
+
+    def start(self):
+        os.environ.update(ENVIRONMENT)
+        from moto import mock_aws
+        self._mock = mock_aws()
+        self._mock.start()
+
+        import boto3
+        boto3.setup_default_session()
+        session = boto3.DEFAULT_SESSION
+        self.recorder = CallRecorder()
+        self.recorder.install(session.events)
+        session.events.register('before-send.bedrock-runtime', fake_bedrock_response, unique_id='bench-fake-bedrock')
+
+        dynamodb = boto3.client('dynamodb', region_name=REGION)
+        for definition in load_table_definitions():
+            dynamodb.create_table(**definition)
+
+        ses = boto3.client('ses', region_name=REGION)
+        ses.verify_email_identity(EmailAddress=SENDER)
+
+        sns = boto3.client('sns', region_name=REGION)
+        platform_arn = sns.create_platform_application(
+            Name='bench-web-push', Platform='GCM', Attributes={'PlatformCredential': 'bench'}
+        )['PlatformApplicationArn']
+        os.environ['WEB_PUSH_PLATFORM_ARN'] = platform_arn
+        self.platform_arn = platform_arn
+
+        sqs = boto3.client('sqs', region_name=REGION)
+        os.environ['SEND_REQUEST_QUEUE_URL'] = sqs.create_queue(QueueName=f'{STAGE}-send-request')['QueueUrl']
+
+        ssm = boto3.client('ssm', region_name=REGION)
+        ssm.put_parameter(Name=ENVIRONMENT['JWT_SECRET_PARAMETER'], Value='bench-jwt-secret-0123456789abcdef0123456789', Type='SecureString')
+
+        cognito = boto3.client('cognito-idp', region_name=REGION)
+        pool_id = cognito.create_user_pool(
+            PoolName=f'{STAGE}-users',
+            Schema=[
+                {'Name': 'organizationId', 'AttributeDataType': 'String', 'Mutable': True},
+                {'Name': 'parentOrganizationId', 'AttributeDataType': 'String', 'Mutable': True}
+            ]
+        )['UserPool']['Id']
+        os.environ['USER_POOL_ID'] = pool_id
+        os.environ['USER_POOL_REGION'] = REGION
+        self.user_pool_id = pool_id
+
+        for members in self.scales:
+            self.organizations[members] = self._seed_organization(members, self.years or SCALES.get(members, 1))
+        return self
+
+    def stop(self):
+        if self._mock:
+            self._mock.stop()
+
+    def _seed_organization(self, members, years):
+        import boto3
+        from boto3.dynamodb.types import TypeSerializer
+        sys.path.insert(0, os.path.join(SRC_DIR, 'layer'))
+        from common import report_aggregates
+
+        rng = random.Random(members)
+        org_id = organization_id(members)
+        weeks = week_strings(52 * years)
+        serializer = TypeSerializer()
+        backend = self.recorder._backend
+
+        def put(table_name, item):
+            item = {k: v for k, v in item.items() if v is not None}
+            backend.get_table(table_name).put_item({k: serializer.serialize(v) for k, v in item.items()})
+
+        cognito = boto3.client('cognito-idp', region_name=REGION)
+        admin = cognito.admin_create_user(
+            UserPoolId=self.user_pool_id,
+            Username=f'admin@{org_id}.example.com',
+            UserAttributes=[
+                {'Name': 'email', 'Value': f'admin@{org_id}.example.com'},
+                {'Name': 'custom:organizationId', 'Value': org_id}
+            ],
+            MessageAction='SUPPRESS'
+        )['User']
+        admin_sub = next(a['Value'] for a in admin['Attributes'] if a['Name'] == 'sub')
+
+        # 親組織の配下の組織（アカウント管理の一覧対象）
+        child_ids = [f'{org_id}-child-{i}' for i in range(max(1, members // 20))]
+        for child_id in child_ids:
+            cognito.admin_create_user(
+                UserPoolId=self.user_pool_id,
+                Username=f'admin@{child_id}.example.com',
+                UserAttributes=[
+                    {'Name': 'email', 'Value': f'admin@{child_id}.example.com'},
+                    {'Name': 'custom:organizationId', 'Value': child_id},
+                    {'Name': 'custom:parentOrganizationId', 'Value': org_id}
+                ],
+                MessageAction='SUPPRESS'
+            )
+            put(f'{STAGE}-Organizations', {'organizationId': child_id, 'name': f'配下組織 {child_id}', 'features': {}})
+
+        endpoint_arn = boto3.client('sns', region_name=REGION).create_platform_endpoint(
+            PlatformApplicationArn=self.platform_arn, Token=f'token-{org_id}'
+        )['EndpointArn']
+        put(f'{STAGE}-Organizations', {
+            'organizationId': org_id,
+            'name': f'ベンチマーク組織（{members}名）',
+            'sender': SENDER,
+            'senderName': '週次報告',
+            'requestEnabled': False,
+            'reportWeek': -1,
+            'features': {'notifyByEmail': True, 'notifySubscriptions': {admin_sub: endpoint_arn}}
+        })
+
+        uuids = []
+        for index in range(members):
+            member = make_member(org_id, index)
+            uuids.append(member['memberUuid'])
+            put(f'{STAGE}-Members', member)
+
+        for week in weeks:
+            reports = []
+            for uuid_ in uuids:
+                if rng.random() < 0.9:
+                    report = make_report(org_id, uuid_, week, rng)
+                    reports.append(report)
+                    put(f'{STAGE}-WeeklyReports', report)
+            # ストリームで維持される集計アイテム
+            put(f'{STAGE}-WeeklyReportAggregates', report_aggregates.build_aggregate_item(org_id, week, reports))
+
+        for index in range(5):
+            put(f'{STAGE}-UserTasks', {
+                'userId': admin_sub, 'taskId': f'task-{index}', 'title': f'タスク{index}',
+                'completed': False, 'createdAt': weeks[-1], 'updatedAt': weeks[-1]
+            })
+
+        return {
+            'organizationId': org_id,
+            'members': members,
+            'memberUuids': uuids,
+            'weeks': weeks,
+            'adminSub': admin_sub,
+            'adminEmail': f'admin@{org_id}.example.com',
+            'childOrganizationIds': child_ids
+        }
+
+# ------------------------------------------------------------------
+# 関数の読み込み
+# ------------------------------------------------------------------
+
+class Context:
+    """Lambdaのコンテキストの代わり"""
+    aws_request_id = 'bench-request'
+    function_name = 'bench'
+    invoked_function_arn = f'arn:aws:lambda:{REGION}:123456789012:function:bench'
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+def load_function(name):
+    """src/<name>/lambda_function.py を関数ごとに別名のモジュールとして読み込む"""
+    import importlib.util
+    layer_dir = os.path.join(SRC_DIR, 'layer')
+    if layer_dir not in sys.path:
+        sys.path.insert(0, layer_dir)
+    function_dir = os.path.join(SRC_DIR, name)
+    sys.path.insert(0, function_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(f'bench_{name}_lambda_function', os.path.join(function_dir, 'lambda_function.py'))
+        module = importlib.util.module_from_spec(spec)
+        with _quiet():
+            spec.loader.exec_module(module)
+        return module
+    finally:
+        sys.path.remove(function_dir)
+
+class _quiet:
+    """handlerの print 出力を捨てる"""
+
+    def __enter__(self):
+        self._stdout = sys.stdout
+        sys.stdout = io.StringIO()
+
+    def __exit__(self, *exc):
+        sys.stdout = self._stdout
+        return False
+
+quiet = _quiet
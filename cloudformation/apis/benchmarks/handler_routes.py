@@ -0,0 +1,192 @@
+"""
+ハンドラーベンチマークで実行するルートの一覧
+
+各ルートは (名前, 関数, イベントを作る関数, 実行前の準備) で定義する。
+イベントを作る関数・準備は handler_fixtures.Environment が作成した組織の情報（dict）を受け取る。
+準備は計測対象外で、削除系のルートなど繰り返し実行すると結果が変わるルートの状態を戻すために使う。
+
+含めないルート:
+  - DELETE /organization（組織と配下のデータを全て削除するため）
+  - DELETE /member?mode=async、Bedrockのストリーミング（Lambdaの非同期呼び出しを伴うため）
+  - Payment の作成・変更系（Stripe上の状態を変更するため）
+"""
+import json
+import random
+from collections import namedtuple
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+
+from handler_fixtures import STAGE, fake_invoice, fake_subscription, make_report, sign_stripe_payload, stripe_event
+
+Route = namedtuple('Route', ['name', 'function', 'event', 'setup'])
+
+def api(method, resource, params=None, body=None, claims=None, path=None, path_params=None):
+    """API Gatewayのプロキシ統合のイベント"""
+    return {
+        'httpMethod': method,
+        'resource': resource,
+        'path': path or resource,
+        'headers': {'Accept-Encoding': 'gzip, deflate, br'},
+        'queryStringParameters': params,
+        'pathParameters': path_params,
+        'body': json.dumps(body, ensure_ascii=False) if body is not None else None,
+        'requestContext': {'authorizer': {'claims': claims or {}}, 'identity': {'sourceIp': '127.0.0.1'}}
+    }
+
+def _member(org):
+    return org['memberUuids'][0]
+
+def _week(org):
+    return org['weeks'][-1]
+
+def _report(org, seed=0):
+    """最新週の1件目のレポート（Decimalのまま）"""
+    report = make_report(org['organizationId'], _member(org), _week(org), random.Random(seed))
+    return {k: v for k, v in report.items() if v is not None}
+
+def _report_body(org):
+    return json.loads(json.dumps(_report(org), default=float))
+
+def _admin_claims(org):
+    return {'sub': org['adminSub'], 'email': org['adminEmail'], 'custom:organizationId': org['organizationId']}
+
+def _restore_report(org):
+    """削除・更新したレポートを元に戻す"""
+    boto3.resource('dynamodb').Table(f'{STAGE}-WeeklyReports').put_item(Item=_report(org))
+
+def _unseed_aggregate(org):
+    """最新週の集計アイテムをバックフィル前（未構築）の状態に戻す"""
+    boto3.resource('dynamodb').Table(f'{STAGE}-WeeklyReportAggregates').update_item(
+        Key={'organizationId': org['organizationId'], 'weekString': _week(org)},
+        UpdateExpression='REMOVE seededAt'
+    )
+
+def _restore_task(org):
+    boto3.resource('dynamodb').Table(f'{STAGE}-UserTasks').put_item(Item={
+        'userId': org['adminSub'], 'taskId': 'task-0', 'title': 'タスク0',
+        'completed': False, 'createdAt': _week(org), 'updatedAt': _week(org)
+    })
+
+def _clear_invoice_history(org):
+    """請求履歴のキャッシュを削除する（Stripeからの取得経路を計測するため）"""
+    boto3.resource('dynamodb').Table(f'{STAGE}-StripeInvoiceHistory').delete_item(Key={'customerId': 'cus_bench'})
+
+def _stripe_webhook(event_type, obj):
+    """署名付きのStripeのWebhook"""
+    event = api('POST', '/payment/webhook')
+    event['body'] = json.dumps(stripe_event(event_type, obj))
+    event['headers']['Stripe-Signature'] = sign_stripe_payload(event['body'])
+    return event
+
+def _stream_event(org):
+    """レポートの更新（MODIFY）のストリームレコード"""
+    serializer = TypeSerializer()
+    old, new = _report(org, seed=1), _report(org)
+    image = lambda item: {k: serializer.serialize(v) for k, v in item.items()}
+    return {'Records': [{
+        'eventName': 'MODIFY',
+        'dynamodb': {
+            'Keys': image({'memberUuid': new['memberUuid'], 'weekString': new['weekString']}),
+            'OldImage': image(old),
+            'NewImage': image(new)
+        }
+    }]}
+
+def _outbox_event(org):
+    """報告の提出時に書き込まれる通知イベント（INSERT）のストリームレコード"""
+    # 共通レイヤーは Environment の開始後に読み込める
+    import common.dynamo_items as dynamo_items
+    serializer = TypeSerializer()
+    notification = dynamo_items.prepare_report_notification_item('updated_report', _report(org))
+    return {'Records': [{
+        'eventID': '1',
+        'eventName': 'INSERT',
+        'dynamodb': {
+            'Keys': {'notificationId': serializer.serialize(notification['notificationId'])},
+            'NewImage': {k: serializer.serialize(v) for k, v in notification.items()},
+            'SequenceNumber': '1'
+        }
+    }]}
+
+ROUTES = [
+    # Public（メンバー向けの公開API）
+    Route('public.organization.get', 'Public', lambda org: api('GET', '/public/organization', {'organizationId': org['organizationId']}), None),
+    Route('public.report.get', 'Public', lambda org: api('GET', '/public/weekly-report', {'memberUuid': _member(org), 'weekString': _week(org)}), None),
+    Route('public.report.list', 'Public', lambda org: api('GET', '/public/weekly-report', {'organizationId': org['organizationId'], 'weekString': _week(org)}), None),
+    Route('public.report.post', 'Public', lambda org: api('POST', '/public/weekly-report', body=_report_body(org)), None),
+    Route('public.report.put', 'Public', lambda org: api('PUT', '/public/weekly-report', body=_report_body(org)), None),
+    Route('public.member.get', 'Public', lambda org: api('GET', '/public/member', {'memberUuid': _member(org)}), None),
+    Route('public.member.list', 'Public', lambda org: api('GET', '/public/member', {'organizationId': org['organizationId']}), None),
+    Route('public.member.put', 'Public', lambda org: api('PUT', '/public/member', body={'memberUuid': _member(org), 'projects': ['基幹システム刷新プロジェクト', '社内問い合わせ対応']}), None),
+    Route('public.project.get', 'Public', lambda org: api('GET', '/public/project', {'memberUuid': _member(org)}), None),
+
+    # Organization
+    Route('organization.get', 'Organization', lambda org: api('GET', '/organization', {'organizationId': org['organizationId']}), None),
+    Route('organization.list', 'Organization', lambda org: api('GET', '/organization'), None),
+    Route('organization.put', 'Organization', lambda org: api('PUT', '/organization', body={'organizationId': org['organizationId'], 'name': f"ベンチマーク組織（{org['members']}名）"}), None),
+    Route('organization.push-subscription.post', 'Organization', lambda org: api('POST', '/organization/push-subscription', body={
+        'organizationId': org['organizationId'], 'adminId': org['adminSub'], 'fcmToken': f"token-{org['organizationId']}"
+    }), None),
+
+    # Member
+    Route('member.get', 'Member', lambda org: api('GET', '/member', {'memberUuid': _member(org)}), None),
+    Route('member.list', 'Member', lambda org: api('GET', '/member', {'organizationId': org['organizationId']}), None),
+    Route('member.put', 'Member', lambda org: api('PUT', '/member', body={'memberUuid': _member(org), 'name': 'メンバー0000'}), None),
+    Route('member.project.get', 'Member', lambda org: api('GET', '/member/project', {'memberUuid': _member(org)}), None),
+    Route('member.mail.put', 'Member', lambda org: api('PUT', '/member/mail', body={'memberUuid': _member(org)}), None),
+
+    # WeeklyReport（管理者向け）
+    Route('report.get', 'WeeklyReport', lambda org: api('GET', '/weekly-report', {'memberUuid': _member(org), 'weekString': _week(org)}), None),
+    Route('report.list', 'WeeklyReport', lambda org: api('GET', '/weekly-report', {'organizationId': org['organizationId'], 'weekString': _week(org)}), None),
+    Route('report.put', 'WeeklyReport', lambda org: api('PUT', '/weekly-report', body=_report_body(org)), None),
+    Route('report.delete', 'WeeklyReport', lambda org: api('DELETE', '/weekly-report', {'memberUuid': _member(org), 'weekString': _week(org)}), _restore_report),
+    Route('report.member', 'WeeklyReport', lambda org: api('GET', '/weekly-report/member/{memberUuid}', path_params={'memberUuid': _member(org)}), None),
+    Route('report.status', 'WeeklyReport', lambda org: api('GET', '/weekly-report/status', {'organizationId': org['organizationId'], 'weekString': _week(org)}), None),
+    Route('report.stats', 'WeeklyReport', lambda org: api('GET', '/weekly-report/stats', {'organizationId': org['organizationId'], 'weeks': '8'}), None),
+    Route('report.export', 'WeeklyReport', lambda org: api('GET', '/weekly-report/export', {'organizationId': org['organizationId'], 'weekFrom': org['weeks'][-4], 'weekTo': _week(org)}), None),
+    Route('report.export.page', 'WeeklyReport', lambda org: api('GET', '/weekly-report/export', {'organizationId': org['organizationId'], 'limit': '100'}), None),
+    Route('report.feedback', 'WeeklyReport', lambda org: api('POST', '/weekly-report/feedback', body={
+        'memberUuid': _member(org), 'weekString': _week(org), 'feedback': {'content': '確認しました。', 'createdAt': _week(org)}
+    }), _restore_report),
+
+    # UserTasks
+    Route('tasks.list', 'UserTasks', lambda org: api('GET', '/user-tasks', claims=_admin_claims(org)), None),
+    Route('tasks.post', 'UserTasks', lambda org: api('POST', '/user-tasks', body={'taskId': 'task-bench', 'title': 'ベンチマーク'}, claims=_admin_claims(org)), None),
+    Route('tasks.put', 'UserTasks', lambda org: api('PUT', '/user-tasks', body={'taskId': 'task-1', 'title': 'タスク1', 'completed': True}, claims=_admin_claims(org)), None),
+    Route('tasks.delete', 'UserTasks', lambda org: api('DELETE', '/user-tasks', {'taskId': 'task-0'}, claims=_admin_claims(org)), _restore_task),
+
+    # Account（Cognito）
+    Route('account.list', 'Account', lambda org: api('GET', '/account', claims=_admin_claims(org)), None),
+    Route('account.list.page', 'Account', lambda org: api('GET', '/account', {'limit': '20'}, claims=_admin_claims(org)), None),
+
+    # Bedrock（キャッシュを使わずに生成する経路）
+    Route('bedrock.advice', 'Bedrock', lambda org: api('POST', '/bedrock/advice', body={
+        'memberUuid': _member(org), 'weekString': _week(org), 'advisorRole': 'manager', 'regenerate': True
+    }), None),
+    Route('bedrock.summary', 'Bedrock', lambda org: api('POST', '/bedrock/summary', body={'memberUuid': _member(org), 'regenerate': True}), None),
+
+    # SES
+    Route('ses.check', 'SES', lambda org: api('POST', '/ses/check', body={'email': 'no-reply@example.com'}), None),
+
+    # 報告依頼・集計
+    Route('send-request.http', 'SendRequest', lambda org: api('POST', '/send-request', body={'organizationId': org['organizationId'], 'weekString': _week(org)}), None),
+    Route('schedule', 'Schedule', lambda org: {}, None),
+    Route('aggregate.stream', 'ReportAggregate', _stream_event, None),
+    Route('notify.report', 'ReportNotifier', _outbox_event, None),
+    Route('notify.sweep', 'ReportNotifier', lambda org: {'action': 'sweep-endpoints'}, None),
+    Route('aggregate.rebuild', 'ReportAggregate', lambda org: {'action': 'rebuild', 'organizationId': org['organizationId'], 'weekString': _week(org)}, None),
+    Route('aggregate.backfill', 'ReportAggregate', lambda org: {'action': 'backfill'}, _unseed_aggregate),
+
+    # SecureParameter（PyJWT・SSM）
+    Route('secure.generate', 'SecureParameter', lambda org: api('POST', '/secure/generate', body={'organizationId': org['organizationId'], 'weekString': _week(org)}), None),
+
+    # Payment（Stripeはフェイク）
+    Route('payment.subscription-info', 'Payment', lambda org: api('POST', '/payment/subscription-info', body={'customerId': 'cus_bench'}), None),
+    Route('payment.invoices', 'Payment', lambda org: api('POST', '/payment/invoices', body={'customerId': 'cus_bench'}), None),
+    Route('payment.invoices.uncached', 'Payment', lambda org: api('POST', '/payment/invoices', body={'customerId': 'cus_bench'}), _clear_invoice_history),
+    Route('payment.invoices.page', 'Payment', lambda org: api('POST', '/payment/invoices', body={'customerId': 'cus_bench', 'startingAfter': 'in_5', 'limit': 12}), None),
+    Route('payment.payment-methods', 'Payment', lambda org: api('POST', '/payment/payment-methods', body={'email': org['adminEmail']}), None),
+    Route('payment.webhook.subscription', 'Payment', lambda org: _stripe_webhook('customer.subscription.updated', fake_subscription()), None),
+    Route('payment.webhook.invoice', 'Payment', lambda org: _stripe_webhook('invoice.paid', fake_invoice()), None)
+]
@@ -1,20 +1,24 @@
 import json
 import os
-import boto3
 import logging
 from botocore.exceptions import ClientError
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
 from common.exception import ApplicationException
-from common.cognito_util import admin_create_user, admin_delete_user, list_users, admin_get_user
+from common.cognito_util import admin_create_user, admin_delete_user, list_users, list_users_page, admin_get_user, invalidate_admin_index
+from common.organization_names import OrganizationNames
 import common.dynamo_items as dynamo_items
+from common.aws_clients import lazy_client, lazy_resource, lazy_table
 
 USER_POOL_ID = os.environ.get('USER_POOL_ID')
 USER_POOL_REGION = os.environ.get('USER_POOL_REGION')
-cognito = boto3.client('cognito-idp', region_name=USER_POOL_REGION)
+cognito = lazy_client('cognito-idp', region_name=USER_POOL_REGION)
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 organizations_table_name = f'{os.environ.get("STAGE", "dev")}-Organizations'
-organizations_table = dynamodb.Table(organizations_table_name)
+organizations_table = lazy_table(organizations_table_name)
+
+# アカウント一覧の1ページあたりの最大件数
+ACCOUNT_PAGE_SIZE = 100
 
 # ロガーの設定
 logger = logging.getLogger()
@@ -51,13 +55,13 @@ def check_organization_exists(organization_id):
     except Exception as e:
         raise ApplicationException(500, f"組織情報の確認に失敗しました: {str(e)}")
 
-def enrich_user_with_organization(user):
-    """ユーザー情報に組織情報を追加"""
-    if 'organizationId' in user:
-        org = get_organization(user['organizationId'])
-        if org:
-            # nameフィールドまたはorganizationNameフィールドを使用
-            user['organizationName'] = org.get('name') or org.get('organizationName')
+def enrich_user_with_organization(user, organization_names=None):
+    """ユーザー情報に組織情報を追加（organization_names はリクエスト内で共有する組織名の解決）"""
+    if user and user.get('organizationId'):
+        organization_names = organization_names or OrganizationNames(dynamodb, organizations_table_name)
+        organization_name = organization_names.get(user['organizationId'])
+        if organization_name:
+            user['organizationName'] = organization_name
     return user
 
 def resend_invitation(user_pool_id, organization_id, email, cognito_client):
@@ -114,6 +118,8 @@ def update_user_attributes(user_pool_id, organization_id, old_email, new_email,
                 Username=username,
                 UserAttributes=user_attributes
             )
+            # 管理者インデックスのメールアドレスを更新させる
+            invalidate_admin_index(user_pool_id)
             
             # 招待メールを送信
             cognito_client.admin_create_user(
@@ -126,6 +132,7 @@ def update_user_attributes(user_pool_id, organization_id, old_email, new_email,
     except ClientError as e:
         raise ApplicationException(500, f"ユーザー情報の更新に失敗しました: {str(e)}")
 
+@instrument_handler
 def lambda_handler(event, context):
     try:
         path = event.get('path', '')
@@ -273,6 +280,8 @@ def lambda_handler(event, context):
         elif http_method == 'GET':
             params = event.get('queryStringParameters', {}) or {}
             organization_id = params.get('organizationId')
+            # 組織名はリクエスト内で1回だけまとめて取得する
+            organization_names = OrganizationNames(dynamodb, organizations_table_name)
             
             # 単一アカウント取得時は親組織IDチェックを行う
             if organization_id:
@@ -280,21 +289,30 @@ def lambda_handler(event, context):
                 if result and result.get('parentOrganizationId') != requester_organization_id:
                     raise ApplicationException(403, '権限がありません')
                 # 組織情報を付加
-                result = enrich_user_with_organization(result)
+                result = enrich_user_with_organization(result, organization_names)
+            elif 'limit' in params or 'cursor' in params:
+                # アカウント一覧をカーソル方式でページ単位に取得
+                try:
+                    limit = min(max(int(params.get('limit', ACCOUNT_PAGE_SIZE)), 1), ACCOUNT_PAGE_SIZE)
+                except ValueError:
+                    raise ApplicationException(400, 'Invalid limit parameter')
+                items, next_cursor = list_users_page(
+                    USER_POOL_ID,
+                    limit,
+                    params.get('cursor'),
+                    cognito_client=cognito,
+                    parent_organization_id=requester_organization_id,
+                    organization_names=organization_names
+                )
+                result = {'items': items, 'nextCursor': next_cursor}
             else:
-                # アカウント一覧取得時
+                # アカウント一覧取得時（組織情報を付加）
                 result = list_users(
                     USER_POOL_ID,
                     cognito_client=cognito,
-                    parent_organization_id=requester_organization_id
+                    parent_organization_id=requester_organization_id,
+                    organization_names=organization_names
                 )
-                # 各ユーザーに組織情報を付加
-                enriched_results = []
-                for user in result:
-                    enriched_user = enrich_user_with_organization(user)
-                    if enriched_user:
-                        enriched_results.append(enriched_user)
-                result = enriched_results
 
             return create_response(200, result)
             
@@ -0,0 +1,70 @@
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger()
+
+STREAM_KEY_PREFIX = 'stream#'
+# DynamoDBへの途中経過の書き込み間隔（秒）
+FLUSH_INTERVAL_SECONDS = 0.3
+
+def stream_key(stream_id: str) -> Dict[str, str]:
+    return {'cacheKey': f'{STREAM_KEY_PREFIX}{stream_id}'}
+
+def create_stream(table, stream_id: str, ttl_seconds: int = 3600) -> None:
+    """ストリーミング生成の受付を記録する（クライアントはこのアイテムをポーリングする）"""
+    table.put_item(Item={
+        **stream_key(stream_id),
+        'kind': 'stream',
+        'response': '',
+        'done': False,
+        'expiresAt': int(time.time()) + ttl_seconds
+    })
+
+def read_stream(table, stream_id: str) -> Optional[Dict[str, Any]]:
+    item = table.get_item(Key=stream_key(stream_id), ConsistentRead=True).get('Item')
+    if not item:
+        return None
+    return {
+        'streamId': stream_id,
+        'text': item.get('response', ''),
+        'done': item.get('done', False),
+        'error': item.get('error')
+    }
+
+class StreamWriter:
+    """生成中のテキストを一定間隔でまとめてDynamoDBに書き込む"""
+
+    def __init__(self, table, stream_id: str, flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.table = table
+        self.stream_id = stream_id
+        self.flush_interval = flush_interval
+        self.text = ''
+        self._flushed_at = time.monotonic()
+
+    def append(self, chunk: str) -> None:
+        self.text += chunk
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self._update(done=False)
+
+    def finish(self, text: Optional[str] = None) -> None:
+        if text is not None:
+            self.text = text
+        self._update(done=True)
+
+    def fail(self, error: str) -> None:
+        self._update(done=True, error=error)
+
+    def _update(self, done: bool, error: Optional[str] = None) -> None:
+        update_expression = 'SET #r = :r, done = :d'
+        values = {':r': self.text, ':d': done}
+        if error:
+            update_expression += ', #e = :e'
+            values[':e'] = error
+        self.table.update_item(
+            Key=stream_key(self.stream_id),
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames={'#r': 'response', **({'#e': 'error'} if error else {})},
+            ExpressionAttributeValues=values
+        )
+        self._flushed_at = time.monotonic()
@@ -1,39 +1,291 @@
+import os
 import json
-import boto3
+import time
 import logging
-from botocore.exceptions import ClientError
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Iterator, Optional
+from botocore.config import Config
+from botocore.exceptions import ClientError, BotoCoreError, ConnectTimeoutError, ReadTimeoutError, EndpointConnectionError
+from common.utils import emit_metrics
+from common.aws_clients import get_client, LazyProxy
 
 logger = logging.getLogger()
-bedrock = boto3.client('bedrock-runtime', region_name="ap-northeast-1")
 
-def invoke_claude(prompt: str) -> str:
-    """Claude (Anthropic Claude) を呼び出してアドバイスを生成する"""
+# API Gatewayの統合タイムアウト（秒）
+API_GATEWAY_TIMEOUT_SECONDS = 29
+# 期限後に応答（チケットの返却を含む）を返すための余裕（秒）
+DEADLINE_MARGIN_SECONDS = 3
+
+# 生成は再送すると二重に課金され、再送分の失敗もサーキットブレーカーに数えられるため、
+# 既定ではリトライしない（adaptiveモードはクライアント側のレート制御のために使う）。
+# 読み込みタイムアウトはレスポンスストリームではチャンクごとに適用される
+BEDROCK_CONFIG = Config(
+    region_name="ap-northeast-1",
+    retries={
+        'mode': 'adaptive',
+        'max_attempts': int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '1'))
+    },
+    connect_timeout=float(os.environ.get('BEDROCK_CONNECT_TIMEOUT', '2')),
+    read_timeout=float(os.environ.get('BEDROCK_READ_TIMEOUT', '10')),
+    max_pool_connections=10,
+    tcp_keepalive=True
+)
+
+# 同期呼び出し（invoke_model）は応答全体（600トークンで10秒程度）を1回の読み込みで待つため、
+# 読み込みタイムアウトはAPI Gatewayの期限までの残り時間（接続と余裕を除く）とする
+INVOKE_CONFIG = BEDROCK_CONFIG.merge(Config(
+    read_timeout=API_GATEWAY_TIMEOUT_SECONDS - DEADLINE_MARGIN_SECONDS - BEDROCK_CONFIG.connect_timeout
+))
+
+# 期限付きの呼び出しを実行するスレッド（打ち切った呼び出しは終わるまでスレッドを使い続ける）
+_executor = ThreadPoolExecutor(max_workers=4)
+
+METRICS_NAMESPACE = 'WeeklyReport/Bedrock'
+
+MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+INFERENCE_PARAMS = {
+    "max_tokens": 600,
+    "temperature": 0.8,
+    "top_p": 0.9,
+    "top_k": 250,
+    "anthropic_version": "bedrock-2023-05-31"
+}
+
+# Bedrock側の混雑・障害を示すエラー（呼び出し元には一時的な利用不可として返す）
+UNAVAILABLE_ERROR_CODES = {
+    'ThrottlingException', 'ServiceUnavailableException', 'ModelNotReadyException',
+    'ModelTimeoutException', 'InternalServerException'
+}
+THROTTLE_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException'}
+
+class BedrockError(Exception):
+    """Bedrockの呼び出しに失敗したことを示す例外"""
+    pass
+
+class BedrockUnavailableError(BedrockError):
+    """Bedrockが混雑・障害により一時的に利用できないことを示す例外（再試行可能）"""
+    pass
+
+class CircuitBreaker:
+    """
+    連続して失敗した場合に一定時間呼び出しを止め、即座に失敗させるサーキットブレーカー
+
+    open中に reset_timeout が経過すると1回だけ試行（half-open）し、成功すれば閉じる
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """呼び出しを止めている（reset_timeoutが未経過の）状態かどうか"""
+        with self._lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                raise BedrockUnavailableError("Bedrock circuit is open")
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning(f"Bedrock circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get('BEDROCK_CIRCUIT_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.environ.get('BEDROCK_CIRCUIT_RESET_SECONDS', '30'))
+)
+
+# 呼び出しごとのスロットリング回数（botocoreのリトライ判定イベントで数える）
+_call_stats = threading.local()
+
+def _count_throttles(attempts, response=None, caught_exception=None, **kwargs):
+    counter = getattr(_call_stats, 'counter', None)
+    if response is not None and counter is not None:
+        code = response[1].get('Error', {}).get('Code')
+        if code in THROTTLE_ERROR_CODES:
+            counter['throttles'] += 1
+    # Noneを返し、リトライの判定自体はbotocoreに任せる
+    return None
+
+def compute_deadline(context: Any, limit_seconds: Optional[float] = None, margin_seconds: float = DEADLINE_MARGIN_SECONDS) -> Optional[float]:
+    """
+    Lambdaの残り実行時間（と limit_seconds）から、Bedrock呼び出しの期限（time.monotonic() 基準）を求める
+
+    期限を過ぎた呼び出しは打ち切られるため、Lambdaのタイムアウト前に例外処理（チケットの返却）まで到達できる。
+    """
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining is None:
+        return None
+    remaining = get_remaining() / 1000
+    if limit_seconds is not None:
+        remaining = min(remaining, limit_seconds)
+    return time.monotonic() + remaining - margin_seconds
+
+def _run_until(call, deadline: Optional[float]):
+    """期限までに終わらない呼び出しは待たずに打ち切る（FutureTimeoutErrorを送出する）"""
+    if deadline is None:
+        return call()
+    timeout = deadline - time.monotonic()
+    if timeout <= 0:
+        raise FutureTimeoutError()
+    return _executor.submit(call).result(timeout=timeout)
+
+def _create_bedrock_client(config=BEDROCK_CONFIG):
+    client = get_client('bedrock-runtime', config=config)
+    # リトライ判定より先に呼ばれるよう先頭に登録する
+    client.meta.events.register_first('needs-retry.bedrock-runtime', _count_throttles, unique_id='bedrock-throttle-counter')
+    return client
+
+# キャッシュヒット時など、Bedrockを呼び出さないリクエストではクライアントを作成しない
+bedrock = LazyProxy(_create_bedrock_client)
+bedrock_invoke = LazyProxy(lambda: _create_bedrock_client(INVOKE_CONFIG))
+
+def build_request_body(prompt: str) -> str:
+    return json.dumps({
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        **INFERENCE_PARAMS
+    })
+
+def _call_bedrock(operation: str, call, deadline: Optional[float] = None):
+    """サーキットブレーカーを通してBedrock APIを呼び出し、レイテンシ・リトライ回数・スロットリング回数を出力する"""
+    circuit_breaker.before_call()
+    counter = {'throttles': 0}
+    started = time.monotonic()
+    retries = 0
+    status = 'Success'
+
+    def counted_call():
+        _call_stats.counter = counter
+        try:
+            return call()
+        finally:
+            _call_stats.counter = None
+
     try:
-        body = json.dumps({
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "max_tokens": 600,
-            "temperature": 0.8,
-            "top_p": 0.9,
-            "top_k": 250,
-            "anthropic_version": "bedrock-2023-05-31"
-        })
-
-        response = bedrock.invoke_model(
-            body=body,
-            modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-            contentType="application/json",
-            accept="application/json"
-        )
-        
-        response_body = json.loads(response.get('body').read())
-        logger.info(f"Claude response: {response_body}")
-        return response_body.get('content')[0].get('text', '')
-    
+        response = _run_until(counted_call, deadline)
+        retries = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        circuit_breaker.record_success()
+        return response
     except ClientError as e:
+        retries = e.response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        code = e.response['Error']['Code']
+        logger.error(f"Error invoking Bedrock: {str(e)}")
+        if code in UNAVAILABLE_ERROR_CODES:
+            status = 'Unavailable'
+            circuit_breaker.record_failure()
+            raise BedrockUnavailableError(code) from e
+        # リクエスト内容の誤りはBedrockの障害ではないためブレーカーには数えない
+        status = 'Error'
+        circuit_breaker.record_success()
+        raise BedrockError(code) from e
+    except (ConnectTimeoutError, ReadTimeoutError, EndpointConnectionError) as e:
+        logger.error(f"Bedrock connection failed: {str(e)}")
+        status = 'Unavailable'
+        circuit_breaker.record_failure()
+        raise BedrockUnavailableError(type(e).__name__) from e
+    except FutureTimeoutError as e:
+        logger.error("Bedrock call did not finish before the deadline")
+        status = 'Unavailable'
+        circuit_breaker.record_failure()
+        raise BedrockUnavailableError('DeadlineExceeded') from e
+    except BotoCoreError as e:
         logger.error(f"Error invoking Bedrock: {str(e)}")
-        raise Exception("アドバイスの生成中にエラーが発生しました。")
+        status = 'Error'
+        circuit_breaker.record_failure()
+        raise BedrockError(type(e).__name__) from e
+    finally:
+        emit_metrics(
+            {'Operation': operation, 'Status': status},
+            {
+                'LatencyMs': int((time.monotonic() - started) * 1000),
+                'Retries': retries,
+                'Throttles': counter['throttles']
+            },
+            {'LatencyMs': 'Milliseconds'},
+            namespace=METRICS_NAMESPACE
+        )
+
+def invoke_claude(prompt: str, deadline: Optional[float] = None) -> str:
+    """
+    Claude (Anthropic Claude) を呼び出してアドバイスを生成する
+
+    Args:
+        deadline: 呼び出しの期限（compute_deadline の戻り値）。超えた場合は BedrockUnavailableError
+    """
+    started = time.monotonic()
+    response = _call_bedrock('InvokeModel', lambda: bedrock_invoke.invoke_model(
+        body=build_request_body(prompt),
+        modelId=MODEL_ID,
+        contentType="application/json",
+        accept="application/json"
+    ), deadline)
+
+    response_body = json.loads(response.get('body').read())
+    logger.info(f"Claude response: {response_body}")
+    logger.info(f"Claude latency: total={int((time.monotonic() - started) * 1000)}ms")
+    return response_body.get('content')[0].get('text', '')
+
+def invoke_claude_stream(prompt: str, deadline: Optional[float] = None) -> Iterator[str]:
+    """
+    Claudeをレスポンスストリームで呼び出し、生成されたテキストを逐次返す
+
+    最初のトークンまでの時間（TTFT）と全体のレイテンシを分けてログに出力する。
+    期限（deadline）はチャンクの受信ごとに確認するため、読み込みタイムアウト分の余裕を持たせて指定する。
+    """
+    started = time.monotonic()
+    first_token_ms = None
+    response = _call_bedrock('InvokeModelWithResponseStream', lambda: bedrock.invoke_model_with_response_stream(
+        body=build_request_body(prompt),
+        modelId=MODEL_ID,
+        contentType="application/json",
+        accept="application/json"
+    ), deadline)
+
+    try:
+        for event in response.get('body'):
+            if deadline is not None and time.monotonic() > deadline:
+                logger.error("Bedrock stream did not finish before the deadline")
+                circuit_breaker.record_failure()
+                raise BedrockUnavailableError('DeadlineExceeded')
+            chunk = json.loads(event['chunk']['bytes']) if 'chunk' in event else {}
+            if chunk.get('type') != 'content_block_delta':
+                continue
+            text = chunk.get('delta', {}).get('text', '')
+            if not text:
+                continue
+            if first_token_ms is None:
+                first_token_ms = int((time.monotonic() - started) * 1000)
+                logger.info(f"Claude stream latency: firstToken={first_token_ms}ms")
+            yield text
+    except (ClientError, BotoCoreError) as e:
+        # ストリームの途中で発生したエラー（スロットリング・タイムアウトなど）
+        logger.error(f"Error reading Bedrock stream: {str(e)}")
+        circuit_breaker.record_failure()
+        raise BedrockUnavailableError(type(e).__name__) from e
+
+    logger.info(f"Claude stream latency: firstToken={first_token_ms}ms, total={int((time.monotonic() - started) * 1000)}ms")
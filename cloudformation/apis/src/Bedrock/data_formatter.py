@@ -1,13 +1,6 @@
 from typing import Dict, Any
-from decimal import Decimal
 import json
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
-
 def format_insights_response(claude_response: str) -> Dict[str, Any]:
     """Claudeのレスポンスを整形する"""
     try:
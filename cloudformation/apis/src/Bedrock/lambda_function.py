@@ -1,14 +1,21 @@
 import json
 import os
-import boto3
+import uuid
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from botocore.exceptions import ClientError
-from decimal import Decimal
-from common.utils import create_response, handle_lambda_errors, parse_request_body, decimal_default_proc
+from common.utils import create_response, handle_lambda_errors, parse_request_body, instrument_handler
+from common.dynamo_util import query_member_reports
+from common.dynamo_types import decimal_to_float
+from common.aws_clients import lazy_client, lazy_resource, lazy_table
 from prompt_generator import create_prompt, create_summary_prompt
-from bedrock_client import invoke_claude
+from bedrock_client import (
+    invoke_claude, invoke_claude_stream, compute_deadline, circuit_breaker, BedrockUnavailableError,
+    MODEL_ID, INFERENCE_PARAMS, BEDROCK_CONFIG, API_GATEWAY_TIMEOUT_SECONDS, DEADLINE_MARGIN_SECONDS
+)
+from response_cache import ResponseCache, build_cache_key
+from advice_stream import create_stream, read_stream, StreamWriter
 from data_formatter import format_insights_response
 from zoneinfo import ZoneInfo
 import traceback
@@ -18,25 +25,48 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 stage = os.environ.get('STAGE', 'dev')
 members_table_name = f'{stage}-Members'
 weekly_reports_table_name = f'{stage}-WeeklyReports'
-members_table = dynamodb.Table(members_table_name)
-weekly_reports_table = dynamodb.Table(weekly_reports_table_name)
+members_table = lazy_table(members_table_name)
+weekly_reports_table = lazy_table(weekly_reports_table_name)
 TIMEZONE = ZoneInfo(os.environ.get('TZ', 'UTC'))
 
+# 同一プロンプトへの応答キャッシュ（プロセス内LRU + DynamoDB）
+response_cache_table = lazy_table(f'{stage}-BedrockResponseCache')
+response_cache = ResponseCache(
+    response_cache_table,
+    ttl_seconds=int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '86400')),
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '128'))
+)
+
+# ストリーミング生成（途中経過をDynamoDBに書き込み、クライアントがポーリングする）の有効化フラグ
+STREAMING_ENABLED = os.environ.get('BEDROCK_STREAMING_ENABLED', 'false').lower() == 'true'
+lambda_client = lazy_client('lambda')
+
+@instrument_handler
 @handle_lambda_errors
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Lambda関数のメインハンドラー"""
     try:
+        # 非同期呼び出しによるストリーミング生成
+        if event.get('action') == 'streamAdvice':
+            # チャンクの受信ごとに期限を確認するため、読み込みタイムアウト分の余裕を持たせる
+            deadline = compute_deadline(context, margin_seconds=BEDROCK_CONFIG.read_timeout + DEADLINE_MARGIN_SECONDS)
+            return stream_advice(event['streamId'], event['prompt'], event['cacheKey'], event.get('memberUuid'), deadline)
+
         # パスの取得
         resource = event['resource']
-        
+        # API Gatewayのタイムアウト前に応答（失敗時はチケットの返却）を返せるよう、Bedrockの呼び出しに期限を設ける
+        deadline = compute_deadline(context, API_GATEWAY_TIMEOUT_SECONDS)
+
         if resource == '/bedrock/advice':
-            return handle_advice_request(event)
+            return handle_advice_request(event, deadline)
+        elif resource == '/bedrock/advice/stream':
+            return handle_advice_stream_request(event)
         elif resource == '/bedrock/summary':
-            return handle_summary_request(event)
+            return handle_summary_request(event, deadline)
         else:
             return create_response(404, {'error': '無効なパスです。'})
             
@@ -46,14 +76,18 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'error': 'リクエスト処理中にエラーが発生しました。'
         })
 
-def handle_advice_request(event: Dict[str, Any]) -> Dict[str, Any]:
-    """アドバイス生成リクエストを処理"""
+def handle_advice_request(event: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """アドバイス生成リクエストを処理（deadline: Bedrock呼び出しの期限）"""
     remaining_tickets = 0
+    member_uuid = None
+    ticket_consumed = False
     try:
         body = parse_request_body(event)
         member_uuid = body.get('memberUuid')
         week_string = body.get('weekString')
         advisor_role = body.get('advisorRole', 'manager')  # デフォルトは'manager'
+        regenerate = bool(body.get('regenerate'))  # trueの場合はキャッシュを使わず再生成
+        stream = STREAMING_ENABLED and bool(body.get('stream'))  # trueの場合は生成を非同期で開始し、途中経過をポーリングさせる
 
         if not member_uuid:
             return create_response(400, {'error': 'memberUuidが必要です。'})
@@ -69,15 +103,6 @@ def handle_advice_request(event: Dict[str, Any]) -> Dict[str, Any]:
             raise Exception('Member not found')
         
         logger.info(f"Execute advice: organization={member.get('organizationId')}, member={member.get('id')}, advisor={advisor_role}")
-        
-        # チケットのチェックと消費
-        is_available, remaining_tickets = check_and_update_advice_tickets(member, member_uuid)
-        if not is_available:
-            return create_response(403, {
-                'error': 'アドバイスチケットが不足しています。',
-                'code': 'INSUFFICIENT_TICKETS',
-                'remainingTickets': remaining_tickets
-            })
 
         # 全レポートを取得し、指定週より前のものを過去レポートとして扱う
         all_reports = get_member_reports(member_uuid)
@@ -96,10 +121,51 @@ def handle_advice_request(event: Dict[str, Any]) -> Dict[str, Any]:
         # 現在のレポートにアドバイザーロールを設定
         current_report['advisorRole'] = advisor_role
 
-        # プロンプトの生成と実行
+        # プロンプトの生成
         prompt = create_prompt(current_report, member, past_reports=past_reports)
-        claude_response = invoke_claude(prompt)
+
+        # 同一プロンプトの生成済みアドバイスがあればチケットを消費せずに返す
+        cache_key = build_cache_key(prompt, MODEL_ID, INFERENCE_PARAMS)
+        cached_advice = None if regenerate else response_cache.get('advice', cache_key)
+        if cached_advice is not None:
+            logger.info(f"Returned cached advice with advisor role: {advisor_role}")
+            return create_response(200, {
+                'advice': cached_advice,
+                'weekString': current_report.get('weekString'),
+                'memberUuid': member_uuid,
+                'remainingTickets': member.get('adviceTickets', 0),
+                'cached': True
+            })
+
+        # Bedrockが利用できない間はチケットを消費せずに即座に失敗させる
+        if circuit_breaker.is_open():
+            raise BedrockUnavailableError("Bedrock circuit is open")
+
+        # チケットのチェックと消費
+        is_available, remaining_tickets = check_and_update_advice_tickets(member, member_uuid)
+        if not is_available:
+            return create_response(403, {
+                'error': 'アドバイスチケットが不足しています。',
+                'code': 'INSUFFICIENT_TICKETS',
+                'remainingTickets': remaining_tickets
+            })
+        ticket_consumed = True
+
+        if stream:
+            stream_id = str(uuid.uuid4())
+            start_advice_stream(stream_id, prompt, cache_key, member_uuid)
+            logger.info(f"Started advice stream {stream_id} with advisor role: {advisor_role}")
+            return create_response(202, {
+                'streamId': stream_id,
+                'weekString': current_report.get('weekString'),
+                'memberUuid': member_uuid,
+                'remainingTickets': remaining_tickets
+            })
+
+        # プロンプトの実行
+        claude_response = invoke_claude(prompt, deadline)
         formatted_advice = claude_response.strip()
+        response_cache.put('advice', cache_key, formatted_advice)
 
         logger.info(f"Generated advice with advisor role: {advisor_role}")  # ログ出力を追加
 
@@ -107,19 +173,73 @@ def handle_advice_request(event: Dict[str, Any]) -> Dict[str, Any]:
             'advice': formatted_advice,
             'weekString': current_report.get('weekString'),
             'memberUuid': member_uuid,
-            'remainingTickets': remaining_tickets
+            'remainingTickets': remaining_tickets,
+            'cached': False
         })
         
     except Exception as e:
         logger.error(f"Error in handle_advice_request: {str(e)}")
         logger.error(traceback.format_exc())
+        # 生成に失敗した場合は消費したチケットを返却する
+        if ticket_consumed:
+            remaining_tickets = refund_advice_ticket(member_uuid, remaining_tickets)
+        if isinstance(e, BedrockUnavailableError):
+            return create_response(503, {
+                'error': 'アドバイス生成サービスが混み合っています。しばらくしてから再度お試しください。',
+                'code': 'BEDROCK_UNAVAILABLE',
+                'remainingTickets': remaining_tickets
+            })
         return create_response(500, {
             'error': 'アドバイスの生成中にエラーが発生しました。',
             'remainingTickets': remaining_tickets
         })
 
-def handle_summary_request(event: Dict[str, Any]) -> Dict[str, Any]:
-    """サマリー生成リクエストを処理"""
+def start_advice_stream(stream_id: str, prompt: str, cache_key: str, member_uuid: str) -> None:
+    """ストリームを作成し、自身を非同期で呼び出して生成を開始する"""
+    create_stream(response_cache_table, stream_id)
+    lambda_client.invoke(
+        FunctionName=f'{stage}-bedrock',
+        InvocationType='Event',
+        Payload=json.dumps({
+            'action': 'streamAdvice',
+            'streamId': stream_id,
+            'prompt': prompt,
+            'cacheKey': cache_key,
+            'memberUuid': member_uuid
+        })
+    )
+
+def stream_advice(stream_id: str, prompt: str, cache_key: str, member_uuid: str = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """レスポンスストリームで生成し、途中経過をストリームに書き込む"""
+    writer = StreamWriter(response_cache_table, stream_id)
+    try:
+        for chunk in invoke_claude_stream(prompt, deadline):
+            writer.append(chunk)
+        advice = writer.text.strip()
+        writer.finish(advice)
+        response_cache.put('advice', cache_key, advice)
+        return {'streamId': stream_id, 'done': True}
+    except Exception as e:
+        logger.error(f"Error in stream_advice: {str(e)}")
+        logger.error(traceback.format_exc())
+        writer.fail('アドバイスの生成中にエラーが発生しました。')
+        if member_uuid:
+            refund_advice_ticket(member_uuid)
+        return {'streamId': stream_id, 'done': True, 'error': str(e)}
+
+def handle_advice_stream_request(event: Dict[str, Any]) -> Dict[str, Any]:
+    """ストリーミング生成の途中経過を返す"""
+    stream_id = (event.get('queryStringParameters') or {}).get('streamId')
+    if not stream_id:
+        return create_response(400, {'error': 'streamIdが必要です。'})
+
+    result = read_stream(response_cache_table, stream_id)
+    if result is None:
+        return create_response(404, {'error': 'ストリームが見つかりません。'})
+    return create_response(200, result)
+
+def handle_summary_request(event: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """サマリー生成リクエストを処理（deadline: Bedrock呼び出しの期限）"""
     try:
         body = parse_request_body(event)
         member_uuid = body.get('memberUuid')
@@ -129,14 +249,26 @@ def handle_summary_request(event: Dict[str, Any]) -> Dict[str, Any]:
         reports = get_member_reports(member_uuid)
 
         prompt = create_summary_prompt(reports)
-        claude_response = invoke_claude(prompt)
+        cache_key = build_cache_key(prompt, MODEL_ID, INFERENCE_PARAMS)
+        claude_response = None if body.get('regenerate') else response_cache.get('summary', cache_key)
+        cached = claude_response is not None
+        if not cached:
+            claude_response = invoke_claude(prompt, deadline)
+            response_cache.put('summary', cache_key, claude_response)
         result = format_insights_response(claude_response)
         
         return create_response(200, {
             'data': result,
+            'cached': cached,
             'error': None
         })
         
+    except BedrockUnavailableError as e:
+        logger.error(f"Bedrock unavailable for summary request: {str(e)}")
+        return create_response(503, {
+            'error': 'サマリー生成サービスが混み合っています。しばらくしてから再度お試しください。',
+            'code': 'BEDROCK_UNAVAILABLE'
+        })
     except Exception as e:
         logger.error(f"Error processing summary request: {str(e)}")
         logger.error(traceback.format_exc())
@@ -175,39 +307,30 @@ def check_and_update_advice_tickets(member: Dict[str, Any], member_uuid: str) ->
             return False, 0
         raise e
 
-def get_report(member_uuid, week_string):
+def refund_advice_ticket(member_uuid: str, remaining_tickets: int = None) -> int:
+    """
+    消費したアドバイスチケットを1枚返却する
+
+    Returns:
+        int: 返却後のチケット数（返却に失敗した場合は remaining_tickets）
+    """
     try:
-        response = weekly_reports_table.get_item(
-            Key={
-                'memberUuid': member_uuid,
-                'weekString': week_string
-            }
+        response = members_table.update_item(
+            Key={'memberUuid': member_uuid},
+            UpdateExpression="ADD adviceTickets :val",
+            ConditionExpression="attribute_exists(memberUuid)",
+            ExpressionAttributeValues={':val': 1},
+            ReturnValues="UPDATED_NEW"
         )
-        item = response.get('Item')
-        if item:
-            return json.loads(
-                json.dumps(item, default=decimal_default_proc)
-            )
-        return None
+        logger.info(f"Refunded advice ticket for member {member_uuid}")
+        return response.get('Attributes', {}).get('adviceTickets', 0)
     except Exception as e:
-        logger.error(f"Error getting report: {str(e)}", exc_info=True)
-        return None
+        logger.error(f"Failed to refund advice ticket for member {member_uuid}: {str(e)}")
+        return remaining_tickets
 
 def get_member_reports(member_uuid):
-    weeks = get_last_6_weeks()
-    reports = []
-    
-    for week in weeks:
-        report = get_report(member_uuid, week)
-        if report:
-            reports.append(report)
-        else:
-            reports.append({
-                'memberUuid': member_uuid,
-                'weekString': week,
-                'status': 'none'
-            })
-    return reports
+    reports = query_member_reports(weekly_reports_table, member_uuid, get_last_6_weeks())
+    return decimal_to_float(reports)
 
 def get_last_6_weeks():
     """5週前から今週までの週番号を取得
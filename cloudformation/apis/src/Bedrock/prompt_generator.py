@@ -1,8 +1,13 @@
 import html
+import os
 import re
 import json
 from typing import Dict, Any, List
 from advisor_roles import ADVISOR_ROLES
+from summary_serializer import serialize_reports, SUMMARY_INPUT_TOKEN_BUDGET
+
+# サマリープロンプトの報告データ形式（'compact': 簡潔な表形式, 'json': 報告をそのままJSONで列挙）
+SUMMARY_PROMPT_FORMAT = os.environ.get('SUMMARY_PROMPT_FORMAT', 'compact')
 
 def sanitize_input(text: str) -> str:
     """入力テキストをサニタイズする"""
@@ -117,9 +122,12 @@ Assistant:"""
 
     return prompt
 
-def create_summary_prompt(reports: List[Dict[str, Any]]) -> str:
+def create_summary_prompt(reports: List[Dict[str, Any]], report_format: str = None, token_budget: int = SUMMARY_INPUT_TOKEN_BUDGET) -> str:
     """週次報告のリストからサマリープロンプトを生成する"""
-    all_reports = "\n\n".join([json.dumps(report, ensure_ascii=False) for report in reports])
+    if (report_format or SUMMARY_PROMPT_FORMAT) == 'json':
+        all_reports = "\n\n".join([json.dumps(report, ensure_ascii=False) for report in reports])
+    else:
+        all_reports = serialize_reports(reports, token_budget)
     
     prompt = f"""Human: あなたはデータアナリストです。
 以下の週次報告データを分析し、以下の2点を提供してください：
@@ -0,0 +1,80 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from common.utils import emit_metrics
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = 'WeeklyReport/Bedrock'
+
+def build_cache_key(prompt: str, model_id: str, params: Dict[str, Any]) -> str:
+    """最終プロンプト・モデルID・推論パラメータから内容アドレスのキャッシュキーを生成する"""
+    source = json.dumps({'prompt': prompt, 'modelId': model_id, 'params': params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+def emit_cache_metric(kind: str, result: str) -> None:
+    """キャッシュのヒット・ミスをメトリクスとして出力する"""
+    emit_metrics({'Kind': kind}, {f'Cache{result}': 1}, namespace=METRICS_NAMESPACE)
+
+class ResponseCache:
+    """
+    Bedrockの応答キャッシュ
+
+    プロセス内のLRUを前段に置き、DynamoDB（TTL付き）を共有キャッシュとして使う。
+    DynamoDBのTTL削除は遅延するため、読み込み時にも有効期限を確認する。
+    """
+
+    def __init__(self, table, ttl_seconds: int = 86400, max_entries: int = 128):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        now = int(time.time())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                emit_cache_metric(kind, 'Hit')
+                return entry[0]
+
+        try:
+            item = self.table.get_item(Key={'cacheKey': key}).get('Item')
+        except Exception as e:
+            logger.warning(f"Failed to read response cache: {str(e)}")
+            item = None
+
+        if item and int(item['expiresAt']) > now:
+            self._remember(key, item['response'], int(item['expiresAt']))
+            emit_cache_metric(kind, 'Hit')
+            return item['response']
+
+        emit_cache_metric(kind, 'Miss')
+        return None
+
+    def put(self, kind: str, key: str, response: str) -> None:
+        expires_at = int(time.time()) + self.ttl_seconds
+        self._remember(key, response, expires_at)
+        try:
+            self.table.put_item(Item={
+                'cacheKey': key,
+                'kind': kind,
+                'response': response,
+                'expiresAt': expires_at
+            })
+        except Exception as e:
+            # キャッシュの書き込み失敗で応答を失わないよう、警告のみとする
+            logger.warning(f"Failed to write response cache: {str(e)}")
+
+    def _remember(self, key: str, response: str, expires_at: int) -> None:
+        with self._lock:
+            self._entries[key] = (response, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
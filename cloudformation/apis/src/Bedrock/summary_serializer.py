@@ -0,0 +1,129 @@
+import os
+import re
+from typing import Dict, Any, List
+
+# サマリープロンプトに埋め込む報告データの入力トークン上限（概算）
+SUMMARY_INPUT_TOKEN_BUDGET = int(os.environ.get('SUMMARY_INPUT_TOKEN_BUDGET', '1500'))
+
+# 予算超過時に古い週から削る自由記述の項目（削る順）
+FREE_TEXT_FIELDS = ['stressHelp', 'improvements', 'issues', 'work']
+FREE_TEXT_LABELS = {
+    'work': '作業',
+    'issues': '振り返り',
+    'improvements': '改善',
+    'stressHelp': 'ストレス相談'
+}
+TRUNCATED_MARK = '…'
+MIN_TRUNCATED_LENGTH = 20
+
+def estimate_tokens(text: str) -> int:
+    """
+    入力トークン数を概算する
+
+    日本語などの非ASCII文字は1文字1トークン、ASCII文字は4文字1トークンとして数える
+    """
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+def normalize_text(text: Any) -> str:
+    if not isinstance(text, str):
+        return ''
+    return re.sub(r'\s+', ' ', text).strip()
+
+def format_number(value: Any) -> str:
+    if value is None or value == '':
+        return '-'
+    number = float(value)
+    return str(int(number)) if number.is_integer() else f'{number:.1f}'
+
+def build_project_ids(reports: List[Dict[str, Any]]) -> Dict[str, str]:
+    """報告に登場するプロジェクト名に短いIDを振る（同じ名前は1度だけ記載する）"""
+    project_ids = {}
+    for report in reports:
+        for project in report.get('projects') or []:
+            name = normalize_text(project.get('name'))
+            if name and name not in project_ids:
+                project_ids[name] = f'P{len(project_ids) + 1}'
+    return project_ids
+
+def format_work(report: Dict[str, Any], project_ids: Dict[str, str]) -> str:
+    formatted = []
+    for project in report.get('projects') or []:
+        items = [normalize_text(item.get('content')) for item in project.get('workItems') or []]
+        items = [item for item in items if item]
+        if items:
+            project_id = project_ids.get(normalize_text(project.get('name')), '-')
+            formatted.append(f"{project_id}: {'; '.join(items)}")
+    return ' / '.join(formatted)
+
+def extract_free_text(report: Dict[str, Any], project_ids: Dict[str, str]) -> Dict[str, str]:
+    return {
+        'work': format_work(report, project_ids),
+        'issues': normalize_text(report.get('issues')),
+        'improvements': normalize_text(report.get('improvements')),
+        'stressHelp': normalize_text(report.get('stressHelp'))
+    }
+
+def estimate_field_tokens(field: str, value: str) -> int:
+    """自由記述1項目（ラベル・改行を含む）の概算トークン数"""
+    return estimate_tokens(f'{FREE_TEXT_LABELS[field]}: {value}\n') if value else 0
+
+def render(reports: List[Dict[str, Any]], project_ids: Dict[str, str], free_texts: List[Dict[str, str]]) -> str:
+    lines = []
+    if project_ids:
+        lines.append('プロジェクト: ' + ', '.join(f'{project_id}={name}' for name, project_id in project_ids.items()))
+
+    # 指標の推移は1行1週の表にまとめる
+    lines.append('週|達成度|ストレス|難易度|残業h')
+    for report in reports:
+        rating = report.get('rating') or {}
+        lines.append('|'.join([
+            report.get('weekString', ''),
+            format_number(rating.get('achievement')),
+            format_number(rating.get('stress')),
+            format_number(rating.get('disability')),
+            format_number(report.get('overtimeHours'))
+        ]))
+
+    for report, texts in zip(reports, free_texts):
+        entries = [f'{FREE_TEXT_LABELS[field]}: {texts[field]}' for field in reversed(FREE_TEXT_FIELDS) if texts[field]]
+        if entries:
+            lines.append(f"[{report.get('weekString', '')}]")
+            lines.extend(entries)
+
+    return '\n'.join(lines)
+
+def serialize_reports(reports: List[Dict[str, Any]], token_budget: int = SUMMARY_INPUT_TOKEN_BUDGET) -> str:
+    """
+    サマリープロンプト用に週次報告を簡潔なテキストへ変換する
+
+    分析に必要な項目のみを残し、指標の推移は表に、プロジェクト名は重複を除いてIDに置き換える。
+    トークン予算を超える場合は、古い週の自由記述から順に半分ずつ切り詰め、最終的には削除する。
+
+    Args:
+        reports: 週次報告のリスト（古い順、未提出の週は status: 'none'）
+        token_budget: 入力トークン数の上限（概算）
+    """
+    reports = sorted(
+        [report for report in reports if report.get('status') != 'none'],
+        key=lambda report: report.get('weekString', '')
+    )
+    project_ids = build_project_ids(reports)
+    free_texts = [extract_free_text(report, project_ids) for report in reports]
+
+    text = render(reports, project_ids, free_texts)
+    tokens = estimate_tokens(text)
+    if tokens <= token_budget:
+        return text
+
+    # 再描画せずに、切り詰めた項目の差分でトークン数を更新する
+    for texts in free_texts:
+        for field in FREE_TEXT_FIELDS:
+            while tokens > token_budget and texts[field]:
+                value = texts[field].rstrip(TRUNCATED_MARK)
+                truncated = value[:len(value) // 2] + TRUNCATED_MARK if len(value) > MIN_TRUNCATED_LENGTH else ''
+                tokens -= estimate_field_tokens(field, texts[field]) - estimate_field_tokens(field, truncated)
+                texts[field] = truncated
+            if tokens <= token_budget:
+                return render(reports, project_ids, free_texts)
+    return render(reports, project_ids, free_texts)
@@ -1,13 +1,14 @@
 import json
 import logging
-import boto3
 from boto3.dynamodb.conditions import Key
 import os
 import uuid
-from decimal import Decimal
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
+from common.dynamo_util import query_pages, list_organization_members
+from common.batch_delete import ParallelBatchDeleter
 import common.dynamo_items as dynamo_items
 import common.publisher
+from common.aws_clients import lazy_client, lazy_resource, lazy_table
 import urllib.parse
 
 print('Loading function')
@@ -15,15 +16,18 @@ print('Loading function')
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 stage = os.environ.get('STAGE', 'dev')
 base_url = os.environ.get('BASE_URL', 'http://localhost:3000/')
 members_table_name = f'{stage}-Members'
-members_table = dynamodb.Table(members_table_name)
+members_table = lazy_table(members_table_name)
 organizations_table_name = f'{stage}-Organizations'
-organizations_table = dynamodb.Table(organizations_table_name)
+organizations_table = lazy_table(organizations_table_name)
 weekly_reports_table_name = f'{stage}-WeeklyReports'
-weekly_reports_table = dynamodb.Table(weekly_reports_table_name)
+weekly_reports_table = lazy_table(weekly_reports_table_name)
+lambda_client = lazy_client('lambda')
+
+PURGE_MAX_WORKERS = int(os.environ.get('PURGE_MAX_WORKERS', '8'))
 
 def get_organization(organization_id):
     try:
@@ -37,17 +41,13 @@ def get_organization(organization_id):
         logger.error(f"Error getting organization: {str(e)}", exc_info=True)
         return None
 
-def float_to_decimal(obj):
-    if isinstance(obj, float):
-        return Decimal(str(obj))
-    elif isinstance(obj, dict):
-        return {k: float_to_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [float_to_decimal(v) for v in obj]
-    return obj
-
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
+    # 非同期モードで受け付けたメンバー削除の実行（自身からの非同期呼び出し）
+    if event.get('action') == 'purgeMember':
+        return delete_member(event['memberUuid'])
+
     try:
         http_method = event['httpMethod']
         resource = event['resource']
@@ -194,8 +194,13 @@ def handle_put_email_confirmed(event):
 def handle_delete(event):
     params = event.get('queryStringParameters', {}) or {}
     if 'memberUuid' in params:
-        delete_member(params['memberUuid'])
-        return create_response(200, {'message': 'Member deleted successfully'})
+        if params.get('mode') == 'async':
+            # 削除を受け付けて即時に応答し、実際の削除はバックグラウンドで行う
+            invoke_purge_member(params['memberUuid'])
+            return create_response(202, {'message': 'Member deletion accepted'})
+
+        result = delete_member(params['memberUuid'])
+        return create_response(200, {'message': 'Member deleted successfully', **result})
     else:
         return create_response(400, {'message': 'Missing required parameters'})
 
@@ -227,16 +232,10 @@ def get_member_projects(member_uuid):
         logger.error(f"Error getting member projects: {str(e)}", exc_info=True)
         raise e
 
-def list_members(organization_id):
+def list_members(organization_id, attributes=None):
     try:
-        response = members_table.query(
-            IndexName='OrganizationIndex',
-            KeyConditionExpression=Key('organizationId').eq(organization_id)
-        )
-        members = response['Items']
         # IDの昇順でソート
-        sorted_members = sorted(members, key=lambda x: x.get('id', ''))
-        return sorted_members
+        return list_organization_members(members_table, organization_id, attributes)
     except Exception as e:
         logger.error(f"Error listing members: {str(e)}", exc_info=True)
         raise e
@@ -254,53 +253,46 @@ def update_member_projects(member_uuid, projects):
         logger.error(f"Error updating member projects: {str(e)}", exc_info=True)
         raise e
 
+def invoke_purge_member(member_uuid):
+    response = lambda_client.invoke(
+        FunctionName=f'{stage}-member',
+        InvocationType='Event',
+        Payload=json.dumps({
+            'action': 'purgeMember',
+            'memberUuid': member_uuid
+        })
+    )
+    if response['StatusCode'] != 202:
+        logger.error(f"Unexpected status code: {response['StatusCode']}")
+        raise Exception(f"Failed to start member deletion: {member_uuid}")
+
 def delete_member(member_uuid):
+    """
+    メンバーの週次レポートとメンバー情報を削除する
+
+    Returns:
+        dict: {'deletedReports': 削除した週次レポート数, 'deletedMembers': 削除したメンバー数}
+    """
     try:
-        # メンバーの週次レポートを全て削除
-        delete_member_reports(member_uuid)
-        
-        # メンバー情報を削除
-        members_table.delete_item(
-            Key={
-                'memberUuid': member_uuid
-            }
-        )
+        with ParallelBatchDeleter(dynamodb.meta.client, max_workers=PURGE_MAX_WORKERS) as deleter:
+            # メンバーの週次レポートを全て削除
+            deleted_reports = delete_member_reports(member_uuid, deleter)
+
+            # メンバー情報を削除（レポート削除が失敗した場合は再実行できるよう残す）
+            deleted_members = deleter.delete_keys(members_table_name, [{'memberUuid': member_uuid}])
+
+        logger.info(f"Deleted member {member_uuid}: {deleted_reports} reports")
+        return {'deletedReports': deleted_reports, 'deletedMembers': deleted_members}
     except Exception as e:
         logger.error(f"Error deleting member: {str(e)}", exc_info=True)
         raise e
 
-def delete_member_reports(member_uuid):
-    """メンバーの全週次レポートを削除する"""
-    try:
-        # メンバーの全レポートを取得
-        reports = []
-        last_evaluated_key = None
-        
-        while True:
-            if last_evaluated_key:
-                response = weekly_reports_table.query(
-                    KeyConditionExpression=Key('memberUuid').eq(member_uuid),
-                    ExclusiveStartKey=last_evaluated_key
-                )
-            else:
-                response = weekly_reports_table.query(
-                    KeyConditionExpression=Key('memberUuid').eq(member_uuid)
-                )
-            
-            # 見つかったレポートを削除
-            for item in response.get('Items', []):
-                weekly_reports_table.delete_item(
-                    Key={
-                        'memberUuid': member_uuid,
-                        'weekString': item['weekString']
-                    }
-                )
-            
-            last_evaluated_key = response.get('LastEvaluatedKey')
-            if not last_evaluated_key:
-                break
-                
-        logger.info(f"Deleted all reports for member: {member_uuid}")
-    except Exception as e:
-        logger.error(f"Error deleting member reports: {str(e)}", exc_info=True)
-        raise e
+def delete_member_reports(member_uuid, deleter):
+    """メンバーの全週次レポートを削除する（キーのみ取得し、25件単位で並行バッチ削除）"""
+    key_pages = query_pages(
+        dynamodb.meta.client,
+        TableName=weekly_reports_table_name,
+        KeyConditionExpression=Key('memberUuid').eq(member_uuid),
+        ProjectionExpression='memberUuid, weekString'
+    )
+    return deleter.delete_pages(weekly_reports_table_name, key_pages)
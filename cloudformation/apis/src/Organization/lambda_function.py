@@ -1,12 +1,16 @@
 import json
 import logging
-import boto3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import common.dynamo_items as dynamo_items
 import common.cognito_util as cognito_util
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
+from common.dynamo_util import query_pages, list_organization_members
+from common.batch_delete import ParallelBatchDeleter, DeadlineExceeded
+from common.aws_clients import get_client, lazy_client, lazy_resource, lazy_table
 
 print('Loading function')
 
@@ -18,19 +22,24 @@ BASE_URL = os.environ.get('BASE_URL', 'http://localhost:3000')
 WEB_PUSH_PLATFORM_ARN = os.environ['WEB_PUSH_PLATFORM_ARN']
 
 # SNSクライアント
-sns_client = boto3.client('sns')
+sns_client = lazy_client('sns')
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 organizations_table_name = f'{stage}-Organizations'
 members_table_name = f'{stage}-Members'
 reports_table_name = f'{stage}-WeeklyReports'
 user_tasks_table_name = f'{stage}-UserTasks'
-organizations_table = dynamodb.Table(organizations_table_name)
-members_table = dynamodb.Table(members_table_name)
-reports_table = dynamodb.Table(reports_table_name)
-user_tasks_table = dynamodb.Table(user_tasks_table_name)
+organizations_table = lazy_table(organizations_table_name)
+members_table = lazy_table(members_table_name)
+reports_table = lazy_table(reports_table_name)
+user_tasks_table = lazy_table(user_tasks_table_name)
 
+# 完全削除の並行度と、タイムアウト前に処理を打ち切るまでの余裕時間
+DELETION_MAX_WORKERS = int(os.environ.get('DELETION_MAX_WORKERS', '8'))
+DELETION_TIME_MARGIN_MS = int(os.environ.get('DELETION_TIME_MARGIN_MS', '5000'))
+
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
     try:
@@ -45,7 +54,7 @@ def lambda_handler(event, context):
             elif http_method == 'PUT':
                 return handle_put(event)
             elif http_method == 'DELETE':
-                return handle_delete(event)
+                return handle_delete(event, context)
         elif resource == '/organization/push-subscription':
             if http_method == 'GET':
                 return handle_get_subscription(event)
@@ -120,7 +129,7 @@ def handle_put(event):
     else:
         return create_response(400, {'message': 'Invalid data structure'})
 
-def handle_delete(event):
+def handle_delete(event, context=None):
     params = event.get('queryStringParameters', {}) or {}
     if 'organizationId' not in params:
         return create_response(400, {'message': 'Missing required parameter: organizationId'})
@@ -131,8 +140,11 @@ def handle_delete(event):
     try:
         if mode == 'complete':
             # 完全削除モード
-            delete_organization_completely(organization_id)
-            return create_response(200, {'message': 'Organization and all related data deleted successfully'})
+            result = delete_organization_completely(organization_id, context)
+            if not result['completed']:
+                # タイムアウト前に中断。再度呼び出すと続きから再開する
+                return create_response(202, {'message': 'Organization deletion is in progress', **result})
+            return create_response(200, {'message': 'Organization and all related data deleted successfully', **result})
         else:
             # 通常の削除モード（既存の処理）
             delete_organization(organization_id)
@@ -158,147 +170,168 @@ def delete_organization(organization_id):
         logger.error(f"Error in deletion process: {str(e)}", exc_info=True)
         raise Exception(f"Failed to delete organization: {str(e)}")
 
-def delete_organization_completely(organization_id):
-    """組織に関連する全てのデータを完全に削除する"""
-    try:
-        # 1. プッシュ通知登録の削除
-        delete_push_subscriptions(organization_id)
-        # 2. 週次報告データの削除
-        delete_weekly_reports(organization_id)
-        # 3. ユーザータスクの削除
-        delete_user_tasks(organization_id)
-        # 4. メンバーデータの削除
-        delete_members_by_organization(organization_id)
-        # 5. 組織データの削除
+def delete_organization_completely(organization_id, context=None):
+    """
+    組織に関連する全てのデータを完全に削除する
+
+    互いに独立した削除処理（プッシュ通知登録・週次報告・ユーザータスク・メンバー）を
+    スレッドプールで並行実行する。完了した処理は組織アイテムにチェックポイントとして記録し、
+    タイムアウト手前で中断した場合も再実行時に未完了の処理から再開する。
+    組織データは全ての処理が完了した後に削除する。
+
+    Returns:
+        dict: {'completed': bool, 'tables': {処理名: {'deleted': 件数, 'durationMs': 所要時間}}, 'durationMs': 全体の所要時間}
+    """
+    started = time.monotonic()
+    deadline = None
+    if context is not None:
+        deadline = started + (context.get_remaining_time_in_millis() - DELETION_TIME_MARGIN_MS) / 1000
+
+    checkpoint = get_deletion_checkpoint(organization_id)
+    results = {step: dict(progress) for step, progress in checkpoint.items()}
+
+    with ParallelBatchDeleter(dynamodb.meta.client, max_workers=DELETION_MAX_WORKERS, deadline=deadline) as deleter:
+        steps = {
+            'pushSubscriptions': lambda: delete_push_subscriptions(organization_id),
+            'weeklyReports': lambda: delete_weekly_reports(organization_id, deleter),
+            'userTasks': lambda: delete_user_tasks(organization_id, deleter),
+            'members': lambda: delete_members_by_organization(organization_id, deleter)
+        }
+        pending_steps = {name: step for name, step in steps.items() if not checkpoint.get(name, {}).get('completed')}
+
+        def run_step(name, step):
+            step_started = time.monotonic()
+            deleted = step()
+            progress = {
+                'completed': True,
+                'deleted': deleted,
+                'durationMs': int((time.monotonic() - step_started) * 1000)
+            }
+            save_deletion_checkpoint(organization_id, name, progress)
+            return progress
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+            futures = {name: executor.submit(run_step, name, step) for name, step in pending_steps.items()}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except DeadlineExceeded:
+                    results[name] = {'completed': False}
+                except Exception as e:
+                    logger.error(f"Error deleting {name} for organization {organization_id}: {str(e)}", exc_info=True)
+                    errors.append(f"{name}: {str(e)}")
+                    results[name] = {'completed': False}
+
+        # 未完了の処理も、このリクエストで削除できた件数を返す
+        for name, table_name in (('weeklyReports', reports_table_name), ('userTasks', user_tasks_table_name), ('members', members_table_name)):
+            if not results.get(name, {}).get('completed'):
+                results[name]['deleted'] = deleter.deleted_counts.get(table_name, 0)
+
+    if errors:
+        raise Exception(f"Failed to completely delete organization: {'; '.join(errors)}")
+
+    completed = all(progress.get('completed') for progress in results.values())
+    if completed:
+        # 5. 組織データの削除（チェックポイントも同時に削除される）
         organizations_table.delete_item(
             Key={
                 'organizationId': organization_id
             }
         )
-        logger.info(f"Deleted organization data completely for: {organization_id}")
 
-    except Exception as e:
-        logger.error(f"Error in complete deletion process: {str(e)}", exc_info=True)
-        raise Exception(f"Failed to completely delete organization: {str(e)}")
-    
-def delete_weekly_reports(organization_id):
-    """週次報告データの削除（ページネーション対応）"""
-    try:
-        logger.info(f"Starting deletion of weekly reports for organization: {organization_id}")
-        
-        last_evaluated_key = None
-        total_deleted = 0
-
-        while True:
-            # クエリパラメータの準備
-            query_params = {
-                'IndexName': 'OrganizationWeekIndex',
-                'KeyConditionExpression': Key('organizationId').eq(organization_id)
-            }
-            if last_evaluated_key:
-                query_params['ExclusiveStartKey'] = last_evaluated_key
-
-            # 週次報告の取得
-            response = reports_table.query(**query_params)
-            items = response.get('Items', [])
-
-            if not items:
-                break
-
-            # バッチ削除の実行
-            with reports_table.batch_writer() as batch:
-                for item in items:
-                    batch.delete_item(
-                        Key={
-                            'memberUuid': item['memberUuid'],
-                            'weekString': item['weekString']
-                        }
-                    )
-                    total_deleted += 1
-
-            # 次のページがあるか確認
-            last_evaluated_key = response.get('LastEvaluatedKey')
-            if not last_evaluated_key:
-                break
-
-        logger.info(f"Deleted {total_deleted} weekly reports for organization: {organization_id}")
-        return total_deleted
+    duration_ms = int((time.monotonic() - started) * 1000)
+    for name, progress in results.items():
+        logger.info(f"Deletion {name} for organization {organization_id}: {progress}")
+    logger.info(f"Complete deletion for organization {organization_id}: completed={completed}, duration={duration_ms}ms")
+
+    return {'completed': completed, 'tables': results, 'durationMs': duration_ms}
 
+def get_deletion_checkpoint(organization_id):
+    """完全削除の進捗（チェックポイント）を取得する"""
+    try:
+        response = organizations_table.get_item(
+            Key={'organizationId': organization_id},
+            ProjectionExpression='deletionCheckpoint'
+        )
+        return response.get('Item', {}).get('deletionCheckpoint', {})
     except Exception as e:
-        logger.error(f"Error deleting weekly reports: {str(e)}", exc_info=True)
-        raise
+        logger.error(f"Error getting deletion checkpoint: {str(e)}", exc_info=True)
+        return {}
 
-def delete_user_tasks(organization_id):
-    """組織に関連するユーザータスクの削除"""
+def save_deletion_checkpoint(organization_id, step, progress):
+    """完了した削除処理を組織アイテムに記録する（組織アイテムが存在しない場合は記録しない）"""
     try:
-        user_pool_id = os.environ['USER_POOL_ID']
-        user_pool_region = os.environ['USER_POOL_REGION']
-        
-        # Cognitoクライアントを正しいリージョンで初期化
-        cognito_client = boto3.client('cognito-idp', region_name=user_pool_region)
-        admin_subs = cognito_util.get_organization_admin_subs(user_pool_id, organization_id, cognito_client)
+        organizations_table.update_item(
+            Key={'organizationId': organization_id},
+            UpdateExpression='SET deletionCheckpoint = if_not_exists(deletionCheckpoint, :empty)',
+            ConditionExpression='attribute_exists(organizationId)',
+            ExpressionAttributeValues={':empty': {}}
+        )
+        organizations_table.update_item(
+            Key={'organizationId': organization_id},
+            UpdateExpression='SET deletionCheckpoint.#step = :progress',
+            ConditionExpression='attribute_exists(organizationId)',
+            ExpressionAttributeNames={'#step': step},
+            ExpressionAttributeValues={':progress': progress}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
 
-        if not admin_subs:
-            logger.warning(f"No admin users found for organization: {organization_id}")
-            return 0
+def delete_weekly_reports(organization_id, deleter):
+    """週次報告データの削除（キーのみ取得し、ページ単位で並行バッチ削除）"""
+    logger.info(f"Starting deletion of weekly reports for organization: {organization_id}")
 
-        total_deleted = 0
-        for user_id in admin_subs:
-            last_evaluated_key = None
-            while True:
-                query_params = {
-                    'KeyConditionExpression': Key('userId').eq(user_id)
-                }
-                if last_evaluated_key:
-                    query_params['ExclusiveStartKey'] = last_evaluated_key
-
-                response = user_tasks_table.query(**query_params)
-                items = response.get('Items', [])
-
-                if not items:
-                    break
-
-                with user_tasks_table.batch_writer() as batch:
-                    for item in items:
-                        batch.delete_item(
-                            Key={
-                                'userId': item['userId'],
-                                'taskId': item['taskId']
-                            }
-                        )
-                        total_deleted += 1
-
-                last_evaluated_key = response.get('LastEvaluatedKey')
-                if not last_evaluated_key:
-                    break
-
-        logger.info(f"Deleted {total_deleted} user tasks for organization: {organization_id}")
-        return total_deleted
+    key_pages = query_pages(
+        dynamodb.meta.client,
+        TableName=reports_table_name,
+        IndexName='OrganizationWeekIndex',
+        KeyConditionExpression=Key('organizationId').eq(organization_id),
+        ProjectionExpression='memberUuid, weekString'
+    )
+    total_deleted = deleter.delete_pages(reports_table_name, key_pages)
 
-    except Exception as e:
-        logger.error(f"Error deleting user tasks: {str(e)}", exc_info=True)
-        raise
+    logger.info(f"Deleted {total_deleted} weekly reports for organization: {organization_id}")
+    return total_deleted
 
-def delete_members_by_organization(organization_id):
-    """組織に属する全メンバーの削除"""
-    try:
-        members = list_members(organization_id)
-        if not members:
-            return 0
+def delete_user_tasks(organization_id, deleter):
+    """組織に関連するユーザータスクの削除"""
+    user_pool_id = os.environ['USER_POOL_ID']
+    user_pool_region = os.environ['USER_POOL_REGION']
+    
+    # Cognitoクライアントを正しいリージョンで初期化
+    cognito_client = get_client('cognito-idp', region_name=user_pool_region)
+    admin_subs = cognito_util.get_organization_admin_subs(user_pool_id, organization_id, cognito_client)
 
-        with members_table.batch_writer() as batch:
-            for member in members:
-                batch.delete_item(
-                    Key={
-                        'memberUuid': member['memberUuid']
-                    }
-                )
+    if not admin_subs:
+        logger.warning(f"No admin users found for organization: {organization_id}")
+        return 0
+
+    def key_pages():
+        for user_id in admin_subs:
+            yield from query_pages(
+                dynamodb.meta.client,
+                TableName=user_tasks_table_name,
+                KeyConditionExpression=Key('userId').eq(user_id),
+                ProjectionExpression='userId, taskId'
+            )
 
-        return len(members)
+    total_deleted = deleter.delete_pages(user_tasks_table_name, key_pages())
 
-    except Exception as e:
-        logger.error(f"Error deleting members: {str(e)}", exc_info=True)
-        raise
+    logger.info(f"Deleted {total_deleted} user tasks for organization: {organization_id}")
+    return total_deleted
+
+def delete_members_by_organization(organization_id, deleter):
+    """組織に属する全メンバーの削除"""
+    key_pages = query_pages(
+        dynamodb.meta.client,
+        TableName=members_table_name,
+        IndexName='OrganizationIndex',
+        KeyConditionExpression=Key('organizationId').eq(organization_id),
+        ProjectionExpression='memberUuid'
+    )
+    return deleter.delete_pages(members_table_name, key_pages)
 
 def delete_push_subscriptions(organization_id):
     """組織のプッシュ通知登録を削除"""
@@ -348,15 +381,10 @@ def list_organizations():
         logger.error(f"Error listing organizations: {str(e)}", exc_info=True)
         raise e
 
-def list_members(organization_id):
+def list_members(organization_id, attributes=None):
     try:
-        response = members_table.query(
-            IndexName='OrganizationIndex',
-            KeyConditionExpression=Key('organizationId').eq(organization_id)
-        )
-        members = response['Items']
-        sorted_members = sorted(members, key=lambda x: x.get('id', ''))
-        return sorted_members
+        # IDの昇順でソート
+        return list_organization_members(members_table, organization_id, attributes)
     except Exception as e:
         logger.error(f"Error listing members: {str(e)}", exc_info=True)
         raise e
@@ -369,7 +397,7 @@ def delete_organization_and_members(organization_id):
             }
         )
 
-        members = list_members(organization_id)
+        members = list_members(organization_id, ['memberUuid'])
         with members_table.batch_writer() as batch:
             for member in members:
                 batch.delete_item(
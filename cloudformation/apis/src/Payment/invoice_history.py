@@ -0,0 +1,113 @@
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import stripe
+from common.aws_clients import lazy_table
+from common.utils import emit_metrics
+from payment_config import PaymentConfig
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = 'WeeklyReport/Payment'
+
+# 請求履歴のキャッシュを削除するWebhookのイベント
+INVALIDATING_EVENT_PREFIXES = ('invoice.', 'charge.', 'customer.subscription.')
+
+def _fetch_upcoming(customer_id: str) -> Optional[Any]:
+    try:
+        return stripe.Invoice.upcoming(customer=customer_id, expand=['lines.data'])
+    except stripe.error.InvalidRequestError as e:
+        # 次回の請求が無い顧客（フリープランなど）
+        logger.debug(f"No upcoming invoice: {str(e)}")
+        return None
+
+def fetch_invoice_page(customer_id: str, limit: int, starting_after: Optional[str] = None) -> Tuple[Any, Optional[Any]]:
+    """
+    請求書の一覧（支払い・返金を展開したもの）と次回の請求書を並行して取得する
+
+    次回の請求書は1ページ目（starting_after が無い場合）のみ取得する。
+
+    Returns:
+        (請求書の一覧, 次回の請求書 または None)
+    """
+    params = {'customer': customer_id, 'limit': limit, 'expand': ['data.charge.refunds']}
+    if starting_after:
+        params['starting_after'] = starting_after
+        return stripe.Invoice.list(**params), None
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        invoices = executor.submit(stripe.Invoice.list, **params)
+        upcoming = executor.submit(_fetch_upcoming, customer_id)
+        return invoices.result(), upcoming.result()
+
+def invoice_refunds(invoice: Any) -> List[Any]:
+    """展開済みの支払い（data.charge.refunds）から請求書の返金を取り出す"""
+    charge = invoice.get('charge')
+    if not charge or isinstance(charge, str):
+        return []
+    refunds = charge.get('refunds')
+    return refunds.data if refunds else []
+
+def next_cursor(invoices: Any) -> Optional[str]:
+    """次のページを取得するカーソル（最後の請求書のID）"""
+    return invoices.data[-1].id if invoices.has_more and invoices.data else None
+
+class InvoiceHistoryCache:
+    """
+    顧客ごとの請求履歴（1ページ目の整形済みの応答）のキャッシュ
+
+    Webhook（invoice.*・charge.*・customer.subscription.*）とプラン変更で削除し、
+    Webhookの取りこぼしに備えてTTL（expiresAt）でも失効させる。
+    DynamoDBのTTL削除は遅延するため、読み込み時にも有効期限を確認する。
+    """
+
+    def __init__(self, table, ttl_seconds: int = 900):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = self.table.get_item(Key={'customerId': customer_id}).get('Item')
+        except Exception as e:
+            logger.warning(f"Failed to read invoice history cache: {str(e)}")
+            item = None
+
+        if item and int(item['expiresAt']) > int(time.time()):
+            emit_metrics({'Kind': 'invoices'}, {'CacheHit': 1}, namespace=METRICS_NAMESPACE)
+            return json.loads(item['history'])
+        emit_metrics({'Kind': 'invoices'}, {'CacheMiss': 1}, namespace=METRICS_NAMESPACE)
+        return None
+
+    def put(self, customer_id: str, history: Dict[str, Any]) -> None:
+        try:
+            self.table.put_item(Item={
+                'customerId': customer_id,
+                'history': json.dumps(history, ensure_ascii=False),
+                'expiresAt': int(time.time()) + self.ttl_seconds
+            })
+        except Exception as e:
+            # キャッシュの書き込み失敗で応答を失わないよう、警告のみとする
+            logger.warning(f"Failed to write invoice history cache: {str(e)}")
+
+    def invalidate(self, customer_id: Optional[str]) -> None:
+        """キャッシュを削除する（失敗してもTTLで失効するため例外は送出しない）"""
+        if not customer_id:
+            return
+        try:
+            self.table.delete_item(Key={'customerId': customer_id})
+        except Exception as e:
+            logger.warning(f"Failed to invalidate invoice history cache for {customer_id}: {str(e)}")
+
+    def apply_event(self, event: Any) -> bool:
+        """Webhookのイベントが請求履歴に影響する場合はキャッシュを削除する"""
+        if not event['type'].startswith(INVALIDATING_EVENT_PREFIXES):
+            return False
+        self.invalidate(event['data']['object'].get('customer'))
+        return True
+
+invoice_history = InvoiceHistoryCache(
+    lazy_table(PaymentConfig.INVOICE_HISTORY_TABLE_NAME),
+    ttl_seconds=PaymentConfig.INVOICE_HISTORY_TTL_SECONDS
+)
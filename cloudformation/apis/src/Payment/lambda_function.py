@@ -1,4 +1,5 @@
 import json
+import base64
 import stripe
 import os
 import time
@@ -6,16 +7,36 @@ import traceback
 import uuid
 import logging
 import datetime
+import re
 from typing import Dict, Any
-from common.utils import create_response
+from urllib.parse import urlparse
+from common.utils import create_response, instrument_handler, timed_call
 from payment_config import PaymentConfig
+from subscription_mirror import subscription_mirror, format_record
+from invoice_history import invoice_history, fetch_invoice_page, invoice_refunds, next_cursor
 
 # ロガーの設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+class InstrumentedHttpClient:
+    """Stripe APIの呼び出し時間をリクエストの計測に記録するHTTPクライアント"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def request_with_retries(self, method, url, headers, post_data=None):
+        # IDを含むパスは同じ操作として集計する（例: /v1/customers/{id}）
+        path = re.sub(r'/[a-z]+_[A-Za-z0-9]+', '/{id}', urlparse(url).path)
+        with timed_call('stripe', f'{method.upper()} {path}'):
+            return self._client.request_with_retries(method, url, headers, post_data)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
 # Stripeの設定
 stripe.api_key = PaymentConfig.API_KEY
+stripe.default_http_client = InstrumentedHttpClient(stripe.http_client.new_default_http_client())
 
 class PaymentError(Exception):
     """支払い処理に関するカスタムエラー"""
@@ -187,6 +208,7 @@ def create_subscription(body: Dict, client_ip: str) -> Dict:
                 )
             
             logger.info(f"Subscription created successfully - RequestId: {request_id}, SubscriptionId: {subscription.id}, CustomerId: {customer.id}, PriceId: {price_id}")
+            record_subscription_change(subscription)
             return create_subscription_response(subscription, price_id, account_count)
             
         except stripe.error.CardError as e:
@@ -230,8 +252,11 @@ def update_subscription(body: Dict) -> Dict:
         metadata={'account_count': str(new_account_count)}
     )
 
+    updated_subscription = stripe.Subscription.retrieve(subscription_id)
+    record_subscription_change(updated_subscription)
+
     return create_subscription_response(
-        stripe.Subscription.retrieve(subscription_id),
+        updated_subscription,
         PaymentConfig.PRICE_ID_BUSINESS,
         new_account_count,
         message=ResponseMessages.ACCOUNT_COUNT_UPDATED
@@ -357,6 +382,7 @@ def handle_paid_plan_change(subscription: stripe.Subscription, new_price_id: str
         )
         
         logger.info(f"Plan change completed - RequestId: {request_id}, SubscriptionId: {subscription.id}, NewPriceId: {new_price_id}")
+        record_subscription_change(updated_subscription)
         return create_subscription_response(
             updated_subscription,
             new_price_id,
@@ -446,6 +472,7 @@ def handle_free_plan_change(subscription: stripe.Subscription, body: Dict) -> Di
             prorate=True,  # 日割り計算を有効化
             invoice_now=True  # 即時請求
         )
+        record_subscription_change(canceled_subscription)
         
         #print(f"Debug - Subscription canceled with proration: used_days={used_days}, total_days={total_days}")
         #print(f"Debug - Upcoming invoice: {json.dumps(upcoming_invoice, indent=2)}")
@@ -616,24 +643,24 @@ def get_invoices(body: Dict) -> Dict:
         if not customer_id:
             return {'data': {'invoices': []}}
 
+        # startingAfter（前のページの nextCursor）で続きのページを取得する
+        starting_after = body.get('startingAfter')
+        limit = min(max(int(body.get('limit') or PaymentConfig.INVOICE_PAGE_SIZE), 1), PaymentConfig.INVOICE_PAGE_SIZE_MAX)
+
+        # 請求履歴の画面を開いたときの1ページ目のみキャッシュする
+        cacheable = not starting_after and limit == PaymentConfig.INVOICE_PAGE_SIZE
+        if cacheable:
+            cached = invoice_history.get(customer_id)
+            if cached is not None:
+                return {'data': cached}
+
         formatted_transactions = []
 
-        # すべての請求書を取得（最新の状態を含める）
-        invoices = stripe.Invoice.list(
-            customer=customer_id,
-            limit=24,  # 取得上限を増やす
-            expand=['data.charge', 'data.lines.data']
-        )
+        # 請求書（返金を含む）と保留中のインボイス（プロレーション含む）を並行して取得
+        invoices, upcoming = fetch_invoice_page(customer_id, limit, starting_after)
 
-        # 保留中のインボイスを取得（プロレーション含む）
-        try:
-            upcoming = stripe.Invoice.upcoming(
-                customer=customer_id,
-                expand=['lines.data']
-            )
-            #print(f"Debug - Upcoming invoice: {json.dumps(upcoming, indent=2)}")
-            
-            # 保留中のインボイスアイテムを処理
+        # 保留中のインボイスアイテムを処理
+        if upcoming:
             for line in upcoming.lines.data:
                 description = convert_description_date(line.description, line.period.start)
                 
@@ -647,14 +674,9 @@ def get_invoices(body: Dict) -> Dict:
                     'url': None,
                     'upcoming': True
                 })
-        except stripe.error.InvalidRequestError as e:
-            print(f"Debug - No upcoming invoice: {str(e)}")
-            pass
 
         # 既存のインボイス処理
         for invoice in invoices.data:
-            #print(f"Debug - Processing invoice: {invoice.id}")
-            
             # 通常の請求とプロレーション処理
             for line in invoice.lines.data:
                 description = convert_description_date(line.description, line.period.start)
@@ -669,75 +691,91 @@ def get_invoices(body: Dict) -> Dict:
                     'url': invoice.hosted_invoice_url
                 })
 
-            # 返金処理
-            if (invoice.charge):
-                refunds = stripe.Refund.list(charge=invoice.charge)
-                for refund in refunds.data:
-                    formatted_transactions.append({
-                        'id': refund.id,
-                        'date': refund.created,
-                        'amount': -refund.amount,
-                        'status': refund.status,
-                        'type': 'refund',
-                        'description': '返金',
-                        'url': None
-                    })
+            # 返金処理（支払いに展開済みの返金を使う）
+            for refund in invoice_refunds(invoice):
+                formatted_transactions.append({
+                    'id': refund.id,
+                    'date': refund.created,
+                    'amount': -refund.amount,
+                    'status': refund.status,
+                    'type': 'refund',
+                    'description': '返金',
+                    'url': None
+                })
 
         # 日付でソート（新しい順）
         formatted_transactions.sort(key=lambda x: x['date'], reverse=True)
-        
-        #print(f"Debug - Final transactions: {json.dumps(formatted_transactions, indent=2)}")
 
-        return {'data': {'invoices': formatted_transactions}}
+        page = {
+            'invoices': formatted_transactions,
+            'hasMore': invoices.has_more,
+            'nextCursor': next_cursor(invoices)
+        }
+        if cacheable:
+            invoice_history.put(customer_id, page)
+        return {'data': page}
         
     except Exception as e:
         print(f"Error fetching invoices: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
         return {'data': {'invoices': []}, 'error': str(e)}
 
+def record_subscription_change(subscription: Any) -> None:
+    """サブスクリプションを変更したAPIの結果をミラーに反映し、請求履歴のキャッシュを削除する"""
+    subscription_mirror.save_subscription(subscription)
+    invoice_history.invalidate(subscription.get('customer') if subscription else None)
+
+def fetch_active_subscription(customer_id: str) -> Any:
+    """Stripeから有効なサブスクリプションを取得する（無い場合はNone）"""
+    subscriptions = stripe.Subscription.list(
+        customer=customer_id,
+        limit=1,
+        status='active',
+        expand=['data.items.data.price']
+    )
+    return subscriptions.data[0] if subscriptions.data else None
+
 def get_subscription_info(customer_id: str) -> Dict:
-    """顧客IDからサブスクリプション情報を取得"""
+    """顧客IDからサブスクリプション情報を取得（Webhookで同期したミラーから返し、無い・古い場合はStripeから取得）"""
     try:
-        subscriptions = stripe.Subscription.list(
-            customer=customer_id,
-            limit=1,
-            status='active',
-            expand=['data.items.data.price']
-        )
+        record = subscription_mirror.read(customer_id, lambda: fetch_active_subscription(customer_id))
+        return format_record(record)
+    except stripe.error.StripeError as e:
+        raise PaymentError(f'サブスクリプション情報の取得に失敗しました: {str(e)}')
 
-        if not subscriptions.data:
-            return {
-                'planId': 'free',
-                'priceId': PaymentConfig.PRICE_ID_FREE,  # 明示的に設定
-                'accountCount': 0,
-                'subscriptionId': None,
-                'stripeCustomerId': customer_id
-            }
+def handle_webhook(event: Dict[str, Any]) -> Dict[str, Any]:
+    """StripeのWebhookを受信し、署名を検証してサブスクリプションのミラー・請求履歴のキャッシュに反映する"""
+    payload = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        payload = base64.b64decode(payload).decode('utf-8')
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    if not PaymentConfig.WEBHOOK_SECRET:
+        # 署名の秘密鍵が無い状態で受け付けると、誰でもミラーを書き換えられる
+        logger.error("STRIPE_WEBHOOK_SECRET is not configured")
+        return create_response(503, {'error': 'Webhookは設定されていません'})
 
-        subscription = subscriptions.data[0]
-        account_count = int(subscription.metadata.get('account_count', 0))
-        
-        # プランIDをメタデータから直接取得
-        plan_id = subscription.metadata.get('plan_id', 'free')
-        
-        # 価格IDをlookupテーブルから逆引き
-        price_id = None
-        for config_price_id, config_plan in PaymentConfig.PRICE_TO_PLAN_MAP.items():
-            if config_plan == plan_id:
-                price_id = config_price_id
-                break
-        
-        return {
-            'planId': plan_id,
-            'priceId': price_id,
-            'accountCount': account_count,
-            'subscriptionId': subscription.id,
-            'stripeCustomerId': customer_id
-        }
+    try:
+        stripe_event = stripe.Webhook.construct_event(
+            payload,
+            headers.get('stripe-signature', ''),
+            PaymentConfig.WEBHOOK_SECRET,
+            tolerance=PaymentConfig.WEBHOOK_TOLERANCE_SECONDS
+        )
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        logger.warning(f"Rejected Stripe webhook: {str(e)}")
+        return create_response(400, {'error': '署名の検証に失敗しました'})
 
-    except stripe.error.StripeError as e:
-        raise PaymentError(f'サブスクリプション情報の取得に失敗しました: {str(e)}')
+    try:
+        result = subscription_mirror.apply_event(stripe_event)
+        invoice_history.apply_event(stripe_event)
+    except Exception as e:
+        # 500を返してStripeに再送させる
+        log_error(e, {'event_id': stripe_event['id'], 'event_type': stripe_event['type']})
+        return create_response(500, {'error': 'Webhookの処理に失敗しました'})
+    logger.info(f"Stripe webhook {stripe_event['id']} ({stripe_event['type']}): {result}")
+    return create_response(200, {'received': True, 'result': result})
 
+@instrument_handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """メインハンドラー関数"""
     request_id = context.aws_request_id
@@ -745,6 +783,10 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method = event.get('httpMethod', '')
     
     logger.info(f"Request received - RequestId: {request_id}, Path: {path}, Method: {method}")
+
+    # Webhookは署名の検証に受信したままのボディを使うため、JSONとして読み込む前に処理する
+    if path == '/payment/webhook' and method == 'POST':
+        return handle_webhook(event)
     
     try:
         body = json.loads(event.get('body', '{}'))
@@ -6,6 +6,8 @@ class PaymentConfig:
     CURRENCY = 'jpy'
     BILLING_INTERVAL = 'month'
     API_VERSION = '2023-10-16'
+    WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+    WEBHOOK_TOLERANCE_SECONDS = 300
 
     # 環境設定
     STAGE_TO_ENV_MAP = {
@@ -14,6 +16,16 @@ class PaymentConfig:
     }
     ENVIRONMENT = STAGE_TO_ENV_MAP.get(os.environ.get('STAGE', 'dev'), 'development')
 
+    # サブスクリプションのミラー（DynamoDB）
+    SUBSCRIPTION_TABLE_NAME = f"{os.environ.get('STAGE', 'dev')}-StripeSubscriptions"
+    SUBSCRIPTION_MIRROR_MAX_AGE_SECONDS = int(os.environ.get('SUBSCRIPTION_MIRROR_MAX_AGE_SECONDS', '3600'))
+
+    # 請求履歴（1ページの件数と、1ページ目のキャッシュ）
+    INVOICE_PAGE_SIZE = 24
+    INVOICE_PAGE_SIZE_MAX = 100
+    INVOICE_HISTORY_TABLE_NAME = f"{os.environ.get('STAGE', 'dev')}-StripeInvoiceHistory"
+    INVOICE_HISTORY_TTL_SECONDS = int(os.environ.get('INVOICE_HISTORY_TTL_SECONDS', '900'))
+
     # 環境別のStripe ID設定
     STRIPE_IDS = {
         'development': {
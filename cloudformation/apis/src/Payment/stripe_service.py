@@ -5,6 +5,8 @@ import time
 import datetime
 from typing import Dict, Any, Optional, List
 from payment_config import PaymentConfig
+from subscription_mirror import SubscriptionMirror, subscription_mirror, format_record
+from invoice_history import InvoiceHistoryCache, invoice_history, fetch_invoice_page, invoice_refunds, next_cursor
 
 logger = logging.getLogger()
 
@@ -13,9 +15,16 @@ class PaymentError(Exception):
     pass
 
 class StripeService:
-    def __init__(self):
+    def __init__(self, mirror: Optional[SubscriptionMirror] = None, invoice_cache: Optional[InvoiceHistoryCache] = None):
         stripe.api_key = PaymentConfig.API_KEY
         self.logger = logger
+        self.mirror = mirror or subscription_mirror
+        self.invoice_cache = invoice_cache or invoice_history
+
+    def _record_subscription_change(self, subscription: Any) -> None:
+        """サブスクリプションの変更をミラーに反映し、請求履歴のキャッシュを削除する"""
+        self.mirror.save_subscription(subscription)
+        self.invoice_cache.invalidate(subscription.get('customer') if subscription else None)
 
     def _setup_logging(self):
         """ロギング設定"""
@@ -101,21 +110,25 @@ class StripeService:
         else:
             subscription_items = [{'price': price_id}]
 
-        return stripe.Subscription.create(
+        subscription = stripe.Subscription.create(
             customer=customer_id,
             items=subscription_items,
             metadata=metadata,
             payment_behavior='error_if_incomplete',
             **kwargs
         )
+        self._record_subscription_change(subscription)
+        return subscription
 
     def modify_subscription(self, subscription_id: str, metadata: Dict[str, str], **kwargs) -> stripe.Subscription:
         """サブスクリプションの更新"""
-        return stripe.Subscription.modify(
+        subscription = stripe.Subscription.modify(
             subscription_id,
             metadata=metadata,
             **kwargs
         )
+        self._record_subscription_change(subscription)
+        return subscription
 
     def _is_business_plan_update(self, new_price_id: str, subscription_item) -> bool:
         """ビジネスプラン内での更新かどうかを判定"""
@@ -175,6 +188,7 @@ class StripeService:
                 'plan_id': PaymentConfig.PRICE_TO_PLAN_MAP[new_price_id]
             }
         )
+        self._record_subscription_change(updated_subscription)
         return self.create_subscription_response(
             updated_subscription,
             new_price_id,
@@ -280,36 +294,39 @@ class StripeService:
             **kwargs
         ).data
 
-    def get_formatted_invoices(self, customer_id: str) -> Dict:
-        """請求書一覧の取得とフォーマット"""
+    def get_formatted_invoices(self, customer_id: str, starting_after: Optional[str] = None,
+                               limit: int = PaymentConfig.INVOICE_PAGE_SIZE) -> Dict:
+        """請求書一覧の取得とフォーマット（starting_after で続きのページを取得）"""
         try:
             if not customer_id:
                 return {'data': {'invoices': []}}
 
-            formatted_transactions = []
+            # 1ページ目のみキャッシュする
+            cacheable = not starting_after and limit == PaymentConfig.INVOICE_PAGE_SIZE
+            if cacheable:
+                cached = self.invoice_cache.get(customer_id)
+                if cached is not None:
+                    return {'data': cached}
 
-            # 請求書一覧を取得
-            invoices = stripe.Invoice.list(
-                customer=customer_id,
-                limit=24,
-                expand=['data.charge', 'data.lines.data']
-            )
+            formatted_transactions = []
 
-            # 次回の請求書を取得
-            try:
-                upcoming = stripe.Invoice.upcoming(
-                    customer=customer_id,
-                    expand=['lines.data']
-                )
-                self.logger.debug("Upcoming invoice: %s", json.dumps(upcoming, indent=2))
+            # 請求書一覧（返金を含む）と次回の請求書を並行して取得
+            invoices, upcoming = fetch_invoice_page(customer_id, limit, starting_after)
+            if upcoming:
                 formatted_transactions.append(self._format_invoice(upcoming, is_upcoming=True))
-            except stripe.error.InvalidRequestError:
-                upcoming = None
 
-            for invoice in invoices:
+            for invoice in invoices.data:
                 formatted_transactions.append(self._format_invoice(invoice))
+                self._add_refund_transactions(formatted_transactions, invoice)
 
-            return {'data': {'invoices': formatted_transactions}}
+            page = {
+                'invoices': formatted_transactions,
+                'hasMore': invoices.has_more,
+                'nextCursor': next_cursor(invoices)
+            }
+            if cacheable:
+                self.invoice_cache.put(customer_id, page)
+            return {'data': page}
         except stripe.error.StripeError as e:
             self._handle_error('請求書の取得', e, customer_id=customer_id)
 
@@ -396,10 +413,9 @@ class StripeService:
             'upcoming': is_upcoming
         }
 
-    def _add_refund_transactions(self, transactions: List[Dict], charge_id: str) -> None:
-        """返金情報の追加"""
-        refunds = stripe.Refund.list(charge=charge_id)
-        for refund in refunds.data:
+    def _add_refund_transactions(self, transactions: List[Dict], invoice: stripe.Invoice) -> None:
+        """返金情報の追加（data.charge.refunds を展開して取得した請求書を使う）"""
+        for refund in invoice_refunds(invoice):
             transactions.append({
                 'id': refund.id,
                 'date': refund.created,
@@ -436,54 +452,27 @@ class StripeService:
         }
 
     def get_subscription_info(self, customer_id: str) -> Dict:
-        """顧客IDからサブスクリプション情報を取得"""
+        """顧客IDからサブスクリプション情報を取得（ミラーから返し、無い・古い場合はStripeから取得）"""
         try:
-            subscriptions = stripe.Subscription.list(
-                customer=customer_id,
-                limit=1,
-                status='active',
-                expand=['data.items.data.price']
-            )
-
-            if not subscriptions.data:
-                return self._create_free_plan_info(customer_id)
-
-            subscription = subscriptions.data[0]
-            return self._format_subscription_info(subscription, customer_id)
+            record = self.mirror.read(customer_id, lambda: self._fetch_active_subscription(customer_id))
         except stripe.error.StripeError as e:
             self._log_error(e)
             raise PaymentError(f'サブスクリプション情報の取得に失敗しました: {str(e)}')
 
-    def _create_free_plan_info(self, customer_id: str) -> Dict:
-        """フリープラン情報の生成"""
-        return {
-            'planId': 'free',
-            'priceId': PaymentConfig.PRICE_ID_FREE,
-            'accountCount': 0,
-            'subscriptionId': None,
-            'stripeCustomerId': customer_id
-        }
-
-    def _format_subscription_info(self, subscription: stripe.Subscription, customer_id: str) -> Dict:
-        """サブスクリプション情報のフォーマット"""
-        account_count = int(subscription.metadata.get('account_count', 0))
-        plan_id = subscription.metadata.get('plan_id', 'free')
-        price_id = self._get_price_id_from_plan(plan_id)
+        info = format_record(record)
+        # プランに対応する価格が無い場合はフリープランの価格とする
+        info['priceId'] = info['priceId'] or PaymentConfig.PRICE_ID_FREE
+        return info
 
-        return {
-            'planId': plan_id,
-            'priceId': price_id,
-            'accountCount': account_count,
-            'subscriptionId': subscription.id,
-            'stripeCustomerId': customer_id
-        }
-
-    def _get_price_id_from_plan(self, plan_id: str) -> Optional[str]:
-        """プランIDから価格IDを取得"""
-        for price_id, mapped_plan in PaymentConfig.PRICE_TO_PLAN_MAP.items():
-            if mapped_plan == plan_id:
-                return price_id
-        return PaymentConfig.PRICE_ID_FREE
+    def _fetch_active_subscription(self, customer_id: str) -> Optional[stripe.Subscription]:
+        """Stripeから有効なサブスクリプションを取得（無い場合はNone）"""
+        subscriptions = stripe.Subscription.list(
+            customer=customer_id,
+            limit=1,
+            status='active',
+            expand=['data.items.data.price']
+        )
+        return subscriptions.data[0] if subscriptions.data else None
 
     def handle_plan_change(self, subscription_id: str, new_price_id: str, new_account_count: int) -> Dict:
         """プラン変更の処理"""
@@ -532,6 +521,7 @@ class StripeService:
             prorate=True,
             invoice_now=True
         )
+        self._record_subscription_change(canceled_subscription)
 
         return {
             'message': f'プランを解約し、フリープランに変更しました（利用日数: {used_days}日）',
@@ -592,6 +582,7 @@ class StripeService:
                 'account_count': str(new_account_count)
             }
         )
+        self._record_subscription_change(updated_subscription)
         return self.create_subscription_response(
             updated_subscription,
             updated_subscription.items.data[0].price.id,
@@ -620,7 +611,7 @@ class StripeService:
     def _change_to_free_plan(self, subscription: stripe.Subscription) -> Dict:
         """フリープランへの変更処理"""
         # 現在のサブスクリプションをキャンセル
-        stripe.Subscription.delete(subscription.id)
+        self._record_subscription_change(stripe.Subscription.delete(subscription.id))
         
         return self.create_subscription_response(
             None,
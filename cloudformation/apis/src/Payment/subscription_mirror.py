@@ -0,0 +1,202 @@
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+import stripe
+from common.aws_clients import lazy_table
+from common.utils import emit_metrics
+from payment_config import PaymentConfig
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = 'WeeklyReport/Payment'
+
+# 有料プランとして扱うサブスクリプションの状態（Subscription.list の status='active' と同じ）
+ACTIVE_STATUSES = ('active',)
+
+def emit_mirror_metric(result: str) -> None:
+    """ミラーの参照結果（Hit・Miss・Stale）をメトリクスとして出力する"""
+    emit_metrics({'Kind': 'subscription'}, {f'Mirror{result}': 1}, namespace=METRICS_NAMESPACE)
+
+def build_record(customer_id: str, subscription: Any) -> Dict[str, Any]:
+    """サブスクリプション（有効なものが無い場合はNone）から顧客ごとのプラン情報を作成する"""
+    if not subscription or subscription.get('status') not in ACTIVE_STATUSES:
+        return {
+            'customerId': customer_id,
+            'planId': 'free',
+            'priceId': PaymentConfig.PRICE_ID_FREE,
+            'accountCount': 0,
+            'subscriptionId': None,
+            'status': subscription.get('status') if subscription else None,
+            'currentPeriodEnd': None,
+            'cancelAtPeriodEnd': False
+        }
+
+    metadata = subscription.get('metadata') or {}
+    plan_id = metadata.get('plan_id', 'free')
+    return {
+        'customerId': customer_id,
+        'planId': plan_id,
+        'priceId': PaymentConfig.PLAN_TO_PRICE_MAP.get(plan_id),
+        'accountCount': int(metadata.get('account_count', 0)),
+        'subscriptionId': subscription.get('id'),
+        'status': subscription.get('status'),
+        'currentPeriodEnd': subscription.get('current_period_end'),
+        'cancelAtPeriodEnd': bool(subscription.get('cancel_at_period_end'))
+    }
+
+def format_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """プラン情報をAPIの応答形式に変換する"""
+    return {
+        'planId': record.get('planId', 'free'),
+        'priceId': record.get('priceId'),
+        'accountCount': int(record.get('accountCount') or 0),
+        'subscriptionId': record.get('subscriptionId'),
+        'stripeCustomerId': record['customerId']
+    }
+
+class SubscriptionMirror:
+    """
+    Stripeのサブスクリプションを顧客ごとにDynamoDBへ複製したもの
+
+    Webhook（customer.subscription.*・invoice.*）とサブスクリプションを変更したAPIの結果で更新し、
+    プラン情報の参照はStripeを呼ばずにここから返す。
+    Webhookの取りこぼしに備えて、同期から max_age_seconds を過ぎた情報はStripeから取得し直す。
+    イベントは順不同・重複して届くため、version（イベントの作成時刻）が古い更新は捨てる。
+    """
+
+    def __init__(self, table, max_age_seconds: int = 3600):
+        self.table = table
+        self.max_age_seconds = max_age_seconds
+
+    def get(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = self.table.get_item(Key={'customerId': customer_id}).get('Item')
+        except Exception as e:
+            logger.warning(f"Failed to read subscription mirror: {str(e)}")
+            return None
+        # 請求書のイベントだけが届いた顧客はプラン情報を持たない
+        return item if item and 'planId' in item else None
+
+    def is_fresh(self, record: Dict[str, Any], now: Optional[int] = None) -> bool:
+        now = now or int(time.time())
+        return now - int(record.get('syncedAt', 0)) <= self.max_age_seconds
+
+    def read(self, customer_id: str, fetch_live: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        顧客のプラン情報を返す
+
+        Args:
+            customer_id: Stripeの顧客ID
+            fetch_live: ミラーが無い・古い場合に有効なサブスクリプション（無ければNone）をStripeから取得する関数
+        """
+        record = self.get(customer_id)
+        if record and self.is_fresh(record):
+            emit_mirror_metric('Hit')
+            return record
+
+        try:
+            subscription = fetch_live()
+        except stripe.error.StripeError as e:
+            if record:
+                # Stripeに障害がある間は古い情報で応答する
+                logger.warning(f"Serving stale subscription mirror for {customer_id}: {str(e)}")
+                emit_mirror_metric('Stale')
+                return record
+            raise
+
+        emit_mirror_metric('Miss')
+        record = build_record(customer_id, subscription)
+        try:
+            self._put(record, int(time.time()), 'api')
+        except Exception as e:
+            logger.warning(f"Failed to update subscription mirror for {customer_id}: {str(e)}")
+        return record
+
+    def save_subscription(self, subscription: Any, version: Optional[int] = None, source: str = 'api') -> bool:
+        """サブスクリプションを変更したAPIの結果を反映する（失敗しても例外は送出しない）"""
+        customer_id = subscription.get('customer') if subscription else None
+        if not customer_id:
+            return False
+        try:
+            return self._put(build_record(customer_id, subscription), version or int(time.time()), source, self._condition_for(subscription))
+        except Exception as e:
+            logger.warning(f"Failed to update subscription mirror for {customer_id}: {str(e)}")
+            return False
+
+    def save_invoice(self, invoice: Any, event_type: str, version: int) -> bool:
+        """請求書の最新の状態を記録する（プラン情報は変更しない）"""
+        customer_id = invoice.get('customer')
+        if not customer_id:
+            return False
+        try:
+            self.table.update_item(
+                Key={'customerId': customer_id},
+                UpdateExpression='SET latestInvoice = :invoice',
+                ConditionExpression=Attr('latestInvoice').not_exists() | Attr('latestInvoice.version').lte(version),
+                ExpressionAttributeValues={':invoice': {
+                    'id': invoice.get('id'),
+                    'subscriptionId': invoice.get('subscription'),
+                    'status': invoice.get('status'),
+                    'amountDue': invoice.get('amount_due'),
+                    'amountPaid': invoice.get('amount_paid'),
+                    'eventType': event_type,
+                    'version': version
+                }}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def apply_event(self, event: Any) -> str:
+        """Webhookのイベントを反映し、結果（applied・stale・ignored）を返す"""
+        event_type = event['type']
+        obj = event['data']['object']
+        version = int(event['created'])
+
+        if event_type.startswith('customer.subscription.'):
+            applied = self._put(build_record(obj['customer'], obj), version, 'webhook', self._condition_for(obj))
+        elif event_type.startswith('invoice.'):
+            applied = self.save_invoice(obj, event_type, version)
+        else:
+            return 'ignored'
+        return 'applied' if applied else 'stale'
+
+    @staticmethod
+    def _condition_for(subscription: Any):
+        """有効でないサブスクリプションは、ミラーが同じサブスクリプションを指している場合のみ反映する"""
+        if subscription.get('status') in ACTIVE_STATUSES:
+            return None
+        return Attr('subscriptionId').not_exists() | Attr('subscriptionId').attribute_type('NULL') | Attr('subscriptionId').eq(subscription.get('id'))
+
+    def _put(self, record: Dict[str, Any], version: int, source: str, condition=None) -> bool:
+        """
+        プラン情報を書き込む（請求書の情報を残すため属性単位で更新する）
+
+        Returns:
+            bool: より新しい情報が既にあり書き込まなかった場合はFalse
+        """
+        values = {**record, 'version': version, 'syncedAt': int(time.time()), 'source': source}
+        del values['customerId']
+        newer = Attr('version').not_exists() | Attr('version').lte(version)
+        try:
+            self.table.update_item(
+                Key={'customerId': record['customerId']},
+                UpdateExpression='SET ' + ', '.join(f'#{name} = :{name}' for name in values),
+                ConditionExpression=newer & condition if condition is not None else newer,
+                ExpressionAttributeNames={f'#{name}': name for name in values},
+                ExpressionAttributeValues={f':{name}': value for name, value in values.items()}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+subscription_mirror = SubscriptionMirror(
+    lazy_table(PaymentConfig.SUBSCRIPTION_TABLE_NAME),
+    max_age_seconds=PaymentConfig.SUBSCRIPTION_MIRROR_MAX_AGE_SECONDS
+)
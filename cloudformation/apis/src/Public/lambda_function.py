@@ -1,44 +1,37 @@
 import json
 import logging
-import boto3
 from boto3.dynamodb.conditions import Key
 import os
 from zoneinfo import ZoneInfo
-import common.publisher
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
+from common.dynamo_util import list_organization_members
+from common.dynamo_types import loads_item
 import common.dynamo_items as dynamo_items
-from common.cognito_util import get_admin_emails
+from common.aws_clients import lazy_resource, lazy_table
 
 print('Loading function')
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# SNSクライアント
-sns_client = boto3.client('sns')
-
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 stage = os.environ.get('STAGE', 'dev')
 TIMEZONE = ZoneInfo(os.environ.get('TZ', 'UTC'))
-BASE_URL = os.environ.get('BASE_URL', 'http://localhost:3000')
 
 members_table_name = f'{stage}-Members'
 organizations_table_name = f'{stage}-Organizations'
 weekly_reports_table_name = f'{stage}-WeeklyReports'
-organizations_table = dynamodb.Table(organizations_table_name)
-members_table = dynamodb.Table(members_table_name)
-weekly_reports_table = dynamodb.Table(weekly_reports_table_name)
+notification_outbox_table_name = f'{stage}-NotificationOutbox'
+organizations_table = lazy_table(organizations_table_name)
+members_table = lazy_table(members_table_name)
+weekly_reports_table = lazy_table(weekly_reports_table_name)
 
 # 定数の追加（ファイル先頭の定数定義部分に追加）
 ADVICE_TICKETS_MAX = 3
 ADVICE_TICKETS_INCREMENT = 3
 
-# Cognitoクライアントの初期化
-USER_POOL_REGION = os.environ.get('USER_POOL_REGION', 'ap-southeast-2')
-cognito = boto3.client('cognito-idp', region_name=USER_POOL_REGION)
-USER_POOL_ID = os.environ.get('USER_POOL_ID')
-
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
     try:
@@ -106,7 +99,7 @@ def get_reports_by_organization(organization_id, week_string):
         raise e
 
 def handle_post_report(event):
-    report_data = json.loads(event['body'])
+    report_data = loads_item(event['body'])
     item = dynamo_items.prepare_weekly_report_item(report_data)
     
     try:
@@ -120,7 +113,9 @@ def handle_post_report(event):
         if current_tickets < ADVICE_TICKETS_MAX:
             member['adviceTickets'] = min(current_tickets + ADVICE_TICKETS_INCREMENT, ADVICE_TICKETS_MAX)
         
-        # トランザクションで両方のテーブルを更新
+        # トランザクションで報告・メンバーと管理者への通知イベントを書き込む
+        # （通知はNotificationOutboxのストリームから通知関数が送信する）
+        notification = dynamo_items.prepare_report_notification_item('new_report', item, member.get('name'))
         transaction_items = [
             {
                 'Put': {
@@ -133,6 +128,12 @@ def handle_post_report(event):
                     'TableName': members_table.name,
                     'Item': member
                 }
+            },
+            {
+                'Put': {
+                    'TableName': notification_outbox_table_name,
+                    'Item': notification
+                }
             }
         ]
         
@@ -140,8 +141,6 @@ def handle_post_report(event):
             TransactItems=transaction_items
         )
         
-        send_push_notification_to_admins(item['organizationId'], 'new_report', item)
-        
         return create_response(201, {
             'message': 'Weekly report created successfully',
             'adviceTickets': member['adviceTickets']
@@ -152,7 +151,7 @@ def handle_post_report(event):
         return create_response(500, f'Transaction failed: {str(e)}')
 
 def handle_put_report(event):
-    report_data = json.loads(event['body'])
+    report_data = loads_item(event['body'])
     member_uuid = report_data.get('memberUuid')
     week_string = report_data.get('weekString')
 
@@ -165,10 +164,14 @@ def handle_put_report(event):
             return create_response(404, 'Report not found')
 
         updated_item = dynamo_items.prepare_weekly_report_item(report_data, existing_report)
-        response = weekly_reports_table.put_item(Item=updated_item)
-        
-        # 組織の管理者に通知を送信
-        send_push_notification_to_admins(updated_item['organizationId'], 'updated_report', updated_item)
+        # 報告の更新と組織の管理者への通知イベントを同じトランザクションで書き込む
+        notification = dynamo_items.prepare_report_notification_item('updated_report', updated_item)
+        dynamodb.meta.client.transact_write_items(
+            TransactItems=[
+                {'Put': {'TableName': weekly_reports_table_name, 'Item': updated_item}},
+                {'Put': {'TableName': notification_outbox_table_name, 'Item': notification}}
+            ]
+        )
 
         return create_response(200, 'Weekly report updated successfully')
     except Exception as e:
@@ -201,16 +204,10 @@ def get_member(member_uuid):
         logger.error(f"Error getting member: {str(e)}", exc_info=True)
         return None
 
-def list_members(organization_id):
+def list_members(organization_id, attributes=None):
     try:
-        response = members_table.query(
-            IndexName='OrganizationIndex',
-            KeyConditionExpression=Key('organizationId').eq(organization_id)
-        )
-        members = response['Items']
         # IDの昇順でソート
-        sorted_members = sorted(members, key=lambda x: x.get('id', ''))
-        return sorted_members
+        return list_organization_members(members_table, organization_id, attributes)
     except Exception as e:
         logger.error(f"Error listing members: {str(e)}", exc_info=True)
         raise e
@@ -312,97 +309,3 @@ def handle_post_organization(event):
         return create_response(201, {'message': 'Organization created successfully'})
     else:
         return create_response(400, {'message': 'Invalid data structure'})
-
-def join_url_paths(*parts):
-    """Join URL parts ensuring proper forward slashes"""
-    return '/'.join(str(p).strip('/') for p in parts)
-
-def send_push_notification_to_admins(organization_id, notification_type, report_data):
-    try:
-        organization = organizations_table.get_item(Key={'organizationId': organization_id})
-        org_item = organization['Item']
-        features = org_item.get('features', {})
-        admin_subscriptions = features.get('notifySubscriptions', {})
-        
-        # プッシュ通知とメール通知の内容を準備
-        notification = {
-            'type': notification_type,
-            'reportData': {
-                'memberUuid': report_data['memberUuid'],
-                'weekString': report_data['weekString'],
-                'status': report_data['status']
-            }
-        }
-
-        # メール通知用の内容を準備
-        member = get_member(report_data['memberUuid'])
-        if not member:
-            logger.error(f"Member not found: {report_data['memberUuid']}")
-            return
-
-        sendFrom = common.publisher.get_from_address(org_item)
-        subject = "【週次報告システム】新しい報告が提出されました"
-        bodyText = f"組織名：{org_item['name']}\n\n"
-        bodyText += f"{member.get('name', '-')}さん が {report_data['weekString']} の週次報告を提出しました。\n\n"
-        bodyText += "下記リンクより報告内容をご確認ください。\n"
-        
-        # 管理者確認用のリンクを生成
-        admin_link = join_url_paths(BASE_URL, 'admin/reports', report_data['weekString'])
-        bodyText += admin_link
-
-        # 管理者へのメール送信処理
-        if features.get('notifyByEmail'):
-            # get_admin_emailsをcognito_utilから使用
-            admin_emails = get_admin_emails(USER_POOL_ID, organization_id, cognito)
-            if (admin_emails):
-                try:
-                    logger.info(f"Send mail from: {sendFrom}, to: {admin_emails}")
-                    common.publisher.send_mail(sendFrom, admin_emails, subject, bodyText)
-                except Exception as e:
-                    logger.error(f"Error sending admin notification email: {str(e)}", exc_info=True)
-            else:
-                logger.warning(f"No admin emails found for organization: {organization_id}")
-
-        # プッシュ通知の送信（既存のコード）
-        for admin_id, endpoint_arn in admin_subscriptions.items():
-            try:
-                sns_client.publish(
-                    TargetArn=endpoint_arn,
-                    Message=json.dumps({
-                        'default': json.dumps(notification),
-                        'GCM': json.dumps({
-                            'notification': {
-                                'title': f'[{organization_id}] 週次報告',
-                                'body': f'{notification_type}: {report_data["weekString"]}',
-                                #'click_action': 'FLUTTER_NOTIFICATION_CLICK', # Flutterアプリの場合
-                                'sound': 'default'
-                            },
-                            'data': {
-                                'type': notification_type,
-                                'organizationId': organization_id,
-                                'weekString': report_data['weekString'],
-                                'status': report_data['status'],
-                                'memberUuid': report_data['memberUuid']
-                            }
-                        })
-                    }),
-                    MessageStructure='json'
-                )
-            except Exception as e:
-                logger.error(f"Error sending push notification to admin {admin_id}: {e}")
-                # エンドポイントが無効な場合は削除
-                if 'EndpointDisabled' in str(e):
-                    remove_admin_subscription(organization_id, admin_id)
-    
-    except Exception as e:
-        logger.error(f"Error in send_push_notification_to_admins: {str(e)}", exc_info=True)
-
-def remove_admin_subscription(organization_id, admin_id):
-    try:
-        organizations_table.update_item(
-            Key={'organizationId': organization_id},
-            UpdateExpression="REMOVE notifySubscriptions.#adminId",
-            ExpressionAttributeNames={'#adminId': admin_id}
-        )
-    except Exception as e:
-        logger.error(f"Error removing admin subscription: {str(e)}")
\ No newline at end of file
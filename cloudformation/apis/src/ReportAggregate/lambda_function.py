@@ -0,0 +1,164 @@
+# 週次報告の集計関数（DynamoDB Streamコンシューマー）
+import json
+import logging
+import urllib.request
+from boto3.dynamodb.conditions import Key
+import os
+from zoneinfo import ZoneInfo
+import common.report_aggregates as report_aggregates
+from common.dynamo_util import query_all, batch_get_items
+from common.dynamo_types import deserialize_image
+from common.utils import instrument_handler
+from common.aws_clients import lazy_resource, lazy_table
+
+print('Loading function')
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TIMEZONE = ZoneInfo(os.environ.get('TZ', 'UTC'))
+stage = os.environ.get('STAGE', 'dev')
+
+dynamodb = lazy_resource('dynamodb')
+weekly_reports_table = lazy_table(f'{stage}-WeeklyReports')
+aggregates_table_name = f'{stage}-WeeklyReportAggregates'
+aggregates_table = lazy_table(aggregates_table_name)
+
+# バックフィルを打ち切る残り実行時間（ミリ秒）
+BACKFILL_TIME_MARGIN_MS = 30000
+
+@instrument_handler
+def lambda_handler(event, context):
+    # デプロイ時のバックフィル（CloudFormationのカスタムリソース）
+    if 'RequestType' in event:
+        return handle_custom_resource(event, context)
+
+    # 手動での再集計（バックフィル・修復用）
+    if event.get('action') == 'rebuild':
+        return rebuild_aggregate(event['organizationId'], event['weekString'])
+    if event.get('action') == 'backfill':
+        return backfill_aggregates(context)
+
+    batch_item_failures = []
+    for record in event.get('Records', []):
+        try:
+            process_record(record)
+        except Exception as e:
+            logger.error(f"Error processing record {record.get('eventID')}: {str(e)}", exc_info=True)
+            # ストリームは失敗したレコード以降から再試行されるため、ここで処理を打ち切る
+            batch_item_failures.append({'itemIdentifier': record['dynamodb']['SequenceNumber']})
+            break
+
+    return {'batchItemFailures': batch_item_failures}
+
+def process_record(record):
+    old_report = deserialize_image(record['dynamodb'].get('OldImage'))
+    new_report = deserialize_image(record['dynamodb'].get('NewImage'))
+
+    # メンバーごとの寄与を SET で書き込むため、同じレコードの再処理（バッチの再試行・
+    # TRIM_HORIZONからの読み直し・バックフィルとの競合）でも二重に数えない
+    updates = report_aggregates.build_member_updates(old_report, new_report)
+    for key, members in updates.items():
+        if not report_aggregates.apply_member_updates(aggregates_table, key, members, TIMEZONE):
+            # 未構築の集計は、この変更を先に書き込んでから他のメンバーを週次報告から補う
+            # （インデックスは結果整合のため、この変更がまだ反映されていない場合がある）
+            report_aggregates.apply_member_updates(aggregates_table, key, members, TIMEZONE, require_seeded=False)
+            rebuild_aggregate(*key)
+
+def rebuild_aggregate(organization_id, week_string):
+    """
+    組織・週の集計アイテムを週次報告から構築する
+
+    既に書き込まれているメンバーの寄与（ストリームで反映した変更・削除）は上書きせず、
+    無いメンバーだけを補う。インデックスの読み込みが古くても、反映済みの変更は失われない。
+    """
+    reports = query_all(
+        weekly_reports_table,
+        IndexName='OrganizationWeekIndex',
+        KeyConditionExpression=Key('organizationId').eq(organization_id) & Key('weekString').eq(week_string),
+        ProjectionExpression='memberUuid, #s, overtimeHours, rating',
+        ExpressionAttributeNames={'#s': 'status'}
+    )
+    report_aggregates.seed_aggregate_item(aggregates_table, organization_id, week_string, reports, TIMEZONE)
+    logger.info(f"Rebuilt aggregate for organization {organization_id}, week {week_string}")
+
+    item = aggregates_table.get_item(
+        Key={'organizationId': organization_id, 'weekString': week_string},
+        ConsistentRead=True
+    ).get('Item')
+    return report_aggregates.format_aggregate(item)
+
+def scan_report_weeks():
+    """週次報告のある（組織ID, 週）の組を全件走査して返す"""
+    pairs = set()
+    kwargs = {'ProjectionExpression': 'organizationId, weekString'}
+    while True:
+        response = weekly_reports_table.scan(**kwargs)
+        for item in response.get('Items', []):
+            if item.get('organizationId') and item.get('weekString'):
+                pairs.add((item['organizationId'], item['weekString']))
+        if not response.get('LastEvaluatedKey'):
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return pairs
+
+def backfill_aggregates(context=None):
+    """
+    未構築の全ての（組織ID, 週）の集計アイテムを週次報告から構築する
+
+    構築済みのものは飛ばすため、途中で打ち切られても再実行で続きから処理できる。
+    未構築の間、参照側は週次報告から集計する。
+
+    Returns:
+        dict: {'weeks': 報告のある組の数, 'seeded': 構築した数, 'remaining': 未処理の数}
+    """
+    pairs = scan_report_weeks()
+    seeded_items = batch_get_items(
+        dynamodb,
+        aggregates_table_name,
+        [{'organizationId': organization_id, 'weekString': week_string} for organization_id, week_string in pairs],
+        ['organizationId', 'weekString', report_aggregates.SEED_MARKER]
+    )
+    pending = sorted(pairs - {
+        (item['organizationId'], item['weekString'])
+        for item in seeded_items if report_aggregates.is_seeded(item)
+    })
+
+    seeded = 0
+    for organization_id, week_string in pending:
+        if context is not None and context.get_remaining_time_in_millis() < BACKFILL_TIME_MARGIN_MS:
+            break
+        rebuild_aggregate(organization_id, week_string)
+        seeded += 1
+
+    result = {'weeks': len(pairs), 'seeded': seeded, 'remaining': len(pending) - seeded}
+    logger.info(f"Backfilled aggregates: {result}")
+    return result
+
+def handle_custom_resource(event, context):
+    """デプロイ時（Create/Update）にバックフィルを実行し、CloudFormationに結果を返す"""
+    status, data, reason = 'SUCCESS', {}, ''
+    if event['RequestType'] in ('Create', 'Update'):
+        try:
+            data = backfill_aggregates(context)
+        except Exception as e:
+            # 失敗してもデプロイは止めない（未構築の週は参照側が週次報告から集計し、再実行で続きから構築できる）
+            logger.error(f"Error backfilling aggregates: {str(e)}", exc_info=True)
+            reason = f"Backfill failed: {str(e)}"
+
+    body = json.dumps({
+        'Status': status,
+        'Reason': reason or f'See CloudWatch log stream: {context.log_stream_name}',
+        'PhysicalResourceId': event.get('PhysicalResourceId', f'{stage}-report-aggregate-backfill'),
+        'StackId': event['StackId'],
+        'RequestId': event['RequestId'],
+        'LogicalResourceId': event['LogicalResourceId'],
+        'Data': data
+    }).encode('utf-8')
+    request = urllib.request.Request(
+        event['ResponseURL'], data=body, method='PUT',
+        headers={'Content-Type': '', 'Content-Length': str(len(body))}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        logger.info(f"Custom resource response: {response.status}")
+    return data
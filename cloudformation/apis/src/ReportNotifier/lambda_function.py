@@ -0,0 +1,160 @@
+# 週次報告の通知関数（NotificationOutboxのDynamoDB Streamコンシューマー）
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import common.publisher
+from common.cognito_util import get_admin_emails
+from common.push_dispatcher import PushDispatcher, call_with_retries, prune_subscriptions, sweep_endpoints
+from common.dynamo_types import deserialize_image
+from common.utils import instrument_handler
+from common.aws_clients import lazy_client, lazy_table
+
+print('Loading function')
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+stage = os.environ.get('STAGE', 'dev')
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:3000')
+
+organizations_table = lazy_table(f'{stage}-Organizations')
+members_table = lazy_table(f'{stage}-Members')
+
+# SNSクライアント
+sns_client = lazy_client('sns')
+
+# Cognitoクライアントの初期化
+USER_POOL_REGION = os.environ.get('USER_POOL_REGION', 'ap-southeast-2')
+cognito = lazy_client('cognito-idp', region_name=USER_POOL_REGION)
+USER_POOL_ID = os.environ.get('USER_POOL_ID')
+
+push_dispatcher = PushDispatcher(sns_client)
+
+@instrument_handler
+def lambda_handler(event, context):
+    # プッシュ通知のエンドポイントの定期確認
+    if event.get('action') == 'sweep-endpoints':
+        result = sweep_endpoints(push_dispatcher, organizations_table)
+        logger.info(f"Swept push endpoints: {result}")
+        return result
+
+    batch_item_failures = []
+    # 同じバッチの通知で組織の読み込みを共有する
+    organizations = {}
+    for record in event.get('Records', []):
+        if record.get('eventName') != 'INSERT':
+            continue
+        try:
+            notify_admins(deserialize_image(record['dynamodb']['NewImage']), organizations)
+        except Exception as e:
+            logger.error(f"Error processing notification {record.get('eventID')}: {str(e)}", exc_info=True)
+            # ストリームは失敗したレコード以降から再試行されるため、ここで処理を打ち切る
+            batch_item_failures.append({'itemIdentifier': record['dynamodb']['SequenceNumber']})
+            break
+
+    return {'batchItemFailures': batch_item_failures}
+
+def get_organization(organization_id, organizations):
+    if organization_id not in organizations:
+        response = organizations_table.get_item(Key={'organizationId': organization_id})
+        organizations[organization_id] = response.get('Item')
+    return organizations[organization_id]
+
+def get_member_name(notification):
+    """通知イベントにメンバー名が無い場合（報告の更新）はメンバーから取得する"""
+    if notification.get('memberName'):
+        return notification['memberName']
+    response = members_table.get_item(
+        Key={'memberUuid': notification['memberUuid']},
+        ProjectionExpression='#n',
+        ExpressionAttributeNames={'#n': 'name'}
+    )
+    member = response.get('Item')
+    return member.get('name', '-') if member else None
+
+def notify_admins(notification, organizations):
+    """通知イベント1件を、組織の管理者へのメール・プッシュ通知として並行して送信する"""
+    organization_id = notification['organizationId']
+    org_item = get_organization(organization_id, organizations)
+    if not org_item:
+        logger.warning(f"Organization not found: {organization_id}")
+        return
+
+    features = org_item.get('features', {})
+    admin_subscriptions = features.get('notifySubscriptions', {})
+
+    member_name = None
+    if features.get('notifyByEmail'):
+        member_name = get_member_name(notification)
+        if member_name is None:
+            logger.error(f"Member not found: {notification['memberUuid']}")
+            return
+
+    # メールを別スレッドで送信する間にプッシュ通知を並行して送信する
+    # 送信ごとに再試行し、失敗は記録のみとする（ストリームから再処理すると送信済みの宛先に重複して届くため）
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        mail = executor.submit(call_with_retries, lambda: send_admin_mail(org_item, notification, member_name), 'admin notification email') if member_name else None
+        push = push_dispatcher.publish(admin_subscriptions, build_push_message(organization_id, notification)) if admin_subscriptions else None
+
+    if mail and mail.exception():
+        logger.error(f"Error sending admin notification email: {str(mail.exception())}")
+    if push and push['dead']:
+        # 無効なエンドポイントの登録はまとめて削除する
+        try:
+            removed = prune_subscriptions(organizations_table, organization_id, push['dead'])
+            push_dispatcher.delete_endpoints(removed.values())
+        except Exception as e:
+            logger.error(f"Error removing dead push subscriptions: {str(e)}")
+
+def join_url_paths(*parts):
+    """Join URL parts ensuring proper forward slashes"""
+    return '/'.join(str(p).strip('/') for p in parts)
+
+def send_admin_mail(org_item, notification, member_name):
+    admin_emails = get_admin_emails(USER_POOL_ID, org_item['organizationId'], cognito)
+    if not admin_emails:
+        logger.warning(f"No admin emails found for organization: {org_item['organizationId']}")
+        return
+
+    sendFrom = common.publisher.get_from_address(org_item)
+    subject = "【週次報告システム】新しい報告が提出されました"
+    bodyText = f"組織名：{org_item['name']}\n\n"
+    bodyText += f"{member_name}さん が {notification['weekString']} の週次報告を提出しました。\n\n"
+    bodyText += "下記リンクより報告内容をご確認ください。\n"
+
+    # 管理者確認用のリンクを生成
+    admin_link = join_url_paths(BASE_URL, 'admin/reports', notification['weekString'])
+    bodyText += admin_link
+
+    logger.info(f"Send mail from: {sendFrom}, to: {admin_emails}")
+    common.publisher.send_mail(sendFrom, admin_emails, subject, bodyText)
+
+def build_push_message(organization_id, notification):
+    """管理者へのプッシュ通知（SNSの MessageStructure='json' の本文）"""
+    notification_type = notification['type']
+    message = {
+        'type': notification_type,
+        'reportData': {
+            'memberUuid': notification['memberUuid'],
+            'weekString': notification['weekString'],
+            'status': notification['status']
+        }
+    }
+    return json.dumps({
+        'default': json.dumps(message),
+        'GCM': json.dumps({
+            'notification': {
+                'title': f'[{organization_id}] 週次報告',
+                'body': f'{notification_type}: {notification["weekString"]}',
+                'sound': 'default'
+            },
+            'data': {
+                'type': notification_type,
+                'organizationId': organization_id,
+                'weekString': notification['weekString'],
+                'status': notification['status'],
+                'memberUuid': notification['memberUuid']
+            }
+        })
+    })
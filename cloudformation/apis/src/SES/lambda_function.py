@@ -1,11 +1,12 @@
 import json
 import logging
 import common.publisher
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+@instrument_handler
 def lambda_handler(event, context):
     try:
         http_method = event['httpMethod']
@@ -1,11 +1,15 @@
 # スケジューラー関数
-import boto3
 import logging
-import json
 import os
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from boto3.dynamodb.conditions import Key
+import common.dynamo_items as dynamo_items
+from common.dynamo_items import build_request_slot
+from common.dynamo_util import query_all
+from common.queue_util import send_message_batches
+from common.utils import instrument_handler
+from common.aws_clients import lazy_client, lazy_resource, lazy_table
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -14,11 +18,14 @@ logger.setLevel(logging.INFO)
 TIMEZONE = ZoneInfo(os.environ.get('TZ', 'UTC'))
 stage = os.environ.get('STAGE', 'dev')
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 organizations_table_name = f'{stage}-Organizations'
 members_table_name = f'{stage}-Members'
-organizations_table = dynamodb.Table(organizations_table_name)
-members_table = dynamodb.Table(members_table_name)
+organizations_table = lazy_table(organizations_table_name)
+members_table = lazy_table(members_table_name)
+
+sqs_client = lazy_client('sqs')
+SEND_REQUEST_QUEUE_URL = os.environ.get('SEND_REQUEST_QUEUE_URL')
 
 # 数値の曜日を文字列に変換する辞書
 DAY_OF_WEEK = {
@@ -31,47 +38,74 @@ DAY_OF_WEEK = {
     6: 'sunday'
 }
 
+@instrument_handler
 def lambda_handler(event, context):
+    # 既存組織への送信枠の付与（RequestSlotIndex導入時の移行用）
+    if event.get('action') == 'backfillRequestSlots':
+        return backfill_request_slots()
+
     # 現在の曜日と時間を取得
     now = datetime.now(TIMEZONE)
     current_day = DAY_OF_WEEK[now.weekday()]
     current_time = f"{now.hour:02d}:00"
-    logger.info(f"Filter by requestDayOfWeek = {current_day} AND requestTime = {current_time}")
+    request_slot = build_request_slot(current_day, current_time)
+    logger.info(f"Query by requestSlot = {request_slot}")
     
-    # 現在の曜日と時間に一致する設定を検索
-    response = organizations_table.scan(
-        FilterExpression='requestDayOfWeek = :day AND requestTime = :time AND requestEnabled = :enabled',
-        ExpressionAttributeValues={
-            ':day': current_day,
-            ':time': current_time,
-            ':enabled': True
-        }
+    # 現在の曜日と時間に一致する設定を検索（報告依頼が有効な組織のみインデックスに含まれる）
+    organizations = query_all(
+        organizations_table,
+        IndexName='RequestSlotIndex',
+        KeyConditionExpression=Key('requestSlot').eq(request_slot)
     )
     
-    # 一致する設定ごとに処理を実行
-    for item in response['Items']:
-        # ここで実際の処理を呼び出す（例：別のLambda関数を呼び出す）
-        invoke_processing_lambda(item['organizationId'])
+    # 一致する組織ごとに報告依頼の処理をキューに投入（SendRequest関数が処理する）
+    result = enqueue_processing(item['organizationId'] for item in organizations)
+    # 例外を送出すると非同期呼び出しの再試行で投入済みの組織も再投入されるため、
+    # 失敗分（send_message_batches内で再送済み）はログに残して返すのみとする
+    failed_ids = [message['payload']['organizationId'] for message in result['failed']]
+    if failed_ids:
+        logger.error(f"Failed to enqueue {len(failed_ids)} organizations: {failed_ids}")
+    return {'enqueued': result['sent'], 'failed': failed_ids}
 
-def invoke_processing_lambda(organization_id):
-    lambda_client = boto3.client('lambda')
-    payload = json.dumps({
-        'payload': {
-            'organizationId': organization_id
-        }
-    })
-    logger.info(f"Invoking Lambda with organizationId: {organization_id}")
+def backfill_request_slots():
+    """全組織を走査し、報告依頼の設定に合わせてrequestSlotを付与・削除する"""
+    updated = 0
+    scan_params = {}
+    while True:
+        response = organizations_table.scan(**scan_params)
+        for org in response.get('Items', []):
+            item = dynamo_items.prepare_organization_item({}, org)
+            if item.get('requestSlot') == org.get('requestSlot'):
+                continue
+            if 'requestSlot' in item:
+                organizations_table.update_item(
+                    Key={'organizationId': org['organizationId']},
+                    UpdateExpression='SET requestSlot = :slot',
+                    ExpressionAttributeValues={':slot': item['requestSlot']}
+                )
+            else:
+                organizations_table.update_item(
+                    Key={'organizationId': org['organizationId']},
+                    UpdateExpression='REMOVE requestSlot'
+                )
+            updated += 1
 
-    try:
-        response = lambda_client.invoke(
-            FunctionName=f'{stage}-send-request',
-            InvocationType='Event',
-            Payload=payload
-        )
-        #logger.info(f"Lambda invocation response: {response}")
-        
-        # レスポンスのステータスコードを確認
-        if response['StatusCode'] != 202:
-            logger.error(f"Unexpected status code: {response['StatusCode']}")
-    except Exception as e:
-        logger.error(f"Error invoking Lambda: {str(e)}", exc_info=True)
\ No newline at end of file
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        scan_params['ExclusiveStartKey'] = last_evaluated_key
+
+    logger.info(f"Backfilled requestSlot for {updated} organizations")
+    return {'updated': updated}
+
+def enqueue_processing(organization_ids, queue_client=None):
+    messages = [
+        {
+            'payload': {
+                'organizationId': organization_id
+            }
+        }
+        for organization_id in organization_ids
+    ]
+    logger.info(f"Enqueue {len(messages)} organizations")
+    return send_message_batches(queue_client or sqs_client, SEND_REQUEST_QUEUE_URL, messages)
@@ -1,5 +1,4 @@
 import os
-import boto3
 import json
 import logging
 import jwt
@@ -7,7 +6,8 @@ from datetime import datetime, timezone
 import base64
 import struct
 from functools import lru_cache
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
+from common.aws_clients import get_client
 
 EXP_DAYS = 14
 
@@ -16,7 +16,7 @@ logger.setLevel(logging.INFO)
 
 @lru_cache(maxsize=1)
 def get_secret():
-    ssm = boto3.client('ssm')
+    ssm = get_client('ssm')
     parameter_name = os.environ['JWT_SECRET_PARAMETER']
     response = ssm.get_parameter(Name=parameter_name, WithDecryption=True)
     return response['Parameter']['Value']
@@ -81,6 +81,7 @@ def verify_short_token(event):
         logger.warning("Invalid token")
         return create_response(400, 'Invalid token')
 
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
     try:
@@ -1,5 +1,4 @@
 # スケジューラー関数
-import boto3
 import logging
 import json
 import os
@@ -8,8 +7,12 @@ import decimal
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
 import common.publisher
-from common.utils import create_response
+from common.dynamo_util import iter_organization_members
+from common.mail_dispatcher import MailDispatcher, summarize_results
+from common.utils import create_response, instrument_handler
+from common.aws_clients import lazy_resource, lazy_table
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -19,49 +22,149 @@ TIMEZONE = ZoneInfo(os.environ.get('TZ', 'UTC'))
 BASE_URL = os.environ.get('BASE_URL', 'http://localhost:3000')
 stage = os.environ.get('STAGE', 'dev')
 
-dynamodb = boto3.resource('dynamodb')
-organizations_table = dynamodb.Table(f'{stage}-Organizations')
-members_table = dynamodb.Table(f'{stage}-Members')
-weekly_reports_table = dynamodb.Table(f'{stage}-WeeklyReports')
+dynamodb = lazy_resource('dynamodb')
+organizations_table = lazy_table(f'{stage}-Organizations')
+members_table = lazy_table(f'{stage}-Members')
+weekly_reports_table = lazy_table(f'{stage}-WeeklyReports')
 
+REQUEST_MAIL_SUBJECT = "【週次報告システム】週次報告をお願いします"
+REQUEST_MAIL_TEMPLATE_NAME = f'{stage}-weekly-report-request'
+REQUEST_MAIL_TEMPLATE_TEXT = (
+    "組織名：{{organizationName}}\n"
+    "{{memberName}}さん\n\n"
+    "システムからの報告依頼です。\n下記リンクより週次報告をお願いします。\n"
+    "{{reportLink}}"
+)
+
+dispatcher = MailDispatcher(common.publisher.ses)
+
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
+    # スケジューラーがキューに投入した報告依頼（SQSイベント）
+    if event.get('Records'):
+        return handle_queue_records(event['Records'])
+
     try:
         # organization_idを編集
         organization_id = None
+        week_string = None
         if 'httpMethod' in event:
             payload = json.loads(event['body'])
             organization_id = payload.get('organizationId')
+            week_string = payload.get('weekString')
         else:
             organization_id = extract_organization_id(event)
 
         if not organization_id:
             raise ValueError("organization_id not found in the event")
 
-        logger.info(f"Processing task for organization ID: {organization_id}")
-
-        org = get_organization(organization_id)
-        if not org:
-            raise ValueError(f"Organization not found for ID: {organization_id}")
-
-        # week_stringを編集
-        if 'httpMethod' in event:
-            week_string = payload.get('weekString')
-        else:
-            reportWeek = org.get('reportWeek', 0)
-            if isinstance(reportWeek, decimal.Decimal):
-                reportWeek = int(reportWeek)
-            now = datetime.now(TIMEZONE)
-            week_string = get_string_from_week(now, reportWeek)
+        results = process_organization(organization_id, week_string)
 
-        send_request_mail(org, week_string)
-
-        return create_response(200, 'Processing completed successfully')
+        return create_response(200, {
+            'message': 'Processing completed successfully',
+            **summarize_results(results),
+            'results': results
+        })
 
     except Exception as e:
         logger.error(f"Error processing event: {str(e)}", exc_info=True)
         return create_response(500, f'Error processing event: {str(e)}')
 
+def handle_queue_records(records):
+    """
+    SQSメッセージを1件ずつ処理し、失敗したメッセージのみを再試行対象として返す
+
+    再試行回数を超えたメッセージはデッドレターキューに移される
+    """
+    batch_item_failures = []
+    for record in records:
+        try:
+            organization_id = extract_organization_id(record['body'])
+            if not organization_id:
+                raise ValueError("organization_id not found in the message")
+
+            # キューの再配信・スケジューラーの再実行で同じ週に重複送信しないよう、送信済みのメンバーには送信しない
+            results = process_organization(organization_id, once_per_week=True)
+            summary = summarize_results(results)
+            # 送信できなかった宛先があれば再試行する（再試行では未送信のメンバーにのみ送信し、
+            # 再試行回数を超えた場合はデッドレターキューに移される）
+            if summary['failed']:
+                raise Exception(f"Failed to send {summary['failed']} of {summary['failed'] + summary['sent']} reminder emails")
+        except Exception as e:
+            logger.error(f"Error processing message {record.get('messageId')}: {str(e)}", exc_info=True)
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
+
+    return {'batchItemFailures': batch_item_failures}
+
+def process_organization(organization_id, week_string=None, once_per_week=False):
+    logger.info(f"Processing task for organization ID: {organization_id}")
+
+    # キューからの送信は送信済みのメンバーの記録を読むため強い整合性で読み込む
+    org = get_organization(organization_id, consistent_read=once_per_week)
+    if not org:
+        raise ValueError(f"Organization not found for ID: {organization_id}")
+
+    # week_stringを編集（未指定の場合は組織の報告対象週）
+    if not week_string:
+        reportWeek = org.get('reportWeek', 0)
+        if isinstance(reportWeek, decimal.Decimal):
+            reportWeek = int(reportWeek)
+        now = datetime.now(TIMEZONE)
+        week_string = get_string_from_week(now, reportWeek)
+
+    if not once_per_week:
+        return send_request_mail(org, week_string)
+
+    # 送信済みのメンバーは組織アイテムに週ごとに記録している
+    requested = set(org.get('requestedMembers') or []) if org.get('lastRequestedWeek') == week_string else set()
+    if requested:
+        logger.info(f"Skipping {len(requested)} members already requested for organization {organization_id} for week {week_string}")
+    return send_request_mail(
+        org, week_string,
+        exclude_member_uuids=requested,
+        on_sent=lambda member_uuids: record_requested_members(organization_id, week_string, member_uuids)
+    )
+
+def record_requested_members(organization_id, week_string, member_uuids):
+    """
+    報告依頼を送信したメンバーを、組織アイテムの送信済みの週（lastRequestedWeek）と
+    送信済みのメンバー（requestedMembers）に記録する
+
+    週が変わった場合は記録を置き換え、同じ週の場合は追加する
+    """
+    if not member_uuids:
+        return
+    values = {':week': week_string, ':members': set(member_uuids)}
+    try:
+        organizations_table.update_item(
+            Key={'organizationId': organization_id},
+            UpdateExpression='ADD requestedMembers :members',
+            ConditionExpression='lastRequestedWeek = :week',
+            ExpressionAttributeValues=values
+        )
+        return
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    try:
+        organizations_table.update_item(
+            Key={'organizationId': organization_id},
+            UpdateExpression='SET lastRequestedWeek = :week, requestedMembers = :members',
+            ConditionExpression='attribute_exists(organizationId) AND (attribute_not_exists(lastRequestedWeek) OR lastRequestedWeek <> :week)',
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # 並行する処理が同じ週を記録した直後のため、追加し直す
+        organizations_table.update_item(
+            Key={'organizationId': organization_id},
+            UpdateExpression='ADD requestedMembers :members',
+            ConditionExpression='lastRequestedWeek = :week',
+            ExpressionAttributeValues=values
+        )
+
 def extract_organization_id(event):
     if isinstance(event, str):
         event = json.loads(event)
@@ -79,49 +182,97 @@ def extract_organization_id(event):
 
     return payload.get('organizationId') or event.get('organizationId')
 
-def get_organization(organization_id):
+def get_organization(organization_id, consistent_read=False):
     try:
         response = organizations_table.get_item(
             Key={
                 'organizationId': organization_id
-            }
+            },
+            ConsistentRead=consistent_read
         )
         return response.get('Item')
     except Exception as e:
         logger.error(f"Error getting organization: {str(e)}", exc_info=True)
         return None
 
-def send_request_mail(organization, week_string):
+def send_request_mail(organization, week_string, exclude_member_uuids=frozenset(), on_sent=None):
+    """
+    対象週に報告がないメンバーに報告依頼を送信する
+
+    Args:
+        exclude_member_uuids: 送信しないメンバー（送信済みのメンバー）
+        on_sent: 送信できたメンバーのUUIDのリストを受け取る関数。送信の区切り（最大50宛先）ごとに呼ばれ、
+            途中で処理が中断しても、再試行で送信済みのメンバーに再送しないよう記録できる
+    """
     organization_id = organization['organizationId']
-    response = members_table.query(
-        IndexName='OrganizationIndex',
-        KeyConditionExpression=Key('organizationId').eq(organization_id)
-    )
-    members = response['Items']
+    members = list(iter_organization_members(members_table, organization_id, ['memberUuid', 'name', 'email']))
 
     # 対象週に報告がないメンバーを特定
     members_without_report = get_members_without_report(organization_id, week_string, members)
 
     if not members_without_report:
         logger.info(f"No members without report for organization {organization_id} for week {week_string}")
-        return
+        return []
 
     sendFrom = common.publisher.get_from_address(organization)
-    subject = "【週次報告システム】週次報告をお願いします"
 
-    sent_count = 0
+    messages = []
     for member in members_without_report:
-        sendTo = [member.get("email")]
-        bodyText = f"組織名：{organization['name']}\n"
-        bodyText += f"{member.get("name", "-")}さん\n\n"
-        bodyText += "システムからの報告依頼です。\n下記リンクより週次報告をお願いします。\n"
-        link = generate_report_link(organization_id, member["memberUuid"], week_string)
-        logger.info(f"Send mail from: {sendFrom}, to: {sendTo}")
-        
-        common.publisher.send_mail(sendFrom, sendTo, subject, bodyText + link)
-        sent_count += 1
-
-    logger.info(f"Sent reminder emails to {sent_count} members for organization {organization_id} for week {week_string}")
+        if member['memberUuid'] in exclude_member_uuids:
+            continue
+        if not member.get("email"):
+            logger.warning(f"No email address for member: {member['memberUuid']}")
+            continue
+        messages.append({
+            'id': member["memberUuid"],
+            'to': [member["email"]],
+            'organizationName': organization['name'],
+            'memberName': member.get("name", "-"),
+            'reportLink': generate_report_link(organization_id, member["memberUuid"], week_string)
+        })
+
+    logger.info(f"Send {len(messages)} mails from: {sendFrom}")
+    use_template = dispatcher.ensure_template(REQUEST_MAIL_TEMPLATE_NAME, REQUEST_MAIL_SUBJECT, REQUEST_MAIL_TEMPLATE_TEXT)
+    chunk_size = len(messages) if on_sent is None else dispatcher.chunk_size
+    results = []
+    for start in range(0, len(messages), max(1, chunk_size)):
+        chunk = messages[start:start + chunk_size]
+        if use_template:
+            # テンプレートを使い、最大50宛先ずつまとめて送信
+            chunk_results = dispatcher.send_bulk_templated(sendFrom, REQUEST_MAIL_TEMPLATE_NAME, [
+                {
+                    'id': message['id'],
+                    'to': message['to'],
+                    'templateData': json.dumps({
+                        'organizationName': message['organizationName'],
+                        'memberName': message['memberName'],
+                        'reportLink': message['reportLink']
+                    }, ensure_ascii=False)
+                }
+                for message in chunk
+            ])
+        else:
+            # テンプレートが使えない場合は1通ずつ送信
+            chunk_results = dispatcher.send_each(chunk, lambda message: common.publisher.send_mail(
+                sendFrom, message['to'], REQUEST_MAIL_SUBJECT, build_request_mail_body(message)
+            ))
+        if on_sent is not None:
+            on_sent([result['id'] for result in chunk_results if result['status'] == 'success'])
+        results.extend(chunk_results)
+
+    for result in results:
+        if result['status'] != 'success':
+            logger.error(f"Failed to send reminder to member {result['id']}: {result['error']}")
+
+    summary = summarize_results(results)
+    logger.info(f"Sent reminder emails to {summary['sent']} members ({summary['failed']} failed) for organization {organization_id} for week {week_string}")
+    return results
+
+def build_request_mail_body(message):
+    bodyText = f"組織名：{message['organizationName']}\n"
+    bodyText += f"{message['memberName']}さん\n\n"
+    bodyText += "システムからの報告依頼です。\n下記リンクより週次報告をお願いします。\n"
+    return bodyText + message['reportLink']
 
 def get_members_without_report(organization_id, week_string, members):
     # 指定された組織と週のすべてのレポートを取得
@@ -1,13 +1,13 @@
 import json
 import logging
-import boto3
 from boto3.dynamodb.conditions import Key
 import os
 import uuid
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
 import common.dynamo_items as dynamo_items
+from common.aws_clients import lazy_resource, lazy_table
 
 print('Loading function')
 
@@ -17,11 +17,12 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 stage = os.environ.get('STAGE', 'dev')
 tasks_table_name = f'{stage}-UserTasks'
-tasks_table = dynamodb.Table(tasks_table_name)
+tasks_table = lazy_table(tasks_table_name)
 
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
     try:
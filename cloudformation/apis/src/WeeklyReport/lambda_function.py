@@ -1,17 +1,25 @@
 import json
 import logging
-import boto3
 from boto3.dynamodb.conditions import Key
 import os
+import re
 import time
+import tempfile
 import urllib.parse
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 from datetime import datetime, timedelta
 from dateutil.parser import parse
 from zoneinfo import ZoneInfo
 import common.publisher
-from common.utils import create_response
+from common.utils import create_response, instrument_handler
+from common.dynamo_types import loads_item, to_float
+from common.exception import ApplicationException
 import common.dynamo_items as dynamo_items
+from common.dynamo_util import query_all, query_pages, query_page, query_member_reports, iter_organization_members
+import common.report_aggregates as report_aggregates
+from common.aws_clients import lazy_client, lazy_resource, lazy_table
+import stats_engine
+import report_exporter
 
 print('Loading function')
 
@@ -19,18 +27,31 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = lazy_resource('dynamodb')
 stage = os.environ.get('STAGE', 'dev')
 TIMEZONE = ZoneInfo(os.environ.get('TZ', 'UTC'))
 BASE_URL = os.environ.get('BASE_URL', 'http://localhost:3000')
+DEFAULT_STATS_WEEKS = 5
+MAX_STATS_WEEKS = 104
+WEEK_STRING_PATTERN = re.compile(r'^\d{4}-W\d{2}$')
+
+# エクスポート設定
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET')
+EXPORT_URL_EXPIRES = int(os.environ.get('EXPORT_URL_EXPIRES', '3600'))
+EXPORT_LOCAL_DIR = os.environ.get('EXPORT_LOCAL_DIR')
+EXPORT_PAGE_SIZE = 500
 
 members_table_name = f'{stage}-Members'
 organizations_table_name = f'{stage}-Organizations'
 weekly_reports_table_name = f'{stage}-WeeklyReports'
-organizations_table = dynamodb.Table(organizations_table_name)
-members_table = dynamodb.Table(members_table_name)
-weekly_reports_table = dynamodb.Table(weekly_reports_table_name)
-
+organizations_table = lazy_table(organizations_table_name)
+members_table = lazy_table(members_table_name)
+weekly_reports_table = lazy_table(weekly_reports_table_name)
+s3_client = lazy_client('s3')
+aggregates_table_name = f'{stage}-WeeklyReportAggregates'
+aggregates_table = lazy_table(aggregates_table_name)
+
+@instrument_handler
 def lambda_handler(event, context):
     #logger.info(f"Received event: {json.dumps(event)}")
     try:
@@ -78,7 +99,7 @@ def handle_get(event):
         return create_response(400, 'Invalid query parameters')
 
 def handle_post(event):
-    report_data = json.loads(event['body'], parse_float=Decimal)
+    report_data = loads_item(event['body'])
     item = dynamo_items.prepare_weekly_report_item(report_data, TIMEZONE)
     response = weekly_reports_table.put_item(Item=item)
     return create_response(201, 'Weekly report created successfully')
@@ -97,7 +118,7 @@ def get_report(member_uuid, week_string):
         return None
 
 def handle_put(event):
-    report_data = json.loads(event['body'], parse_float=Decimal)
+    report_data = loads_item(event['body'])
     member_uuid = report_data.get('memberUuid')
     week_string = report_data.get('weekString')
 
@@ -148,7 +169,6 @@ def handle_get_report_status(event):
 
     organization_id = params['organizationId']
     week_string = params['weekString']
-    reports = get_reports_by_organization(organization_id, week_string)
 
     status = {
         'pending': {'count': 0, 'members': []},
@@ -158,22 +178,23 @@ def handle_get_report_status(event):
     }
 
     reported_member_uuids = set()
-    for report in reports:
-        report_status = report.get('status', 'pending')
-        member_uuid = report.get('memberUuid')
-        reported_member_uuids.add(member_uuid)
-        if report_status == 'approved':
-            status['confirmed']['count'] += 1
-            status['confirmed']['members'].append(member_uuid)
-        elif report_status == 'feedback':
-            status['inFeedback']['count'] += 1
-            status['inFeedback']['members'].append(member_uuid)
-        else:
-            status['pending']['count'] += 1
-            status['pending']['members'].append(member_uuid)
+    aggregate = get_week_aggregate(organization_id, week_string)
+    if report_aggregates.is_seeded(aggregate):
+        # ストリームで事前集計済みのアイテムを使用（未構築の場合は週次報告から集計する）
+        for bucket, bucket_status in report_aggregates.format_aggregate(aggregate)['status'].items():
+            status[bucket]['count'] = len(bucket_status['members'])
+            status[bucket]['members'] = bucket_status['members']
+            reported_member_uuids.update(bucket_status['members'])
+    else:
+        for report in get_reports_by_organization(organization_id, week_string):
+            member_uuid = report.get('memberUuid')
+            reported_member_uuids.add(member_uuid)
+            bucket = report_aggregates.get_status_bucket(report.get('status', 'pending'))
+            status[bucket]['count'] += 1
+            status[bucket]['members'].append(member_uuid)
 
     # Get all members of the organization
-    all_members = get_all_members(organization_id)
+    all_members = get_all_members(organization_id, ['memberUuid', 'name', 'id'])
     all_member_uuids = [member['memberUuid'] for member in all_members]
 
     # Identify members with no reports
@@ -181,8 +202,11 @@ def handle_get_report_status(event):
     status['none']['count'] = len(no_report_members)
     status['none']['members'] = list(no_report_members)
 
-    # Get member names
-    member_names = get_member_names(all_member_uuids)
+    # Get member names (already projected with the member list)
+    member_names = {
+        member['memberUuid']: {'name': member.get('name', 'Unknown'), 'id': member.get('id')}
+        for member in all_members
+    }
 
     # Convert member UUIDs to names
     for key in status:
@@ -190,13 +214,58 @@ def handle_get_report_status(event):
 
     return create_response(200, status)
 
-def get_all_members(organization_id):
+def get_week_aggregate(organization_id, week_string):
+    """組織・週の事前集計アイテムを取得する"""
     try:
-        response = members_table.query(
-            IndexName='OrganizationIndex',
-            KeyConditionExpression=Key('organizationId').eq(organization_id)
+        response = aggregates_table.get_item(
+            Key={
+                'organizationId': organization_id,
+                'weekString': week_string
+            }
         )
-        return response.get('Items', [])
+        return response.get('Item')
+    except Exception as e:
+        logger.error(f"Error getting aggregate for org {organization_id}, week {week_string}: {str(e)}", exc_info=True)
+        return None
+
+def get_week_aggregates(organization_id, weeks):
+    """
+    組織の複数週の事前集計アイテムをbatch_get_itemで取得する（weeksと同じ順序）
+
+    未構築（バックフィル前など）の週は、その週の週次報告から集計する。
+    """
+    items = {}
+    for i in range(0, len(weeks), 100):
+        request_items = {
+            aggregates_table_name: {
+                'Keys': [{'organizationId': organization_id, 'weekString': week} for week in weeks[i:i+100]]
+            }
+        }
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(aggregates_table_name, []):
+                items[item['weekString']] = item
+            request_items = response.get('UnprocessedKeys')
+
+    unseeded_weeks = [week for week in weeks if not report_aggregates.is_seeded(items.get(week))]
+    if unseeded_weeks:
+        reports_by_week = {}
+        for report in query_all(
+            weekly_reports_table,
+            IndexName='OrganizationWeekIndex',
+            KeyConditionExpression=Key('organizationId').eq(organization_id) & Key('weekString').between(min(unseeded_weeks), max(unseeded_weeks)),
+            ProjectionExpression='memberUuid, weekString, #s, overtimeHours, rating',
+            ExpressionAttributeNames={'#s': 'status'}
+        ):
+            reports_by_week.setdefault(report['weekString'], []).append(report)
+        for week in unseeded_weeks:
+            items[week] = report_aggregates.build_aggregate_item(organization_id, week, reports_by_week.get(week, []), TIMEZONE)
+
+    return [report_aggregates.format_aggregate(items[week]) for week in weeks]
+
+def get_all_members(organization_id, attributes=None):
+    try:
+        return list(iter_organization_members(members_table, organization_id, attributes))
     except Exception as e:
         logger.error(f"Error fetching all members for organization {organization_id}: {str(e)}", exc_info=True)
         return []
@@ -230,6 +299,13 @@ def get_last_5_weeks():
     Returns:
         list: ['YYYY-WNN'形式の週番号文字列のリスト（古い順）]
     """
+    return get_last_n_weeks(5)
+
+def get_last_n_weeks(n):
+    """n週前から先週までの週番号を取得（今週は含まない）
+    Returns:
+        list: ['YYYY-WNN'形式の週番号文字列のリスト（古い順）]
+    """
     today = datetime.now(TIMEZONE)
     
     def get_iso_week(date):
@@ -239,77 +315,87 @@ def get_last_5_weeks():
     last_monday = today - timedelta(days=today.weekday() + 7)
     weeks = []
     
-    # 5週前から先週までの週番号を取得
-    for i in range(4, -1, -1):  # 4,3,2,1,0 の順で処理（新しい順）
+    # n週前から先週までの週番号を取得
+    for i in range(n - 1, -1, -1):
         target_date = last_monday - timedelta(weeks=i)
         year, week = get_iso_week(target_date)
         weeks.append(f"{year}-W{week:02d}")
     
     return weeks  # 古い順に自然と並ぶ
 
+def get_organization_reports_in_weeks(organization_id, weeks):
+    """組織の指定期間の週次報告を1回の範囲クエリ（ページネーション対応）で取得する"""
+    return list(query_all(
+        weekly_reports_table,
+        IndexName='OrganizationWeekIndex',
+        KeyConditionExpression=Key('organizationId').eq(organization_id) & Key('weekString').between(weeks[0], weeks[-1]),
+        ProjectionExpression='memberUuid, weekString, overtimeHours, rating'
+    ))
+
 def handle_get_stats_data(event):
     params = event.get('queryStringParameters', {}) or {}
     if 'organizationId' not in params:
         return create_response(400, 'Missing organizationId parameter')
 
     organization_id = params['organizationId']
-    weeks = get_last_5_weeks()
-    
+    try:
+        week_count = int(params.get('weeks', DEFAULT_STATS_WEEKS))
+    except ValueError:
+        return create_response(400, 'Invalid weeks parameter')
+    if not 1 <= week_count <= MAX_STATS_WEEKS:
+        return create_response(400, f'weeks must be between 1 and {MAX_STATS_WEEKS}')
+
+    weeks = get_last_n_weeks(week_count)
+    labels = [f'{week_count - i}週前' for i in range(week_count - 1)] + ['先週']
+
+    # 組織全体の週別集計のみ（事前集計アイテムを参照し、報告は読まない）
+    if params.get('format') == 'summary':
+        return create_response(200, {
+            'labels': labels,
+            'weeks': weeks,
+            'summary': get_week_aggregates(organization_id, weeks)
+        })
+
+    reports = get_organization_reports_in_weeks(organization_id, weeks)
+    pivot = stats_engine.pivot_reports(reports, weeks)
+
+    member_info = get_member_names(pivot['memberUuids'])
+    members = sorted(
+        (
+            {
+                'memberUuid': member_uuid,
+                'id': member_info.get(member_uuid, {}).get('id', 0),
+                'label': member_info.get(member_uuid, {}).get('name', f'Unknown ({member_uuid})')
+            }
+            for member_uuid in pivot['memberUuids']
+        ),
+        key=lambda x: x.get('id', 0)
+    )
+    pivot = stats_engine.reorder_rows(pivot, [member['memberUuid'] for member in members])
+
     stats_data = {
-        'labels': ['5週前', '4週前', '3週前', '2週前', '先週'],
-        'datasets': []
+        'labels': labels,
+        'weeks': weeks,
+        'members': members,
+        'series': pivot['series'],
+        'aggregates': stats_engine.aggregate(pivot, week_count)
     }
 
-    members = {}
-    member_uuids = set()
-    for week in weeks:
-        try:
-            reports = get_reports_by_organization(organization_id, week)
-            
-            for report in reports:
-                member_uuid = report['memberUuid']
-                member_uuids.add(member_uuid)
-                if member_uuid not in members:
-                    members[member_uuid] = {
-                        'data': [{
-                            'week': w,
-                            'overtimeHours': None,
-                            'achievement': None,
-                            'disability': None,
-                            'stress': None
-                        } for w in weeks]
+    # 既存のグラフ表示用（メンバーごとの週別データ）
+    if params.get('format') != 'columnar':
+        stats_data['datasets'] = [
+            {
+                **member,
+                'data': [
+                    {
+                        'week': week,
+                        **{metric: pivot['series'][metric][row][col] for metric in stats_engine.METRICS}
                     }
-                week_index = weeks.index(week)
-                stats = members[member_uuid]['data'][week_index]
-                
-                # Safely convert overtimeHours to float
-                overtime_hours = report.get('overtimeHours')
-                stats['overtimeHours'] = float(overtime_hours) if overtime_hours is not None else 0
-
-                rating = report.get('rating', {})
-                stats['achievement'] = rating.get('achievement')
-                stats['disability'] = rating.get('disability')
-                stats['stress'] = rating.get('stress')
-                
-        except Exception as e:
-            logger.error(f"Error processing reports for week {week}: {str(e)}", exc_info=True)
-            # Continue to next week instead of breaking the loop
-
-    member_info = get_member_names(list(member_uuids))
-
-    # データセットの作成とソート
-    stats_data['datasets'] = [
-        {
-            'memberUuid': member_uuid,
-            'id': member_info.get(member_uuid, {}).get('id', 0),
-            'label': member_info.get(member_uuid, {}).get('name', f'Unknown ({member_uuid})'),
-            'data': member_data['data']
-        }
-        for member_uuid, member_data in members.items()
-    ]
-    
-    # idでソート
-    stats_data['datasets'].sort(key=lambda x: x.get('id', 0))
+                    for col, week in enumerate(weeks)
+                ]
+            }
+            for row, member in enumerate(members)
+        ]
 
     return create_response(200, stats_data)
 
@@ -431,16 +517,44 @@ def get_member(member_uuid):
         return None
 
 def handle_export(event):
-    """組織単位での週次レポートデータのエクスポートを処理する"""
+    """組織単位での週次レポートデータのエクスポートを処理する
+
+    Query Parameters:
+        organizationId: 組織ID（必須）
+        weekFrom / weekTo: 対象週の範囲（'YYYY-WNN'形式、任意）
+        format: 'json'（既定、全件を一括返却） / 'ndjson' / 'csv'（gzipファイルを出力しURLを返却）
+        limit / cursor: 指定時はカーソル方式でページ単位のJSONを返却
+    """
     params = event.get('queryStringParameters', {}) or {}
     if 'organizationId' not in params:
         return create_response(400, 'Missing organizationId parameter')
 
     organization_id = params['organizationId']
+    week_from = params.get('weekFrom')
+    week_to = params.get('weekTo')
+    export_format = params.get('format', 'json')
+
+    for week in (week_from, week_to):
+        if week and not WEEK_STRING_PATTERN.match(week):
+            return create_response(400, f'Invalid week parameter: {week}')
+    if export_format != 'json' and export_format not in report_exporter.EXPORT_FORMATS:
+        return create_response(400, f'Unsupported export format: {export_format}')
+
+    key_condition = build_organization_week_condition(organization_id, week_from, week_to)
     
     try:
+        if export_format in report_exporter.EXPORT_FORMATS:
+            return create_response(200, export_reports_to_file(organization_id, export_format, key_condition))
+
+        if 'limit' in params or 'cursor' in params:
+            try:
+                limit = min(int(params.get('limit', EXPORT_PAGE_SIZE)), EXPORT_PAGE_SIZE)
+            except ValueError:
+                return create_response(400, 'Invalid limit parameter')
+            return create_response(200, export_reports_page(key_condition, limit, params.get('cursor')))
+
         # WeeklyReportsテーブルから対象組織の全データを取得
-        reports = get_all_organization_reports(organization_id)
+        reports = get_all_organization_reports(key_condition)
         
         # レポートからmemberUuidの一覧を抽出
         member_uuids = list(set(report['memberUuid'] for report in reports))
@@ -452,34 +566,79 @@ def handle_export(event):
         formatted_reports = format_export_data(reports, member_names)
         
         return create_response(200, formatted_reports)
+    except ApplicationException as e:
+        return create_response(e.status_code, str(e))
     except Exception as e:
         logger.error(f"Error exporting reports: {str(e)}", exc_info=True)
         return create_response(500, f'Failed to export reports: {str(e)}')
 
-def get_all_organization_reports(organization_id):
+def build_organization_week_condition(organization_id, week_from=None, week_to=None):
+    """OrganizationWeekIndexのキー条件を対象週の範囲付きで組み立てる"""
+    condition = Key('organizationId').eq(organization_id)
+    if week_from and week_to:
+        return condition & Key('weekString').between(week_from, week_to)
+    elif week_from:
+        return condition & Key('weekString').gte(week_from)
+    elif week_to:
+        return condition & Key('weekString').lte(week_to)
+    return condition
+
+def get_all_organization_reports(key_condition):
     """組織の全週次レポートを取得する"""
-    reports = []
-    last_evaluated_key = None
-    
-    while True:
-        query_params = {
-            'IndexName': 'OrganizationWeekIndex',
-            'KeyConditionExpression': Key('organizationId').eq(organization_id)
-        }
-        
-        if last_evaluated_key:
-            query_params['ExclusiveStartKey'] = last_evaluated_key
-            
-        response = weekly_reports_table.query(**query_params)
-        reports.extend(response.get('Items', []))
-        
-        last_evaluated_key = response.get('LastEvaluatedKey')
-        if not last_evaluated_key:
-            break
-    
-    return reports
+    return list(query_all(
+        weekly_reports_table,
+        IndexName='OrganizationWeekIndex',
+        KeyConditionExpression=key_condition
+    ))
+
+def iter_formatted_report_pages(key_condition):
+    """組織の週次レポートをページ単位で取得し、整形済みレポートを逐次返す"""
+    member_names = {}
+    for items in query_pages(
+        weekly_reports_table,
+        IndexName='OrganizationWeekIndex',
+        KeyConditionExpression=key_condition
+    ):
+        # 未取得のメンバー名のみ追加で取得する
+        unknown_uuids = list({item['memberUuid'] for item in items} - member_names.keys())
+        if unknown_uuids:
+            member_names.update(get_member_names(unknown_uuids))
+        yield from format_export_data(items, member_names, sort=False)
+
+def export_reports_to_file(organization_id, export_format, key_condition):
+    """週次レポートをページ単位でgzip圧縮ファイルに書き出し、ダウンロードURLを返す"""
+    timestamp = datetime.now(TIMEZONE).strftime('%Y%m%d%H%M%S')
+    file_name = f'weekly_report_{organization_id}_{timestamp}.{export_format}.gz'
+    path = os.path.join(tempfile.gettempdir(), file_name)
+
+    count = report_exporter.write_gzip_export(path, export_format, iter_formatted_report_pages(key_condition))
+    result = report_exporter.publish_export(
+        path, file_name, export_format,
+        s3_client=s3_client,
+        bucket=EXPORT_BUCKET,
+        key_prefix=f'exports/{organization_id}',
+        expires_in=EXPORT_URL_EXPIRES,
+        local_dir=EXPORT_LOCAL_DIR
+    )
+    logger.info(f"Exported {count} reports for organization {organization_id} as {export_format}")
+    return {**result, 'format': export_format, 'count': count, 'fileName': file_name}
+
+def export_reports_page(key_condition, limit, cursor=None):
+    """カーソル方式で週次レポートを1ページ分エクスポートする"""
+    items, next_cursor = query_page(
+        weekly_reports_table,
+        limit,
+        cursor,
+        IndexName='OrganizationWeekIndex',
+        KeyConditionExpression=key_condition
+    )
+    member_names = get_member_names(list({item['memberUuid'] for item in items}))
+    return {
+        'items': format_export_data(items, member_names, sort=False),
+        'nextCursor': next_cursor
+    }
 
-def format_export_data(reports, member_names):
+def format_export_data(reports, member_names, sort=True):
     """エクスポート用にレポートデータを整形する"""
     formatted_reports = []
     
@@ -490,11 +649,12 @@ def format_export_data(reports, member_names):
             approved_at = format_timestamp(report.get('approvedAt')) if report.get('approvedAt') else None
             
             # 数値データの安全な変換
-            overtime_hours = safe_float_conversion(report.get('overtimeHours'))
+            overtime_hours = to_float(report.get('overtimeHours'))
             
             # 基本データの整形
+            member_uuid = report['memberUuid']
             formatted_report = {
-                'memberName': member_names.get(report['memberUuid'], f"Unknown ({report['memberUuid']})"),
+                'memberName': member_names.get(member_uuid, {}).get('name', f"Unknown ({member_uuid})"),
                 'weekString': report['weekString'],
                 'status': report.get('status', 'pending'),
                 'overtimeHours': overtime_hours,
@@ -503,9 +663,9 @@ def format_export_data(reports, member_names):
                 'improvements': report.get('improvements', ''),
                 'stressHelp': report.get('stressHelp', ''),
                 'rating': {
-                    'achievement': safe_float_conversion(report.get('rating', {}).get('achievement')),
-                    'disability': safe_float_conversion(report.get('rating', {}).get('disability')),
-                    'stress': safe_float_conversion(report.get('rating', {}).get('stress'))
+                    'achievement': to_float(report.get('rating', {}).get('achievement')),
+                    'disability': to_float(report.get('rating', {}).get('disability')),
+                    'stress': to_float(report.get('rating', {}).get('stress'))
                 },
                 'feedbacks': report.get('feedbacks', []),
                 'createdAt': created_at,
@@ -518,33 +678,11 @@ def format_export_data(reports, member_names):
             continue
     
     # 週とメンバー名でソート
-    formatted_reports.sort(key=lambda x: (x['weekString'], x['memberName']))
+    if sort:
+        formatted_reports.sort(key=lambda x: (x['weekString'], x['memberName']))
     
     return formatted_reports
 
-def safe_float_conversion(value, default=0.0):
-    """安全に浮動小数点数に変換する
-    
-    Parameters:
-        value: 変換する値
-        default: デフォルト値（変換できない場合に返す値）
-    
-    Returns:
-        float: 変換された浮動小数点数またはデフォルト値
-    """
-    if value is None:
-        return default
-        
-    try:
-        if isinstance(value, (Decimal, float, int)):
-            return float(value)
-        elif isinstance(value, str):
-            return float(value.strip())
-        return default
-    except (ValueError, TypeError, InvalidOperation):
-        logger.warning(f"Failed to convert value to float: {value}")
-        return default
-
 def format_timestamp(timestamp):
     """タイムスタンプを日時文字列に変換する
     
@@ -583,19 +721,7 @@ def format_timestamp(timestamp):
 def handle_get_member_reports(event):
     member_uuid = event['pathParameters']['memberUuid']
     try:
-        weeks = get_last_5_weeks()
-        reports = []
-        
-        for week in weeks:
-            report = get_report(member_uuid, week)
-            if report:
-                reports.append(report)
-            else:
-                reports.append({
-                    'memberUuid': member_uuid,
-                    'weekString': week,
-                    'status': 'none'
-                })
+        reports = query_member_reports(weekly_reports_table, member_uuid, get_last_5_weeks())
         
         return create_response(200, reports)
     except Exception as e:
@@ -0,0 +1,84 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Any, Iterable
+
+from common.utils import decimal_default_proc
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+CSV_COLUMNS = [
+    'weekString', 'memberName', 'status', 'overtimeHours',
+    'achievement', 'disability', 'stress',
+    'projects', 'issues', 'improvements', 'stressHelp', 'feedbacks',
+    'createdAt', 'approvedAt'
+]
+
+def _to_csv_row(report: Dict[str, Any]) -> Dict[str, Any]:
+    rating = report.get('rating', {})
+    row = {column: report.get(column) for column in CSV_COLUMNS}
+    row.update({
+        'achievement': rating.get('achievement'),
+        'disability': rating.get('disability'),
+        'stress': rating.get('stress'),
+        'projects': json.dumps(report.get('projects', []), ensure_ascii=False, default=decimal_default_proc),
+        'feedbacks': json.dumps(report.get('feedbacks', []), ensure_ascii=False, default=decimal_default_proc)
+    })
+    return row
+
+def write_gzip_export(path: str, export_format: str, reports: Iterable[Dict[str, Any]]) -> int:
+    """
+    整形済みレポートを逐次gzip圧縮ファイルへ書き出す（全件をメモリに保持しない）
+
+    Returns:
+        int: 書き出した件数
+    """
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        if export_format == 'csv':
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            for report in reports:
+                writer.writerow(_to_csv_row(report))
+                count += 1
+        else:
+            for report in reports:
+                f.write(json.dumps(report, ensure_ascii=False, default=decimal_default_proc))
+                f.write('\n')
+                count += 1
+    return count
+
+def publish_export(path: str, file_name: str, export_format: str, s3_client=None, bucket=None, key_prefix='exports', expires_in=3600, local_dir=None) -> Dict[str, Any]:
+    """
+    書き出したファイルを公開し、ダウンロードURLを返す
+
+    bucketが未指定の場合はローカルファイルシステムに配置する（ローカル実行・テスト用）
+    """
+    if bucket:
+        key = f'{key_prefix}/{file_name}'
+        s3_client.upload_file(
+            path, bucket, key,
+            ExtraArgs={
+                'ContentType': 'application/gzip',
+                'ContentDisposition': f'attachment; filename="{file_name}"',
+                'Metadata': {'format': CONTENT_TYPES[export_format]}
+            }
+        )
+        os.remove(path)
+        url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=expires_in
+        )
+        return {'url': url, 'key': key, 'expiresIn': expires_in}
+
+    destination = os.path.join(local_dir or tempfile.gettempdir(), file_name)
+    if os.path.abspath(destination) != os.path.abspath(path):
+        shutil.move(path, destination)
+    return {'url': f'file://{destination}', 'key': file_name, 'expiresIn': None}
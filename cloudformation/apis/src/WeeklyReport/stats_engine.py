@@ -0,0 +1,108 @@
+from typing import Dict, Any, List, Optional
+from common.dynamo_types import to_float
+
+# 集計対象の指標
+METRICS = ('overtimeHours', 'achievement', 'disability', 'stress')
+# 週ごとの集計で算出するパーセンタイル
+PERCENTILES = (50, 90)
+
+def pivot_reports(reports: List[Dict[str, Any]], weeks: List[str]) -> Dict[str, Any]:
+    """
+    週次報告をメンバー×週の列指向配列にピボットする
+
+    Returns:
+        dict: {
+            'memberUuids': 行に対応するメンバーUUIDのリスト,
+            'series': {指標名: [[週ごとの値]...]}（未提出はNone）
+        }
+    """
+    week_index = {week: i for i, week in enumerate(weeks)}
+    member_rows = {}
+    series = {metric: [] for metric in METRICS}
+
+    for report in reports:
+        col = week_index.get(report.get('weekString'))
+        if col is None:
+            continue
+
+        member_uuid = report['memberUuid']
+        row = member_rows.get(member_uuid)
+        if row is None:
+            row = member_rows[member_uuid] = len(member_rows)
+            for metric in METRICS:
+                series[metric].append([None] * len(weeks))
+
+        rating = report.get('rating') or {}
+        overtime_hours = to_float(report.get('overtimeHours'), None)
+        series['overtimeHours'][row][col] = overtime_hours if overtime_hours is not None else 0
+        series['achievement'][row][col] = to_float(rating.get('achievement'), None)
+        series['disability'][row][col] = to_float(rating.get('disability'), None)
+        series['stress'][row][col] = to_float(rating.get('stress'), None)
+
+    return {'memberUuids': list(member_rows), 'series': series}
+
+def reorder_rows(pivot: Dict[str, Any], member_uuids: List[str]) -> Dict[str, Any]:
+    """ピボット結果の行を指定したメンバー順に並べ替える"""
+    rows = {uuid: i for i, uuid in enumerate(pivot['memberUuids'])}
+    order = [rows[uuid] for uuid in member_uuids]
+    return {
+        'memberUuids': list(member_uuids),
+        'series': {metric: [matrix[i] for i in order] for metric, matrix in pivot['series'].items()}
+    }
+
+def mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """線形補間によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def trend_slope(values: List[Optional[float]]) -> Optional[float]:
+    """最小二乗法による1週あたりの傾き（欠損週は除外）"""
+    points = [(x, y) for x, y in enumerate(values) if y is not None]
+    if len(points) < 2:
+        return None
+
+    x_mean = mean([x for x, _ in points])
+    y_mean = mean([y for _, y in points])
+    denominator = sum((x - x_mean) ** 2 for x, _ in points)
+    return sum((x - x_mean) * (y - y_mean) for x, y in points) / denominator
+
+def aggregate_by_week(matrix: List[List[Optional[float]]], week_count: int) -> List[Dict[str, Any]]:
+    """週ごとにメンバー横断の集計値を算出する"""
+    result = []
+    for col in range(week_count):
+        values = [row[col] for row in matrix if row[col] is not None]
+        stats = {'count': len(values), 'mean': mean(values)}
+        for p in PERCENTILES:
+            stats[f'p{p}'] = percentile(values, p)
+        result.append(stats)
+    return result
+
+def aggregate_by_member(matrix: List[List[Optional[float]]]) -> List[Dict[str, Any]]:
+    """メンバーごとに期間内の平均と傾きを算出する"""
+    return [
+        {
+            'mean': mean([value for value in row if value is not None]),
+            'slope': trend_slope(row)
+        }
+        for row in matrix
+    ]
+
+def aggregate(pivot: Dict[str, Any], week_count: int) -> Dict[str, Any]:
+    """指標ごとに週別・メンバー別の集計値を算出する"""
+    result = {}
+    for metric, matrix in pivot['series'].items():
+        by_week = aggregate_by_week(matrix, week_count)
+        result[metric] = {
+            'byWeek': by_week,
+            'byMember': aggregate_by_member(matrix),
+            'trend': trend_slope([stats['mean'] for stats in by_week])
+        }
+    return result
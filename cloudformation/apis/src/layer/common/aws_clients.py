@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Callable
+import boto3
+from common.utils import instrument_client
+
+# boto3のデフォルトセッションはスレッドセーフではないため、クライアントの作成は直列化する
+_lock = threading.RLock()
+_clients = {}
+_resources = {}
+
+def get_client(service_name: str, **kwargs):
+    """
+    boto3クライアントを作成して使い回す（同じ引数の呼び出しには同じクライアントを返す）
+
+    Args:
+        service_name: サービス名（'sns'、'cognito-idp' など）
+        **kwargs: region_name、endpoint_url、config など boto3.client に渡す引数
+    """
+    key = (service_name, tuple(sorted(kwargs.items(), key=lambda item: item[0])))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = instrument_client(boto3.client(service_name, **kwargs))
+                _clients[key] = client
+    return client
+
+def get_resource(service_name: str, **kwargs):
+    """boto3リソースを作成して使い回す"""
+    key = (service_name, tuple(sorted(kwargs.items(), key=lambda item: item[0])))
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = boto3.resource(service_name, **kwargs)
+                instrument_client(resource.meta.client)
+                _resources[key] = resource
+    return resource
+
+def get_table(table_name: str):
+    """DynamoDBのTableリソースを返す"""
+    return get_resource('dynamodb').Table(table_name)
+
+class LazyProxy:
+    """
+    最初に属性へアクセスされた時点で実体を作成するプロキシ
+
+    モジュールの読み込み時にクライアントを作らずに済むよう、
+    `sns_client = lazy_client('sns')` のようにモジュール変数として定義して使う。
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_target', None)
+
+    def _resolve(self):
+        target = object.__getattribute__(self, '_target')
+        if target is None:
+            with _lock:
+                target = object.__getattribute__(self, '_target')
+                if target is None:
+                    target = object.__getattribute__(self, '_factory')()
+                    object.__setattr__(self, '_target', target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self):
+        target = object.__getattribute__(self, '_target')
+        return repr(target) if target is not None else '<LazyProxy (not created)>'
+
+def lazy_client(service_name: str, **kwargs) -> LazyProxy:
+    return LazyProxy(lambda: get_client(service_name, **kwargs))
+
+def lazy_resource(service_name: str, **kwargs) -> LazyProxy:
+    return LazyProxy(lambda: get_resource(service_name, **kwargs))
+
+def lazy_table(table_name: str) -> LazyProxy:
+    return LazyProxy(lambda: get_table(table_name))
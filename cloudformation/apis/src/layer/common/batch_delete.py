@@ -0,0 +1,111 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# BatchWriteItemの1リクエストあたりの上限件数
+BATCH_WRITE_LIMIT = 25
+MAX_UNPROCESSED_RETRIES = 8
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_MAX_SECONDS = 2.0
+
+class DeadlineExceeded(Exception):
+    """処理期限（Lambdaのタイムアウト手前）に達したことを示す例外"""
+    pass
+
+def chunked(items, size=BATCH_WRITE_LIMIT):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded()
+
+def batch_delete(client, table_name, keys, deadline=None):
+    """
+    キーのリストをBatchWriteItem（25件単位）で削除する
+
+    UnprocessedItemsはジッター付き指数バックオフで再試行する
+
+    Args:
+        client: DynamoDBクライアント（boto3.resource('dynamodb').meta.client）
+        table_name (str): テーブル名
+        keys (list): 削除するアイテムのキーのリスト
+        deadline (float): time.monotonic()基準の処理期限（任意）
+
+    Returns:
+        int: 削除した件数
+    """
+    deleted = 0
+    for chunk in chunked(keys):
+        check_deadline(deadline)
+        request_items = {table_name: [{'DeleteRequest': {'Key': key}} for key in chunk]}
+        attempt = 0
+        while request_items:
+            requested = len(request_items[table_name])
+            response = client.batch_write_item(RequestItems=request_items)
+            request_items = response.get('UnprocessedItems') or {}
+            deleted += requested - len(request_items.get(table_name, []))
+
+            if request_items:
+                attempt += 1
+                if attempt > MAX_UNPROCESSED_RETRIES:
+                    raise Exception(f"Failed to delete {len(request_items[table_name])} items from {table_name} after {MAX_UNPROCESSED_RETRIES} retries")
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+                time.sleep(random.uniform(0, delay))
+    return deleted
+
+class ParallelBatchDeleter:
+    """キーのページを受け取り、25件単位のBatchWriteItemを並行して実行する"""
+
+    def __init__(self, client, max_workers=8, deadline=None):
+        self.client = client
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.deleted_counts = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def delete_pages(self, table_name, key_pages):
+        """
+        キーのページ（イテレータ）を順に読み込みつつ、チャンク単位で並行削除する
+
+        途中で失敗・期限切れとなった場合も、削除済みの件数はdeleted_countsに記録される
+
+        Returns:
+            int: 削除した件数
+        """
+        futures = []
+        error = None
+        try:
+            for keys in key_pages:
+                check_deadline(self.deadline)
+                for chunk in chunked(keys):
+                    futures.append(self.executor.submit(batch_delete, self.client, table_name, chunk, self.deadline))
+        except Exception as e:
+            error = e
+
+        # 投入済みのチャンクは完了を待ってから結果を集計する
+        deleted = 0
+        for future in futures:
+            try:
+                deleted += future.result()
+            except Exception as e:
+                error = error or e
+
+        with self._lock:
+            self.deleted_counts[table_name] = self.deleted_counts.get(table_name, 0) + deleted
+        if error:
+            raise error
+        return deleted
+
+    def delete_keys(self, table_name, keys):
+        return self.delete_pages(table_name, [keys])
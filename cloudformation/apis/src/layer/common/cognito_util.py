@@ -1,9 +1,31 @@
-import boto3
+import os
+import time
+import logging
+import threading
 from botocore.exceptions import ClientError
 from .exception import ApplicationException
+from .aws_clients import get_client
+from .dynamo_util import encode_cursor, decode_cursor
+
+logger = logging.getLogger()
+
+# 組織ID→管理者インデックスの有効期間（秒）
+ADMIN_INDEX_TTL_SECONDS = int(os.environ.get('ADMIN_INDEX_TTL_SECONDS', '300'))
+# 古いインデックスを返してよい上限（秒）。これを超えたインデックスは同期的に再構築する
+ADMIN_INDEX_MAX_STALE_SECONDS = int(os.environ.get('ADMIN_INDEX_MAX_STALE_SECONDS', str(ADMIN_INDEX_TTL_SECONDS * 2)))
+ADMIN_INDEX_ATTRIBUTES = ['sub', 'email', 'custom:organizationId']
+
+# ユーザー一覧で使う属性と、ListUsersの1回あたりの最大件数
+USER_LIST_ATTRIBUTES = ['email', 'custom:organizationId', 'custom:parentOrganizationId']
+COGNITO_LIST_USERS_LIMIT = 60
+
+# ユーザープールIDごとのインデックス（ウォームスタート間で再利用される）
+_admin_index = {}
+_admin_index_refreshing = set()
+_admin_index_lock = threading.Lock()
 
 def _get_cognito_client(cognito_client=None):
-    return cognito_client if cognito_client else boto3.client('cognito-idp')
+    return cognito_client if cognito_client else get_client('cognito-idp')
 
 def _get_all_users(user_pool_id, cognito_client, attributes_to_get=None):
     """ページネーションを使用してすべてのユーザーを取得する共通関数"""
@@ -49,9 +71,77 @@ def _filter_users_by_organization(users, organization_id, parent_organization_id
     
     return filtered_users
 
+def _build_admin_index(user_pool_id, cognito_client):
+    """ユーザープールを1回走査し、組織IDをキーとした管理者インデックスを構築する"""
+    organizations = {}
+    for user in _get_all_users(user_pool_id, cognito_client, ADMIN_INDEX_ATTRIBUTES):
+        user_attrs = _get_user_attributes(user)
+        org_id = user_attrs.get('custom:organizationId')
+        if not org_id:
+            continue
+        organizations.setdefault(org_id, []).append({
+            'sub': user_attrs.get('sub'),
+            'email': user_attrs.get('email')
+        })
+    return {'builtAt': time.monotonic(), 'organizations': organizations}
+
+def _refresh_admin_index(user_pool_id, cognito_client):
+    """管理者インデックスを再構築して差し替える"""
+    try:
+        index = _build_admin_index(user_pool_id, cognito_client)
+        with _admin_index_lock:
+            _admin_index[user_pool_id] = index
+    except Exception as e:
+        logger.error(f"Error refreshing admin index: {str(e)}")
+    finally:
+        with _admin_index_lock:
+            _admin_index_refreshing.discard(user_pool_id)
+
+def _get_admin_index(user_pool_id, cognito_client):
+    """
+    組織ID→管理者のインデックスを取得する
+
+    TTL経過後は古いインデックスを返しつつバックグラウンドで再構築する。
+    ただし古さが ADMIN_INDEX_MAX_STALE_SECONDS を超えた場合（初回・しばらく呼び出されなかった場合など）は、
+    凍結されていたバックグラウンドの再構築を待たずに同期的に構築し直す
+    """
+    with _admin_index_lock:
+        index = _admin_index.get(user_pool_id)
+        age = None if index is None else time.monotonic() - index['builtAt']
+        rebuild = age is None or age > ADMIN_INDEX_MAX_STALE_SECONDS
+        start_refresh = not rebuild and age > ADMIN_INDEX_TTL_SECONDS and user_pool_id not in _admin_index_refreshing
+        if start_refresh:
+            _admin_index_refreshing.add(user_pool_id)
+
+    if rebuild:
+        index = _build_admin_index(user_pool_id, cognito_client)
+        with _admin_index_lock:
+            _admin_index[user_pool_id] = index
+    elif start_refresh:
+        threading.Thread(
+            target=_refresh_admin_index,
+            args=(user_pool_id, cognito_client),
+            daemon=True
+        ).start()
+
+    return index['organizations']
+
+def invalidate_admin_index(user_pool_id=None):
+    """
+    管理者インデックスを破棄する（ユーザーの作成・更新・削除時に呼び出す）
+
+    破棄されるのは呼び出したコンテナのメモリ上のインデックスのみで、
+    他の関数・コンテナには ADMIN_INDEX_MAX_STALE_SECONDS 以内に反映される
+    """
+    with _admin_index_lock:
+        if user_pool_id is None:
+            _admin_index.clear()
+        else:
+            _admin_index.pop(user_pool_id, None)
+
 def admin_create_user(user_pool_id, email, organization_id, organization_name, parent_organization_id=None, cognito_client=None):
     if cognito_client is None:
-        cognito_client = boto3.client('cognito-idp')
+        cognito_client = get_client('cognito-idp')
         
     try:
         user_attributes = [
@@ -80,6 +170,7 @@ def admin_create_user(user_pool_id, email, organization_id, organization_name, p
             Username=email,
             UserAttributes=user_attributes
         )
+        invalidate_admin_index(user_pool_id)
         return {
             'username': response['User']['Username'],
             'status': response['User']['UserStatus'],
@@ -92,7 +183,7 @@ def admin_create_user(user_pool_id, email, organization_id, organization_name, p
 
 def admin_delete_user(user_pool_id, email, cognito_client=None):
     if cognito_client is None:
-        cognito_client = boto3.client('cognito-idp')
+        cognito_client = get_client('cognito-idp')
         
     try:
         # メールアドレスからユーザーを検索
@@ -109,6 +200,7 @@ def admin_delete_user(user_pool_id, email, cognito_client=None):
             UserPoolId=user_pool_id,
             Username=user['Username']
         )
+        invalidate_admin_index(user_pool_id)
         return {
             'message': 'ユーザーを削除しました',
             'email': email,
@@ -119,41 +211,91 @@ def admin_delete_user(user_pool_id, email, cognito_client=None):
             raise ApplicationException(404, f'ユーザーが見つかりません: {email}')
         raise ApplicationException(500, f"ユーザーの削除に失敗しました: {str(e)}")
 
-def list_users(user_pool_id, cognito_client=None, parent_organization_id=None):
+def _format_user(user, user_attrs, organization_names):
+    org_id = user_attrs.get('custom:organizationId')
+    return {
+        'username': user['Username'],
+        'status': user['UserStatus'],
+        'organizationId': org_id,
+        'organizationName': organization_names.get(org_id),
+        'email': user_attrs.get('email', ''),
+        'parentOrganizationId': user_attrs.get('custom:parentOrganizationId'),
+        'created': user['UserCreateDate'].isoformat()
+    }
+
+def _format_users(filtered_users, organization_names=None):
+    """ユーザーの一覧を整形する（組織名は organization_names でまとめて解決する）"""
+    names = {}
+    if organization_names:
+        names = organization_names.resolve([user_attrs.get('custom:organizationId') for _, user_attrs in filtered_users])
+    return [_format_user(user, user_attrs, names) for user, user_attrs in filtered_users]
+
+def list_users(user_pool_id, cognito_client=None, parent_organization_id=None, organization_names=None):
+    """
+    ユーザーの一覧を取得する
+
+    Args:
+        organization_names: organization_names.OrganizationNames（指定時は組織名を付加する）
+    """
     cognito_client = _get_cognito_client(cognito_client)
     
     try:
-        users = _get_all_users(user_pool_id, cognito_client)
+        users = _get_all_users(user_pool_id, cognito_client, USER_LIST_ATTRIBUTES)
         filtered_users = _filter_users_by_organization(users, None, parent_organization_id)
-        
-        result = []
-        for user, user_attrs in filtered_users:
-            org_id = user_attrs.get('custom:organizationId')
-            org_name = None
-            if org_id:
-                try:
-                    org = get_organization(org_id)
-                    if org:
-                        org_name = org.get('name')
-                except:
-                    pass
-
-            result.append({
-                'username': user['Username'],
-                'status': user['UserStatus'],
-                'organizationId': org_id,
-                'organizationName': org_name,
-                'email': user_attrs.get('email', ''),
-                'parentOrganizationId': user_attrs.get('custom:parentOrganizationId'),
-                'created': user['UserCreateDate'].isoformat()
-            })
-        return result
+        return _format_users(filtered_users, organization_names)
+    except ClientError as e:
+        raise ApplicationException(500, str(e))
+
+def list_users_page(user_pool_id, limit, cursor=None, cognito_client=None, parent_organization_id=None, organization_names=None):
+    """
+    カーソル指定でユーザーの一覧を1ページ分取得する
+
+    CognitoのListUsersは独自属性で絞り込めないため、limit件に達するまでCognitoのページを辿る。
+    カーソルはCognitoのPaginationTokenと、そのページ内で返却済みの件数を持つ。
+
+    Returns:
+        tuple: (ユーザーのリスト, 次ページのカーソル文字列またはNone)
+    """
+    cognito_client = _get_cognito_client(cognito_client)
+    position = decode_cursor(cursor) or {}
+    token = position.get('token')
+    skip = int(position.get('skip', 0))
+
+    filtered_users = []
+    next_position = None
+    try:
+        while True:
+            kwargs = {'UserPoolId': user_pool_id, 'AttributesToGet': USER_LIST_ATTRIBUTES, 'Limit': COGNITO_LIST_USERS_LIMIT}
+            if token:
+                kwargs['PaginationToken'] = token
+            response = cognito_client.list_users(**kwargs)
+            matched = _filter_users_by_organization(response.get('Users', []), None, parent_organization_id)[skip:]
+
+            remaining = limit - len(filtered_users)
+            if len(matched) > remaining:
+                # このページの残りは次のリクエストで返す
+                filtered_users.extend(matched[:remaining])
+                next_position = {'token': token, 'skip': skip + remaining}
+                break
+            filtered_users.extend(matched)
+
+            token = response.get('PaginationToken')
+            skip = 0
+            if not token:
+                break
+            if len(filtered_users) == limit:
+                next_position = {'token': token, 'skip': 0}
+                break
     except ClientError as e:
+        if e.response['Error']['Code'] == 'InvalidParameterException' and cursor:
+            raise ApplicationException(400, 'Invalid cursor')
         raise ApplicationException(500, str(e))
 
+    return _format_users(filtered_users, organization_names), encode_cursor(next_position)
+
 def admin_get_user(user_pool_id, email, cognito_client=None):
     if cognito_client is None:
-        cognito_client = boto3.client('cognito-idp')
+        cognito_client = get_client('cognito-idp')
         
     try:
         # メールアドレスを使用してユーザーを検索
@@ -196,9 +338,8 @@ def get_admin_emails(user_pool_id, organization_id, cognito_client=None):
     cognito_client = _get_cognito_client(cognito_client)
     
     try:
-        users = _get_all_users(user_pool_id, cognito_client, ['email', 'custom:organizationId'])
-        filtered_users = _filter_users_by_organization(users, organization_id)
-        return list({user_attrs.get('email') for _, user_attrs in filtered_users if user_attrs.get('email')})
+        admins = _get_admin_index(user_pool_id, cognito_client).get(organization_id, [])
+        return list({admin['email'] for admin in admins if admin.get('email')})
     except Exception as e:
         raise ApplicationException(500, f"Error getting admin emails: {str(e)}")
 
@@ -217,8 +358,7 @@ def get_organization_admin_subs(user_pool_id, organization_id, cognito_client=No
     cognito_client = _get_cognito_client(cognito_client)
     
     try:
-        users = _get_all_users(user_pool_id, cognito_client)
-        filtered_users = _filter_users_by_organization(users, organization_id)
-        return list({user_attrs.get('sub') for _, user_attrs in filtered_users if user_attrs.get('sub')})
+        admins = _get_admin_index(user_pool_id, cognito_client).get(organization_id, [])
+        return list({admin['sub'] for admin in admins if admin.get('sub')})
     except Exception as e:
         raise ApplicationException(500, f"Error getting admin subs: {str(e)}")
\ No newline at end of file
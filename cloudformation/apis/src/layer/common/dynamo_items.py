@@ -1,15 +1,7 @@
 import uuid
+import time
 from datetime import datetime
-from decimal import Decimal
-
-def float_to_decimal(obj):
-    if isinstance(obj, float):
-        return Decimal(str(obj))
-    elif isinstance(obj, dict):
-        return {k: float_to_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [float_to_decimal(v) for v in obj]
-    return obj
+from common.dynamo_types import float_to_decimal
 
 def prepare_weekly_report_item(report_data, existing_report=None, timezone=None):
     now = datetime.now() if timezone is None else datetime.now(timezone)
@@ -36,6 +28,24 @@ def prepare_weekly_report_item(report_data, existing_report=None, timezone=None)
         return existing_report
     return item
 
+def prepare_report_notification_item(notification_type, report, member_name=None, ttl_seconds=7 * 86400):
+    """
+    週次報告の通知イベント（NotificationOutboxテーブルのアイテム）を作成する
+
+    報告の書き込みと同じトランザクションで書き込み、テーブルのストリームから通知関数が送信する。
+    """
+    return {
+        'notificationId': str(uuid.uuid4()),
+        'type': notification_type,
+        'organizationId': report['organizationId'],
+        'memberUuid': report['memberUuid'],
+        'memberName': member_name,
+        'weekString': report['weekString'],
+        'status': report.get('status'),
+        'createdAt': datetime.now().isoformat(),
+        'expiresAt': int(time.time()) + ttl_seconds
+    }
+
 def prepare_member_item(member_data, existing_member=None):
     if existing_member is None:
         existing_member = {}
@@ -52,6 +62,10 @@ def prepare_member_item(member_data, existing_member=None):
     }
     return {k: v for k, v in updated_member.items() if v is not None}
 
+def build_request_slot(request_day_of_week, request_time):
+    """報告依頼の送信枠（RequestSlotIndexのキー、例: 'monday#09:00'）を組み立てる"""
+    return f"{request_day_of_week.lower()}#{request_time}"
+
 def prepare_organization_item(org_data, existing_org=None):
     if existing_org is None:
         existing_org = {}
@@ -79,9 +93,16 @@ def prepare_organization_item(org_data, existing_org=None):
         'requestTime': org_data.get('requestTime', existing_org.get('requestTime')),
         'requestDayOfWeek': org_data.get('requestDayOfWeek', existing_org.get('requestDayOfWeek')),
         'reportWeek': org_data.get('reportWeek', existing_org.get('reportWeek')),
+        # 報告依頼を送信済みの週とその週に送信済みのメンバー（SendRequestが記録する）
+        'lastRequestedWeek': existing_org.get('lastRequestedWeek'),
+        'requestedMembers': existing_org.get('requestedMembers'),
         'features': features
     }
 
+    # 報告依頼が有効な組織のみ送信枠を持たせる（スパースGSI）
+    if updated_org['requestEnabled'] and updated_org['requestDayOfWeek'] and updated_org['requestTime']:
+        updated_org['requestSlot'] = build_request_slot(updated_org['requestDayOfWeek'], updated_org['requestTime'])
+
     return {k: v for k, v in updated_org.items() if v is not None}
 
 def prepare_task_item(user_id, task_data, existing_task=None, timezone=None):
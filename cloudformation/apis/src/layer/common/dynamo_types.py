@@ -0,0 +1,71 @@
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+from boto3.dynamodb.types import TypeDeserializer
+
+logger = logging.getLogger()
+
+# DynamoDBの数値（Decimal）とPythonのfloatの相互変換
+#
+# DynamoDBはfloatを受け付けず、読み込んだ数値はDecimalになる。
+# JSONの往復変換（json.loads(json.dumps(...))）を使わず、1回の走査で変換する。
+# 葉（文字列など）の要素では関数を呼び出さないよう、内包表記の中で型を判定する
+
+def float_to_decimal(obj: Any) -> Any:
+    """アイテム内のfloatをDecimalに変換する（書き込み前に使用する）"""
+    cls = type(obj)
+    if cls is dict:
+        return {k: (Decimal(str(v)) if (t := type(v)) is float else float_to_decimal(v) if t is dict or t is list else v) for k, v in obj.items()}
+    if cls is list:
+        return [(Decimal(str(v)) if (t := type(v)) is float else float_to_decimal(v) if t is dict or t is list else v) for v in obj]
+    if cls is float:
+        return Decimal(str(obj))
+    return obj
+
+def decimal_to_float(obj: Any) -> Any:
+    """アイテム内のDecimalをfloatに、セットをリストに変換する（読み込み後、JSONやPythonの数値処理に渡す前に使用する）"""
+    cls = type(obj)
+    if cls is dict:
+        return {k: (float(v) if (t := type(v)) is Decimal else decimal_to_float(v) if t is dict or t is list or t is set else v) for k, v in obj.items()}
+    if cls is list or cls is set:
+        return [(float(v) if (t := type(v)) is Decimal else decimal_to_float(v) if t is dict or t is list or t is set else v) for v in obj]
+    if cls is Decimal:
+        return float(obj)
+    return obj
+
+def to_float(value: Any, default: Optional[float] = 0.0) -> Optional[float]:
+    """1つの値をfloatに変換する（None・変換できない値は default を返す）"""
+    if value is None:
+        return default
+    try:
+        if isinstance(value, (Decimal, float, int)):
+            return float(value)
+        if isinstance(value, str):
+            return float(value.strip())
+    except (ValueError, TypeError, InvalidOperation):
+        logger.warning(f"Failed to convert value to float: {value}")
+    return default
+
+def to_decimal(value: Any) -> Optional[Decimal]:
+    """1つの値をDecimalに変換する（None・真偽値・変換できない値は None を返す）"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+def loads_item(text: str) -> Any:
+    """リクエストボディのJSONを、小数をDecimalとして読み込む（そのままDynamoDBに書き込める）"""
+    return json.loads(text, parse_float=Decimal)
+
+_deserializer = TypeDeserializer()
+
+def deserialize_image(image: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """DynamoDB Streamsなどの低レベル形式のアイテムを復元する"""
+    if not image:
+        return None
+    return {k: _deserializer.deserialize(v) for k, v in image.items()}
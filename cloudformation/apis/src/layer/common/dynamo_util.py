@@ -0,0 +1,140 @@
+import json
+import base64
+from boto3.dynamodb.conditions import Key
+from .exception import ApplicationException
+
+def query_pages(table, **kwargs):
+    """LastEvaluatedKeyを辿りながらクエリ結果をページ単位で返すジェネレータ"""
+    while True:
+        response = table.query(**kwargs)
+        yield response.get('Items', [])
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+def query_all(table, **kwargs):
+    """LastEvaluatedKeyを辿りながらクエリ結果を1件ずつ返すジェネレータ"""
+    for items in query_pages(table, **kwargs):
+        yield from items
+
+def build_projection(attributes):
+    """
+    属性名のリストからProjectionExpressionを組み立てる（予約語も扱えるよう全て名前プレースホルダーにする）
+
+    Returns:
+        dict: query/get_itemに渡すProjectionExpressionとExpressionAttributeNames（attributes未指定時は空）
+    """
+    if not attributes:
+        return {}
+    names = {f'#p{i}': attribute for i, attribute in enumerate(attributes)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+def iter_organization_members(table, organization_id, attributes=None):
+    """
+    組織の全メンバーをOrganizationIndexから全ページ辿って返すジェネレータ
+
+    Args:
+        table: Membersテーブル
+        organization_id (str): 組織ID
+        attributes (list): 取得する属性名のリスト（例: ['memberUuid', 'name', 'email', 'id']、未指定時は全属性）
+    """
+    yield from query_all(
+        table,
+        IndexName='OrganizationIndex',
+        KeyConditionExpression=Key('organizationId').eq(organization_id),
+        **build_projection(attributes)
+    )
+
+def list_organization_members(table, organization_id, attributes=None):
+    """組織の全メンバーをIDの昇順で返す"""
+    return sorted(iter_organization_members(table, organization_id, attributes), key=lambda x: x.get('id', ''))
+
+def batch_get_items(dynamodb, table_name, keys, attributes=None):
+    """
+    キーのリストのアイテムをbatch_get_itemで100件ずつ取得する（重複キーは除き、UnprocessedKeysは再送する）
+
+    Args:
+        dynamodb: boto3のDynamoDBリソース
+        table_name (str): テーブル名
+        keys (list): キーのdictのリスト
+        attributes (list): 取得する属性名のリスト（未指定時は全属性）
+
+    Returns:
+        list: 取得できたアイテムのリスト（順序は不定、存在しないキーは含まない）
+    """
+    unique_keys = list({json.dumps(key, sort_keys=True): key for key in keys}.values())
+    items = []
+    for i in range(0, len(unique_keys), 100):
+        request_items = {table_name: {'Keys': unique_keys[i:i+100], **build_projection(attributes)}}
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request_items = response.get('UnprocessedKeys')
+    return items
+
+def encode_cursor(last_evaluated_key):
+    """LastEvaluatedKeyをクライアントに返すカーソル文字列に変換する"""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """カーソル文字列をExclusiveStartKeyに変換する"""
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ApplicationException(400, 'Invalid cursor')
+
+def query_page(table, limit, cursor=None, **kwargs):
+    """
+    カーソル指定で1ページ分のクエリ結果を取得する
+
+    Returns:
+        tuple: (アイテムのリスト, 次ページのカーソル文字列またはNone)
+    """
+    kwargs['Limit'] = limit
+    exclusive_start_key = decode_cursor(cursor)
+    if exclusive_start_key:
+        kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+    response = table.query(**kwargs)
+    return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+
+def query_member_reports(table, member_uuid, weeks):
+    """
+    メンバーの指定週の週次報告を1回の範囲クエリで取得する
+
+    Args:
+        table: WeeklyReportsテーブル
+        member_uuid (str): メンバーUUID
+        weeks (list): 'YYYY-WNN'形式の週番号文字列のリスト
+
+    Returns:
+        list: weeksと同じ順序の週次報告のリスト（未提出の週は status: 'none' で補完）
+    """
+    if not weeks:
+        return []
+
+    reports = {
+        item['weekString']: item
+        for item in query_all(
+            table,
+            KeyConditionExpression=Key('memberUuid').eq(member_uuid) & Key('weekString').between(min(weeks), max(weeks))
+        )
+    }
+
+    return [
+        reports.get(week, {
+            'memberUuid': member_uuid,
+            'weekString': week,
+            'status': 'none'
+        })
+        for week in weeks
+    ]
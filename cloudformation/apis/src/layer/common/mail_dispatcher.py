@@ -0,0 +1,211 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# SendBulkTemplatedEmailの1リクエストあたりの宛先上限
+BULK_DESTINATION_LIMIT = 50
+# SESの秒間送信レート（アカウントの上限に合わせて環境変数で調整する）
+SES_SEND_RATE = float(os.environ.get('SES_SEND_RATE', '14'))
+MAX_SEND_WORKERS = int(os.environ.get('MAX_SEND_WORKERS', '8'))
+MAX_SEND_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_MAX_SECONDS = 5.0
+
+# 再試行すべきエラー（API呼び出しのエラーコード・宛先ごとのステータス）
+RETRYABLE_ERROR_CODES = {'Throttling', 'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailable'}
+RETRYABLE_STATUSES = {'AccountThrottled', 'TransientFailure'}
+
+class TokenBucket:
+    """
+    送信レートを制限するトークンバケット（スレッドセーフ）
+
+    容量を超える要求は残高を負にして（前借りして）受け付け、不足分が貯まるまで待機する。
+    後続の要求は前借り分の返済を待つため、要求の大きさによらず平均レートは rate を超えない。
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """トークンを消費し、残高が負になった場合は不足分が貯まるまで待機する"""
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            self._sleep(wait)
+
+def backoff_delay(attempt):
+    """フルジッター付き指数バックオフの待機秒数"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def is_retryable_error(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in RETRYABLE_ERROR_CODES
+
+class MailDispatcher:
+    """
+    メールを並行送信するディスパッチャー
+
+    送信はスレッドプールで並行して行い、トークンバケットでSESの送信レートを守る。
+    スロットリングはジッター付き指数バックオフで再試行し、宛先ごとの結果を返す。
+    SESクライアントは引数で差し替えられるため、ローカルのスタブでも動作を確認できる。
+    """
+
+    def __init__(self, ses_client, send_rate=SES_SEND_RATE, max_workers=MAX_SEND_WORKERS, max_retries=MAX_SEND_RETRIES, clock=time.monotonic, sleep=time.sleep):
+        self.ses = ses_client
+        self.bucket = TokenBucket(send_rate, clock=clock, sleep=sleep)
+        # 1リクエストの宛先数は秒間レート以内とする（50件を一度に送るとSES側で超過する）
+        self.chunk_size = max(1, min(BULK_DESTINATION_LIMIT, int(self.bucket.capacity)))
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self._sleep = sleep
+
+    def ensure_template(self, template_name, subject, text):
+        """
+        送信テンプレートが無ければ作成する
+
+        Returns:
+            bool: テンプレートが利用可能な場合True
+        """
+        try:
+            self.ses.get_template(TemplateName=template_name)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TemplateDoesNotExist':
+                logger.warning(f"Failed to get template {template_name}: {str(e)}")
+                return False
+
+        try:
+            self.ses.create_template(Template={
+                'TemplateName': template_name,
+                'SubjectPart': subject,
+                'TextPart': text
+            })
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'AlreadyExists':
+                return True
+            logger.warning(f"Failed to create template {template_name}: {str(e)}")
+            return False
+
+    def send_bulk_templated(self, source, template_name, destinations, default_template_data='{}'):
+        """
+        SendBulkTemplatedEmailで宛先を chunk_size 件（最大50件）ずつ並行送信する
+
+        Args:
+            source (str): 差出人
+            template_name (str): SESテンプレート名
+            destinations (list): [{'id': 識別子, 'to': [アドレス], 'templateData': JSON文字列}, ...]
+            default_template_data (str): 宛先に値が無い場合のテンプレートデータ（JSON文字列）
+
+        Returns:
+            list: [{'id', 'to', 'status': 'success'|'failed', 'messageId', 'error'}, ...]（destinationsと同じ順序）
+        """
+        chunks = [destinations[i:i + self.chunk_size] for i in range(0, len(destinations), self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            chunk_results = executor.map(
+                lambda chunk: self._send_bulk_chunk(source, template_name, chunk, default_template_data),
+                chunks
+            )
+            return [result for results in chunk_results for result in results]
+
+    def _send_bulk_chunk(self, source, template_name, chunk, default_template_data):
+        results = {}
+        pending = list(enumerate(chunk))
+        attempt = 0
+        while pending:
+            self.bucket.acquire(len(pending))
+            try:
+                response = self.ses.send_bulk_templated_email(
+                    Source=source,
+                    Template=template_name,
+                    DefaultTemplateData=default_template_data,
+                    Destinations=[
+                        {
+                            'Destination': {'ToAddresses': destination['to']},
+                            'ReplacementTemplateData': destination.get('templateData', default_template_data)
+                        }
+                        for _, destination in pending
+                    ]
+                )
+            except ClientError as e:
+                if is_retryable_error(e) and attempt < self.max_retries:
+                    attempt += 1
+                    self._sleep(backoff_delay(attempt))
+                    continue
+                for index, destination in pending:
+                    results[index] = self._result(destination, error=str(e))
+                break
+
+            retry = []
+            for (index, destination), status in zip(pending, response.get('Status', [])):
+                if status.get('Status') == 'Success':
+                    results[index] = self._result(destination, message_id=status.get('MessageId'))
+                elif status.get('Status') in RETRYABLE_STATUSES and attempt < self.max_retries:
+                    retry.append((index, destination))
+                else:
+                    results[index] = self._result(destination, error=status.get('Error') or status.get('Status'))
+
+            pending = retry
+            if pending:
+                attempt += 1
+                self._sleep(backoff_delay(attempt))
+
+        return [results[index] for index in range(len(chunk))]
+
+    def send_each(self, messages, send):
+        """
+        1宛先ずつ送信する関数を並行実行する（テンプレートを使えない場合の送信経路）
+
+        Args:
+            messages (list): [{'id': 識別子, 'to': [アドレス], ...}, ...]
+            send (callable): message を受け取って送信し、SESのレスポンスを返す関数
+
+        Returns:
+            list: send_bulk_templated と同じ形式の結果リスト
+        """
+        def send_one(message):
+            attempt = 0
+            while True:
+                self.bucket.acquire()
+                try:
+                    response = send(message) or {}
+                    return self._result(message, message_id=response.get('MessageId'))
+                except Exception as e:
+                    if is_retryable_error(e) and attempt < self.max_retries:
+                        attempt += 1
+                        self._sleep(backoff_delay(attempt))
+                        continue
+                    return self._result(message, error=str(e))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(send_one, messages))
+
+    @staticmethod
+    def _result(destination, message_id=None, error=None):
+        return {
+            'id': destination.get('id'),
+            'to': destination['to'],
+            'status': 'failed' if error else 'success',
+            'messageId': message_id,
+            'error': error
+        }
+
+def summarize_results(results):
+    """送信結果を成功・失敗件数に集計する"""
+    sent = sum(1 for result in results if result['status'] == 'success')
+    return {'sent': sent, 'failed': len(results) - sent}
@@ -0,0 +1,52 @@
+import os
+import logging
+from .aws_clients import lazy_resource
+from .dynamo_util import batch_get_items
+
+logger = logging.getLogger()
+
+ORGANIZATIONS_TABLE_NAME = f'{os.environ.get("STAGE", "dev")}-Organizations'
+
+# 組織名の解決に使う属性（古い組織は name の代わりに organizationName を持つ）
+NAME_ATTRIBUTES = ['organizationId', 'name', 'organizationName']
+
+class OrganizationNames:
+    """
+    組織ID→組織名の解決
+
+    未解決の組織IDだけをまとめてbatch_get_item（100件ずつ、名前の属性のみ）で取得し、
+    結果は同じインスタンスの間だけ保持する（リクエストごとに作成する）。
+    """
+
+    def __init__(self, dynamodb=None, table_name=ORGANIZATIONS_TABLE_NAME):
+        self.dynamodb = dynamodb or lazy_resource('dynamodb')
+        self.table_name = table_name
+        self._names = {}
+
+    def resolve(self, organization_ids):
+        """
+        Returns:
+            dict: 組織ID→組織名（存在しない組織はNone）
+        """
+        organization_ids = [org_id for org_id in organization_ids if org_id]
+        missing = [org_id for org_id in dict.fromkeys(organization_ids) if org_id not in self._names]
+        if missing:
+            try:
+                items = batch_get_items(
+                    self.dynamodb,
+                    self.table_name,
+                    [{'organizationId': org_id} for org_id in missing],
+                    NAME_ATTRIBUTES
+                )
+            except Exception as e:
+                # 組織名は付加情報のため、取得に失敗しても一覧は返す（次の呼び出しで再取得する）
+                logger.error(f"Error resolving organization names: {str(e)}")
+                return {org_id: self._names.get(org_id) for org_id in organization_ids}
+            for item in items:
+                self._names[item['organizationId']] = item.get('name') or item.get('organizationName')
+            for org_id in missing:
+                self._names.setdefault(org_id, None)
+        return {org_id: self._names[org_id] for org_id in organization_ids}
+
+    def get(self, organization_id):
+        return self.resolve([organization_id]).get(organization_id)
@@ -1,11 +1,13 @@
-import boto3
+import os
 from botocore.exceptions import ClientError
 from email.header import Header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
+from common.aws_clients import lazy_client
 
-ses = boto3.client('ses', region_name='ap-northeast-1')
+# SES_ENDPOINT_URLを指定するとローカルのSESスタブに接続する
+ses = lazy_client('ses', region_name='ap-northeast-1', endpoint_url=os.environ.get('SES_ENDPOINT_URL'))
 
 def send_mail(sendFrom, to, subject, body):
     CHARSET = "utf-8"
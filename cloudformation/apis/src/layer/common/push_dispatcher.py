@@ -0,0 +1,244 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger()
+
+# 送信の並列数と、一時的なエラーの再試行
+PUSH_MAX_WORKERS = int(os.environ.get('PUSH_MAX_WORKERS', '8'))
+MAX_SEND_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 0.2
+RETRYABLE_ERROR_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException',
+    'InternalError', 'InternalFailure', 'ServiceUnavailable'
+}
+
+# エンドポイントが無効（トークンの失効・削除済み）であることを示すエラー
+DEAD_ENDPOINT_ERROR_CODES = {'EndpointDisabled', 'NotFound'}
+
+# 無効と判定したエンドポイントを送信対象から外す期間（秒）
+ENDPOINT_HEALTH_TTL_SECONDS = int(os.environ.get('ENDPOINT_HEALTH_TTL_SECONDS', '3600'))
+
+# エンドポイントARN→無効と判定した時刻（ウォームスタート間で再利用される）
+_dead_endpoints = {}
+_dead_endpoints_lock = threading.Lock()
+
+def call_with_retries(operation, description, sleep=time.sleep):
+    """スロットリング・一時的な障害のエラーのみ、ジッター付き指数バックオフで再試行する"""
+    for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+        try:
+            return operation()
+        except ClientError as e:
+            if e.response['Error']['Code'] not in RETRYABLE_ERROR_CODES or attempt == MAX_SEND_ATTEMPTS:
+                raise
+            error = e
+        except BotoCoreError as e:
+            # 接続エラー・タイムアウト
+            if attempt == MAX_SEND_ATTEMPTS:
+                raise
+            error = e
+        logger.warning(f"Retrying {description} (attempt {attempt}): {str(error)}")
+        sleep(random.uniform(0, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def is_dead_endpoint_error(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in DEAD_ENDPOINT_ERROR_CODES
+
+def mark_endpoint_dead(endpoint_arn):
+    with _dead_endpoints_lock:
+        _dead_endpoints[endpoint_arn] = time.monotonic()
+
+def mark_endpoint_healthy(endpoint_arn):
+    with _dead_endpoints_lock:
+        _dead_endpoints.pop(endpoint_arn, None)
+
+def is_endpoint_dead(endpoint_arn):
+    """TTL内に無効と判定したエンドポイントか"""
+    with _dead_endpoints_lock:
+        marked_at = _dead_endpoints.get(endpoint_arn)
+        if marked_at is None:
+            return False
+        if time.monotonic() - marked_at > ENDPOINT_HEALTH_TTL_SECONDS:
+            del _dead_endpoints[endpoint_arn]
+            return False
+        return True
+
+class PushDispatcher:
+    """
+    管理者のSNSエンドポイントへのプッシュ通知の並行送信
+
+    送信はスレッドプール（max_workers）で並行して行い、一時的なエラーは再試行する。
+    無効なエンドポイントはエラーコードで判定してヘルスキャッシュに記録し、TTLの間は送信しない。
+    """
+
+    def __init__(self, sns_client, max_workers=PUSH_MAX_WORKERS):
+        self.sns_client = sns_client
+        self.max_workers = max_workers
+
+    def publish(self, subscriptions, message):
+        """
+        Args:
+            subscriptions (dict): 管理者ID→エンドポイントARN（features.notifySubscriptions）
+            message (str): SNSのMessage（MessageStructure='json' の本文）
+
+        Returns:
+            dict: {'sent': [管理者ID], 'dead': {管理者ID: エンドポイントARN}, 'failed': [管理者ID]}
+        """
+        result = {'sent': [], 'dead': {}, 'failed': []}
+        targets = {}
+        for admin_id, endpoint_arn in subscriptions.items():
+            if is_endpoint_dead(endpoint_arn):
+                result['dead'][admin_id] = endpoint_arn
+            else:
+                targets[admin_id] = endpoint_arn
+        if not targets:
+            return result
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as executor:
+            futures = {
+                admin_id: executor.submit(call_with_retries, lambda arn=endpoint_arn: self._publish(arn, message), f'push notification to admin {admin_id}')
+                for admin_id, endpoint_arn in targets.items()
+            }
+
+        for admin_id, future in futures.items():
+            error = future.exception()
+            if error is None:
+                result['sent'].append(admin_id)
+            elif is_dead_endpoint_error(error):
+                mark_endpoint_dead(targets[admin_id])
+                result['dead'][admin_id] = targets[admin_id]
+            else:
+                logger.error(f"Error sending push notification to admin {admin_id}: {str(error)}")
+                result['failed'].append(admin_id)
+        return result
+
+    def check_endpoints(self, endpoint_arns):
+        """
+        get_endpoint_attributes でエンドポイントの有効性を並行して確認し、ヘルスキャッシュを更新する
+
+        Returns:
+            dict: エンドポイントARN→有効か（確認できなかったものは含まない）
+        """
+        endpoint_arns = list(dict.fromkeys(endpoint_arns))
+        if not endpoint_arns:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(endpoint_arns))) as executor:
+            futures = {
+                endpoint_arn: executor.submit(call_with_retries, lambda arn=endpoint_arn: self._is_enabled(arn), f'endpoint check {endpoint_arn}')
+                for endpoint_arn in endpoint_arns
+            }
+
+        health = {}
+        for endpoint_arn, future in futures.items():
+            error = future.exception()
+            if error is not None and not is_dead_endpoint_error(error):
+                logger.warning(f"Failed to check endpoint {endpoint_arn}: {str(error)}")
+                continue
+            enabled = error is None and future.result()
+            (mark_endpoint_healthy if enabled else mark_endpoint_dead)(endpoint_arn)
+            health[endpoint_arn] = enabled
+        return health
+
+    def delete_endpoints(self, endpoint_arns):
+        """無効なエンドポイントをSNSから削除する（失敗しても例外は送出しない）"""
+        for endpoint_arn in endpoint_arns:
+            try:
+                self.sns_client.delete_endpoint(EndpointArn=endpoint_arn)
+            except ClientError as e:
+                logger.warning(f"Failed to delete SNS endpoint {endpoint_arn}: {str(e)}")
+
+    def _publish(self, endpoint_arn, message):
+        return self.sns_client.publish(TargetArn=endpoint_arn, Message=message, MessageStructure='json')
+
+    def _is_enabled(self, endpoint_arn):
+        response = self.sns_client.get_endpoint_attributes(EndpointArn=endpoint_arn)
+        return response['Attributes'].get('Enabled') == 'true'
+
+def prune_subscriptions(organizations_table, organization_id, dead):
+    """
+    無効なエンドポイントの登録（features.notifySubscriptions）を1回のupdate_itemでまとめて削除する
+
+    判定後に別のエンドポイントで再登録された管理者の登録は残す。
+
+    Args:
+        dead (dict): 管理者ID→無効なエンドポイントARN
+
+    Returns:
+        dict: 削除した 管理者ID→エンドポイントARN
+    """
+    if not dead:
+        return {}
+
+    names = {'#f': 'features', '#s': 'notifySubscriptions'}
+    values = {}
+    removes, conditions = [], []
+    for index, (admin_id, endpoint_arn) in enumerate(dead.items()):
+        names[f'#a{index}'] = admin_id
+        values[f':e{index}'] = endpoint_arn
+        removes.append(f'#f.#s.#a{index}')
+        conditions.append(f'#f.#s.#a{index} = :e{index}')
+
+    try:
+        organizations_table.update_item(
+            Key={'organizationId': organization_id},
+            UpdateExpression='REMOVE ' + ', '.join(removes),
+            ConditionExpression=' AND '.join(conditions),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+        logger.info(f"Removed {len(dead)} dead push subscriptions for organization {organization_id}")
+        return dead
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+    # 一部が再登録・削除済みの場合は、現在も同じエンドポイントの登録だけを削除し直す
+    item = organizations_table.get_item(
+        Key={'organizationId': organization_id},
+        ProjectionExpression='#f.#s',
+        ExpressionAttributeNames={'#f': 'features', '#s': 'notifySubscriptions'}
+    ).get('Item', {})
+    current = item.get('features', {}).get('notifySubscriptions', {})
+    remaining = {admin_id: arn for admin_id, arn in dead.items() if current.get(admin_id) == arn}
+    if not remaining or remaining == dead:
+        return {}
+    return prune_subscriptions(organizations_table, organization_id, remaining)
+
+def sweep_endpoints(dispatcher, organizations_table):
+    """
+    全組織のプッシュ通知の登録を get_endpoint_attributes で確認し、無効なものを削除する（定期実行用）
+
+    Returns:
+        dict: {'organizations': 登録のある組織数, 'checked': 確認したエンドポイント数, 'pruned': 削除した登録数}
+    """
+    names = {'#id': 'organizationId', '#f': 'features', '#s': 'notifySubscriptions'}
+    kwargs = {'ProjectionExpression': '#id, #f.#s', 'ExpressionAttributeNames': names}
+    subscriptions = {}
+    while True:
+        response = organizations_table.scan(**kwargs)
+        for item in response.get('Items', []):
+            registered = item.get('features', {}).get('notifySubscriptions', {})
+            if registered:
+                subscriptions[item['organizationId']] = registered
+        if not response.get('LastEvaluatedKey'):
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    health = dispatcher.check_endpoints(arn for registered in subscriptions.values() for arn in registered.values())
+
+    pruned = 0
+    for organization_id, registered in subscriptions.items():
+        dead = {admin_id: arn for admin_id, arn in registered.items() if health.get(arn) is False}
+        try:
+            removed = prune_subscriptions(organizations_table, organization_id, dead)
+        except ClientError as e:
+            logger.error(f"Failed to prune push subscriptions for organization {organization_id}: {str(e)}")
+            continue
+        dispatcher.delete_endpoints(removed.values())
+        pruned += len(removed)
+
+    return {'organizations': len(subscriptions), 'checked': len(health), 'pruned': pruned}
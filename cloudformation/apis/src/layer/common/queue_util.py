@@ -0,0 +1,67 @@
+import json
+import time
+import random
+import logging
+
+logger = logging.getLogger()
+
+# SendMessageBatchの1リクエストあたりの上限件数
+SEND_BATCH_LIMIT = 10
+MAX_SEND_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.1
+BACKOFF_MAX_SECONDS = 2.0
+
+def send_message_batches(sqs_client, queue_url, messages, sleep=time.sleep):
+    """
+    メッセージを10件ずつSendMessageBatchでキューに投入する
+
+    一部のエントリが失敗した場合は、失敗分のみジッター付き指数バックオフで再送する。
+    SQSクライアントは send_message_batch を持つオブジェクトであればよい（ローカルのスタブに差し替え可能）。
+
+    Args:
+        sqs_client: SQSクライアント
+        queue_url (str): キューのURL
+        messages (list): JSONシリアライズ可能なメッセージ本文のリスト
+        sleep (callable): 待機関数（テスト用）
+
+    Returns:
+        dict: {'sent': 投入件数, 'failed': [投入できなかったメッセージ本文, ...]}
+    """
+    sent = 0
+    failed = []
+    for i in range(0, len(messages), SEND_BATCH_LIMIT):
+        entries = {
+            str(index): message
+            for index, message in enumerate(messages[i:i + SEND_BATCH_LIMIT])
+        }
+        attempt = 0
+        while entries:
+            try:
+                response = sqs_client.send_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {'Id': entry_id, 'MessageBody': json.dumps(message)}
+                        for entry_id, message in entries.items()
+                    ]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to send message batch: {str(e)}")
+                response = {'Failed': [{'Id': entry_id, 'SenderFault': False} for entry_id in entries]}
+
+            sent += len(response.get('Successful', []))
+            # 送信側の誤り（SenderFault）は再送しても成功しないため再送対象から外す
+            retry = {}
+            for failure in response.get('Failed', []):
+                message = entries[failure['Id']]
+                if failure.get('SenderFault') or attempt >= MAX_SEND_RETRIES:
+                    logger.error(f"Failed to enqueue message {message}: {failure.get('Code')} {failure.get('Message')}")
+                    failed.append(message)
+                else:
+                    retry[failure['Id']] = message
+
+            entries = retry
+            if entries:
+                attempt += 1
+                sleep(random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))))
+
+    return {'sent': sent, 'failed': failed}
@@ -0,0 +1,212 @@
+from datetime import datetime
+from botocore.exceptions import ClientError
+from common.dynamo_types import to_decimal
+
+# 集計アイテムで管理するステータス区分
+AGGREGATE_STATUSES = ('pending', 'inFeedback', 'confirmed')
+RATING_METRICS = ('achievement', 'disability', 'stress')
+# 残業時間ヒストグラムの各区間の下限値（時間/週）
+OVERTIME_BUCKETS = (0, 5, 10, 20, 30, 45, 60)
+# 集計アイテムが週次報告から構築済み（完全）であることを示す属性
+SEED_MARKER = 'seededAt'
+# メンバーごとの寄与を保持する属性名の接頭辞（member_<memberUuid>）
+MEMBER_PREFIX = 'member_'
+# 削除された報告の寄与（構築時に古いインデックスの内容で復活させないよう、削除も値として残す）
+TOMBSTONE = {'deleted': True}
+# 1回のupdate_itemで書き込むメンバー数（UpdateExpressionの長さの上限に収める）
+MEMBERS_PER_UPDATE = 50
+
+def get_status_bucket(status):
+    """報告ステータスを集計上のステータス区分に変換する"""
+    if status == 'approved':
+        return 'confirmed'
+    elif status == 'feedback':
+        return 'inFeedback'
+    return 'pending'
+
+def _overtime_bucket(hours):
+    bucket = OVERTIME_BUCKETS[0]
+    for lower in OVERTIME_BUCKETS:
+        if hours >= lower:
+            bucket = lower
+    return bucket
+
+def member_attribute(member_uuid):
+    return f'{MEMBER_PREFIX}{member_uuid}'
+
+def report_contribution(report):
+    """
+    1件の週次報告が集計アイテムに与える寄与（member_<memberUuid> に SET する値）を算出する
+
+    集計アイテムはメンバーごとの寄与を保持し、合計・件数・ヒストグラムは参照時に導出する。
+    寄与は報告の内容だけで決まるため、同じストリームレコードを何度反映しても結果は変わらない
+    """
+    contribution = {'status': get_status_bucket(report.get('status'))}
+
+    rating = report.get('rating') or {}
+    ratings = {}
+    for metric in RATING_METRICS:
+        value = to_decimal(rating.get(metric))
+        if value is not None:
+            ratings[metric] = value
+    if ratings:
+        contribution['rating'] = ratings
+
+    overtime_hours = to_decimal(report.get('overtimeHours'))
+    if overtime_hours is not None:
+        contribution['overtimeHours'] = overtime_hours
+
+    return contribution
+
+def aggregate_key(report):
+    return (report.get('organizationId'), report.get('weekString'))
+
+def build_member_updates(old_report=None, new_report=None):
+    """
+    報告の変更前後のイメージから、集計アイテムごとのメンバーの寄与を算出する
+
+    Returns:
+        dict: {(organizationId, weekString): {memberUuid: 寄与 または TOMBSTONE}}
+    """
+    updates = {}
+    if old_report and all(aggregate_key(old_report)):
+        updates.setdefault(aggregate_key(old_report), {})[old_report['memberUuid']] = TOMBSTONE
+    if new_report and all(aggregate_key(new_report)):
+        updates.setdefault(aggregate_key(new_report), {})[new_report['memberUuid']] = report_contribution(new_report)
+    return updates
+
+def is_seeded(item):
+    """集計アイテムが週次報告から構築済みか（未構築のアイテムは一部のメンバーしか含まない）"""
+    return bool(item and item.get(SEED_MARKER))
+
+def _now(timezone=None):
+    return (datetime.now() if timezone is None else datetime.now(timezone)).isoformat()
+
+def apply_member_updates(table, key, members, timezone=None, require_seeded=True):
+    """
+    メンバーの寄与を1回のupdate_item（SET）で集計アイテムに書き込む
+
+    Args:
+        require_seeded: 構築済みのアイテムにのみ書き込む
+
+    Returns:
+        bool: 書き込んだか（require_seeded で未構築の場合は False）
+    """
+    organization_id, week_string = key
+    names = {'#seeded': SEED_MARKER}
+    values = {':updatedAt': _now(timezone)}
+    clauses = ['updatedAt = :updatedAt']
+    for i, (member_uuid, contribution) in enumerate(members.items()):
+        names[f'#m{i}'] = member_attribute(member_uuid)
+        values[f':m{i}'] = contribution
+        clauses.append(f'#m{i} = :m{i}')
+
+    kwargs = {}
+    if require_seeded:
+        kwargs['ConditionExpression'] = 'attribute_exists(#seeded)'
+    else:
+        del names['#seeded']
+    try:
+        table.update_item(
+            Key={'organizationId': organization_id, 'weekString': week_string},
+            UpdateExpression='SET ' + ', '.join(clauses),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            **kwargs
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+def seed_aggregate_item(table, organization_id, week_string, reports, timezone=None):
+    """
+    週次報告の一覧から、集計アイテムに無いメンバーの寄与を補い、構築済みとして記録する
+
+    ストリームで書き込まれた寄与（削除を含む）は、読み込んだ週次報告より新しい可能性があるため
+    if_not_exists で残す。インデックスの読み込みが古くても、ストリームで反映した変更は失われない。
+    """
+    contributions = {report['memberUuid']: report_contribution(report) for report in reports}
+    members = list(contributions.items())
+    for start in range(0, len(members), MEMBERS_PER_UPDATE):
+        names, values, clauses = {}, {}, []
+        for i, (member_uuid, contribution) in enumerate(members[start:start + MEMBERS_PER_UPDATE]):
+            names[f'#m{i}'] = member_attribute(member_uuid)
+            values[f':m{i}'] = contribution
+            clauses.append(f'#m{i} = if_not_exists(#m{i}, :m{i})')
+        table.update_item(
+            Key={'organizationId': organization_id, 'weekString': week_string},
+            UpdateExpression='SET ' + ', '.join(clauses),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    now = _now(timezone)
+    table.update_item(
+        Key={'organizationId': organization_id, 'weekString': week_string},
+        UpdateExpression='SET #seeded = :now, updatedAt = :now',
+        ExpressionAttributeNames={'#seeded': SEED_MARKER},
+        ExpressionAttributeValues={':now': now}
+    )
+    return len(members)
+
+def build_aggregate_item(organization_id, week_string, reports, timezone=None):
+    """週次報告の一覧から集計アイテムを丸ごと構築する（インデックス未構築時の集計・テストデータ用）"""
+    now = _now(timezone)
+    item = {
+        'organizationId': organization_id,
+        'weekString': week_string,
+        'updatedAt': now,
+        SEED_MARKER: now
+    }
+    for report in reports:
+        item[member_attribute(report['memberUuid'])] = report_contribution(report)
+    return item
+
+def iter_member_contributions(item):
+    """集計アイテムの (memberUuid, 寄与) を返す（削除済みのメンバーは除く）"""
+    for name, contribution in (item or {}).items():
+        if name.startswith(MEMBER_PREFIX) and not contribution.get('deleted'):
+            yield name[len(MEMBER_PREFIX):], contribution
+
+def format_aggregate(item):
+    """メンバーごとの寄与から、ステータス別の件数・評価と残業時間の集計を導出する"""
+    item = item or {}
+    status = {bucket: {'count': 0, 'members': []} for bucket in AGGREGATE_STATUSES}
+    metrics = {metric: {'sum': 0, 'count': 0, 'histogram': {}} for metric in RATING_METRICS + ('overtimeHours',)}
+
+    def add(metric, value, bucket):
+        summary = metrics[metric]
+        summary['sum'] += value
+        summary['count'] += 1
+        summary['histogram'][bucket] = summary['histogram'].get(bucket, 0) + 1
+
+    for member_uuid, contribution in iter_member_contributions(item):
+        bucket_status = status[contribution['status']]
+        bucket_status['count'] += 1
+        bucket_status['members'].append(member_uuid)
+        for metric, value in contribution.get('rating', {}).items():
+            add(metric, value, str(int(round(value))))
+        if contribution.get('overtimeHours') is not None:
+            add('overtimeHours', contribution['overtimeHours'], str(_overtime_bucket(contribution['overtimeHours'])))
+
+    def metric_summary(metric):
+        summary = metrics[metric]
+        return {
+            'sum': float(summary['sum']),
+            'count': summary['count'],
+            'mean': float(summary['sum']) / summary['count'] if summary['count'] else None,
+            'histogram': summary['histogram']
+        }
+
+    for bucket_status in status.values():
+        bucket_status['members'].sort()
+
+    return {
+        'organizationId': item.get('organizationId'),
+        'weekString': item.get('weekString'),
+        'status': status,
+        'rating': {metric: metric_summary(metric) for metric in RATING_METRICS},
+        'overtimeHours': metric_summary('overtimeHours')
+    }
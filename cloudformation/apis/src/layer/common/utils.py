@@ -1,29 +1,120 @@
 from typing import Dict, Any, Optional, Callable
+import os
+import gzip
 import json
+import base64
+import time
+import random
 import logging
+import threading
+import functools
 import traceback
+from contextlib import contextmanager
 from common.exception import ApplicationException
 from decimal import Decimal
 
 logger = logging.getLogger()
 
-def create_response(status_code, body):
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
-        },
-        'body': json.dumps(body, default=decimal_default_proc)
-    }
+METRICS_NAMESPACE = 'WeeklyReport'
+# 計測するリクエストの割合（0.0〜1.0）
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', '0.1'))
 
 def decimal_default_proc(obj):
     if isinstance(obj, Decimal):
         return float(obj)
     raise TypeError
 
+def _encode_json_stdlib(body: Any) -> bytes:
+    return json.dumps(body, default=decimal_default_proc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _encode_json_orjson(body: Any) -> bytes:
+    return orjson.dumps(body, default=decimal_default_proc, option=orjson.OPT_NON_STR_KEYS)
+
+# orjsonがあれば使い、なければ標準のjsonで出力する（どちらもDecimalはfloatとして出力する）
+try:
+    import orjson
+    _json_encoder = _encode_json_orjson
+except ImportError:
+    orjson = None
+    _json_encoder = _encode_json_stdlib
+
+def encode_json(body: Any) -> bytes:
+    return _json_encoder(body)
+
+# Accept-Encodingが許可する場合に、一定サイズ以上のレスポンスを圧縮する
+# （API GatewayのREST APIでは binaryMediaTypes の設定が必要なため、既定では無効とし、API Gateway側で圧縮する）
+RESPONSE_COMPRESSION_ENABLED = os.environ.get('RESPONSE_COMPRESSION_ENABLED', 'false').lower() == 'true'
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 処理中のリクエストのAccept-Encoding（instrument_handlerが設定する）
+_current_accept_encoding = None
+
+def get_accept_encoding(event: Any) -> Optional[str]:
+    headers = event.get('headers') if isinstance(event, dict) else None
+    for name, value in (headers or {}).items():
+        if name.lower() == 'accept-encoding':
+            return value
+    return None
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encodingから使用する圧縮方式を選ぶ（brotli > gzip、q=0は除外）"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=5, mtime=0)
+
+def create_response(status_code, body, accept_encoding=None):
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
+    }
+    data = encode_json(body)
+
+    encoding = None
+    if RESPONSE_COMPRESSION_ENABLED and len(data) >= RESPONSE_COMPRESSION_MIN_BYTES:
+        encoding = choose_encoding(accept_encoding or _current_accept_encoding)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        headers['Vary'] = 'Accept-Encoding'
+        return {
+            'statusCode': status_code,
+            'headers': headers,
+            'body': base64.b64encode(compress_body(data, encoding)).decode('ascii'),
+            'isBase64Encoded': True
+        }
+
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': data.decode('utf-8')
+    }
+
 def validate_required_params(data: Dict[str, Any], required_fields: list) -> None:
     """必須パラメータの検証"""
     missing_fields = [field for field in required_fields if field not in data]
@@ -52,9 +143,186 @@ def handle_lambda_errors(func: Callable) -> Callable:
             return func(event, context)
         except ApplicationException as e:
             logger.warning(f"Application error: {str(e)}")
-            return create_api_response(e.status_code, {'error': str(e)})
+            return create_response(e.status_code, {'error': str(e)})
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}")
             logger.error(traceback.format_exc())
-            return create_api_response(500, {'error': 'Internal Server Error'})
-    return wrapper
\ No newline at end of file
+            return create_response(500, {'error': 'Internal Server Error'})
+    return wrapper
+
+def emit_metrics(dimensions: Dict[str, str], metrics: Dict[str, Any], units: Dict[str, str] = None, properties: Dict[str, Any] = None, namespace: str = METRICS_NAMESPACE) -> None:
+    """メトリクスをCloudWatch Embedded Metric Format（標準出力へのJSON）で出力する"""
+    units = units or {}
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [list(dimensions.keys())],
+                'Metrics': [{'Name': name, 'Unit': units.get(name, 'Count')} for name in metrics]
+            }]
+        },
+        **dimensions,
+        **metrics,
+        **(properties or {})
+    }, default=decimal_default_proc))
+
+class RequestTrace:
+    """1リクエスト中の外部呼び出し（サービス・操作ごと）の回数・時間・消費キャパシティを集計する"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.monotonic()
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, service: str, operation: str, duration_ms: float, capacity: float = None, error: bool = False) -> None:
+        with self._lock:
+            call = self.calls.setdefault((service, operation), {'calls': 0, 'durationMs': 0.0, 'errors': 0, 'consumedCapacity': 0.0})
+            call['calls'] += 1
+            call['durationMs'] += duration_ms
+            call['errors'] += int(error)
+            if capacity:
+                call['consumedCapacity'] += capacity
+
+    def emit(self, status: Any) -> None:
+        duration_ms = (time.monotonic() - self.started) * 1000
+        breakdown = {}
+        for (service, operation), call in self.calls.items():
+            emit_metrics(
+                {'Route': self.route, 'Service': service, 'Operation': operation},
+                {
+                    'Calls': call['calls'],
+                    'DurationMs': round(call['durationMs'], 1),
+                    'Errors': call['errors'],
+                    'ConsumedCapacity': call['consumedCapacity']
+                },
+                {'DurationMs': 'Milliseconds'}
+            )
+            breakdown[f'{service}.{operation}'] = {k: round(v, 1) for k, v in call.items()}
+
+        external_ms = sum(call['durationMs'] for call in self.calls.values())
+        emit_metrics(
+            {'Route': self.route},
+            {'DurationMs': round(duration_ms, 1), 'ExternalDurationMs': round(external_ms, 1)},
+            {'DurationMs': 'Milliseconds', 'ExternalDurationMs': 'Milliseconds'},
+            # どこに時間を使ったかをリクエスト単位で確認するための内訳（メトリクスではなくログのプロパティ）
+            properties={'status': status, 'breakdown': breakdown}
+        )
+
+# Lambdaの1プロセスは同時に1リクエストのみ処理するため、計測中のリクエストはモジュール変数で持つ
+# （ワーカースレッドからの呼び出しも同じリクエストに集計される）
+_current_trace: Optional[RequestTrace] = None
+
+def get_route(event: Any) -> str:
+    """イベントから計測用のルート名を決める"""
+    if not isinstance(event, dict):
+        return 'unknown'
+    if 'httpMethod' in event:
+        return f"{event['httpMethod']} {event.get('resource') or event.get('path', '')}"
+    if event.get('action'):
+        return f"action:{event['action']}"
+    records = event.get('Records') or []
+    if records:
+        return f"records:{records[0].get('eventSource') or records[0].get('EventSource', 'unknown')}"
+    return event.get('detail-type') or event.get('source') or 'invoke'
+
+def instrument_handler(func: Callable) -> Callable:
+    """
+    lambda_handlerの計測デコレータ
+
+    サンプリングされたリクエストについて、AWS呼び出し（botocoreフック）と timed_call で囲んだ
+    外部呼び出しの時間を集計し、リクエストの終了時にEMFで出力する。
+    また、create_responseがレスポンスを圧縮できるよう、リクエストのAccept-Encodingを保持する
+    """
+    @functools.wraps(func)
+    def wrapper(event: Any, context: Any) -> Any:
+        global _current_trace, _current_accept_encoding
+        _current_accept_encoding = get_accept_encoding(event)
+        if random.random() >= INSTRUMENTATION_SAMPLE_RATE:
+            try:
+                return func(event, context)
+            finally:
+                _current_accept_encoding = None
+
+        trace = RequestTrace(get_route(event))
+        _current_trace = trace
+        status = 'error'
+        try:
+            response = func(event, context)
+            status = response.get('statusCode', 'ok') if isinstance(response, dict) else 'ok'
+            return response
+        finally:
+            _current_trace = None
+            _current_accept_encoding = None
+            try:
+                trace.emit(status)
+            except Exception as e:
+                logger.warning(f"Failed to emit instrumentation metrics: {str(e)}")
+    return wrapper
+
+@contextmanager
+def timed_call(service: str, operation: str):
+    """botocore以外の外部呼び出し（Stripeなど）を計測する"""
+    trace = _current_trace
+    if trace is None:
+        yield
+        return
+    started = time.monotonic()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        trace.record(service, operation, (time.monotonic() - started) * 1000, error=error)
+
+def _consumed_capacity(parsed: Dict[str, Any]) -> float:
+    consumed = parsed.get('ConsumedCapacity')
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return float(sum(item.get('CapacityUnits', 0) for item in consumed))
+
+def _request_consumed_capacity(params, model, **kwargs):
+    if _current_trace is not None and 'ReturnConsumedCapacity' in model.input_shape.members:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+def _before_call(model, context, **kwargs):
+    if _current_trace is not None:
+        # after-call-errorにはモデルが渡されないため、呼び出し情報はコンテキストに持たせる
+        context['instrumentation'] = (model.service_model.service_name, model.name, time.monotonic())
+
+def _record_call(context, parsed=None, error=False):
+    trace = _current_trace
+    call = context.get('instrumentation')
+    if trace is None or call is None:
+        return
+    service, operation, started = call
+    trace.record(
+        service,
+        operation,
+        (time.monotonic() - started) * 1000,
+        capacity=_consumed_capacity(parsed) if parsed else None,
+        error=error
+    )
+
+def _after_call(http_response, parsed, context, **kwargs):
+    _record_call(context, parsed, error='Error' in parsed)
+
+def _after_call_error(exception, context, **kwargs):
+    _record_call(context, error=True)
+
+def install_instrumentation(events) -> None:
+    """botocoreのイベントに計測フックを登録する（unique_idにより重複登録されない）"""
+    events.register('before-parameter-build.dynamodb', _request_consumed_capacity, unique_id='instrumentation-capacity')
+    events.register('before-call', _before_call, unique_id='instrumentation-before-call')
+    events.register('after-call', _after_call, unique_id='instrumentation-after-call')
+    events.register('after-call-error', _after_call_error, unique_id='instrumentation-after-call-error')
+
+def instrument_client(client):
+    """クライアントに計測フックを登録する（common.aws_clients で作成したクライアントのみが計測対象になる）"""
+    install_instrumentation(client.meta.events)
+    return client
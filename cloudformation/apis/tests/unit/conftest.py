@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+from .stubs import SRC_DIR, InMemoryQueue
+
+# Lambdaレイヤー（common）を読み込めるようにする
+sys.path.insert(0, os.path.join(SRC_DIR, 'layer'))
+
+
+@pytest.fixture
+def queue():
+    return InMemoryQueue()
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    """motoのDynamoDB（テストごとに空の状態から始める）"""
+    moto = pytest.importorskip('moto')
+    import boto3
+    for name, value in {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing', 'AWS_DEFAULT_REGION': 'ap-northeast-1'}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        yield boto3.resource('dynamodb', region_name='ap-northeast-1')
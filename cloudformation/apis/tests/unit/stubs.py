@@ -0,0 +1,120 @@
+"""ユニットテスト用のAWSサービス・Stripeの代わり"""
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import sys
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+
+
+class InMemoryQueue:
+    """
+    SQSの代わりのインメモリのキュー（send_message_batch のみ）
+
+    fail_ids に指定したエントリIDは、指定した回数だけ失敗として返す。
+    """
+
+    def __init__(self, fail_ids=None, sender_fault=False):
+        self.messages = []
+        self.calls = []
+        self.fail_ids = dict(fail_ids or {})
+        self.sender_fault = sender_fault
+
+    def send_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        self.calls.append([entry['Id'] for entry in Entries])
+        successful, failed = [], []
+        for entry in Entries:
+            if self.fail_ids.get(entry['Id'], 0) > 0:
+                self.fail_ids[entry['Id']] -= 1
+                failed.append({'Id': entry['Id'], 'SenderFault': self.sender_fault, 'Code': 'InternalError', 'Message': 'stub'})
+                continue
+            self.messages.append(json.loads(entry['MessageBody']))
+            successful.append({'Id': entry['Id'], 'MessageId': str(uuid.uuid4())})
+        return {'Successful': successful, 'Failed': failed}
+
+
+class StubSns:
+    """
+    SNSのプッシュ通知の代わり（publish・get_endpoint_attributes・delete_endpoint）
+
+    errors に指定したエンドポイントARNへの呼び出しは、そのエラーコードで失敗する。
+    """
+
+    def __init__(self, errors=None, disabled=()):
+        self.errors = dict(errors or {})
+        self.disabled = set(disabled)
+        self.published = []
+        self.deleted = []
+
+    def _raise_for(self, endpoint_arn, operation):
+        code = self.errors.get(endpoint_arn)
+        if code:
+            raise ClientError({'Error': {'Code': code, 'Message': 'stub'}}, operation)
+
+    def publish(self, TargetArn, Message, MessageStructure):
+        self._raise_for(TargetArn, 'Publish')
+        self.published.append(TargetArn)
+        return {'MessageId': str(uuid.uuid4())}
+
+    def get_endpoint_attributes(self, EndpointArn):
+        self._raise_for(EndpointArn, 'GetEndpointAttributes')
+        return {'Attributes': {'Enabled': 'false' if EndpointArn in self.disabled else 'true'}}
+
+    def delete_endpoint(self, EndpointArn):
+        self.deleted.append(EndpointArn)
+
+
+def create_table(dynamodb, table_name, hash_key):
+    """文字列のパーティションキーだけを持つテーブルを作成する（moto）"""
+    return dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[{'AttributeName': hash_key, 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': hash_key, 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def stripe_subscription(customer='cus_test', status='active', plan_id='business', account_count=5, subscription_id='sub_test'):
+    """Stripeのサブスクリプション"""
+    now = int(time.time())
+    return {
+        'object': 'subscription', 'id': subscription_id, 'customer': customer, 'status': status,
+        'metadata': {'plan_id': plan_id, 'account_count': str(account_count)},
+        'current_period_end': now + 30 * 86400, 'cancel_at_period_end': False
+    }
+
+
+def stripe_event(event_type, obj, created=None):
+    """Stripeのイベント（Webhookで届く本文）"""
+    return {
+        'object': 'event', 'id': f'evt_{uuid.uuid4().hex[:24]}', 'type': event_type,
+        'created': created or int(time.time()), 'livemode': False,
+        'data': {'object': obj}
+    }
+
+
+def sign_stripe_payload(payload, secret, timestamp=None):
+    """Stripe-Signature ヘッダーの値（「タイムスタンプ.本文」のHMAC-SHA256）"""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode('utf-8'), f'{timestamp}.{payload}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def load_function(name):
+    """src/<name>/lambda_function.py を関数ごとに別名のモジュールとして読み込む"""
+    function_dir = os.path.join(SRC_DIR, name)
+    # 関数内の他のモジュール（payment_config など）を読み込めるようにする
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+    path = os.path.join(function_dir, 'lambda_function.py')
+    spec = importlib.util.spec_from_file_location(f'{name}_lambda_function', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .stubs import SRC_DIR
+
+BENCHMARKS_DIR = os.path.join(SRC_DIR, '..', 'benchmarks')
+
+
+def test_handlers_match_baseline():
+    """最小の規模（10名）で全ルートを実行し、AWS呼び出し数・ユニット・成否がベースラインから悪化していないことを確認する"""
+    for module in ('moto', 'yaml'):
+        pytest.importorskip(module)
+
+    completed = subprocess.run(
+        [
+            sys.executable, os.path.join(BENCHMARKS_DIR, 'bench_handlers.py'),
+            '--scales', '10', '--iterations', '1', '--no-latency',
+            '--baseline', os.path.join(BENCHMARKS_DIR, 'handler_baseline.json')
+        ],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+
+    regressions = [line for line in completed.stdout.splitlines() if line.startswith('REGRESSION')]
+    assert completed.returncode == 0, '\n'.join(regressions) or completed.stdout[-2000:]
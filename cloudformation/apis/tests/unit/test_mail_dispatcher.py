@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from common import mail_dispatcher
+from common.mail_dispatcher import MailDispatcher, TokenBucket, summarize_results
+
+
+class FakeClock:
+    """
+    sleep で時刻を進める時計
+
+    並行して待機しているスレッドの待ち時間は重ならないよう、
+    各スレッドが最後に時刻を読んでから seconds 後を起床時刻とし、最も遅い起床時刻まで進める。
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __call__(self):
+        with self._lock:
+            self._local.read_at = self.now
+            return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now = max(self.now, getattr(self._local, 'read_at', self.now) + seconds)
+
+
+class StubSes:
+    """SESの代わりに、送信時刻と宛先数を記録するスタブ"""
+
+    def __init__(self, clock, statuses=None, error=None):
+        self.clock = clock
+        self.sends = []
+        self.statuses = list(statuses or [])
+        self.error = error
+        self._lock = threading.Lock()
+
+    def send_bulk_templated_email(self, **kwargs):
+        with self._lock:
+            self.sends.append((self.clock(), len(kwargs['Destinations'])))
+            if self.error:
+                raise self.error
+            statuses = self.statuses.pop(0) if self.statuses else None
+        if statuses is None:
+            statuses = ['Success'] * len(kwargs['Destinations'])
+        return {'Status': [
+            {'Status': status, 'MessageId': f'msg-{i}'} if status == 'Success' else {'Status': status, 'Error': status}
+            for i, status in enumerate(statuses)
+        ]}
+
+
+def destinations(count):
+    return [{'id': i, 'to': [f'member{i}@example.com'], 'templateData': '{}'} for i in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(mail_dispatcher, 'backoff_delay', lambda attempt: 0)
+
+
+def test_token_bucket_allows_burst_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(14, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire(14)
+
+    assert clock.now == 0
+
+
+def test_token_bucket_waits_for_deficit_of_large_request():
+    clock = FakeClock()
+    bucket = TokenBucket(14, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire(14)
+    bucket.acquire(50)
+
+    assert clock.now == pytest.approx(50 / 14)
+
+
+@pytest.mark.parametrize('workers', [1, 8])
+def test_bulk_send_keeps_configured_rate(workers):
+    clock = FakeClock()
+    ses = StubSes(clock)
+    dispatcher = MailDispatcher(ses, send_rate=14, max_workers=workers, clock=clock, sleep=clock.sleep)
+
+    results = dispatcher.send_bulk_templated('no-reply@example.com', 'template', destinations(400))
+
+    assert summarize_results(results) == {'sent': 400, 'failed': 0}
+    assert max(count for _, count in ses.sends) <= 14
+    # 開始時の容量分を除き、経過時間あたり14件を超えて送信していない
+    for at, _ in ses.sends:
+        sent_by = sum(count for sent_at, count in ses.sends if sent_at <= at)
+        assert sent_by <= 14 + 14 * at + 1e-6
+    assert clock.now >= (400 - 14) / 14 - 1e-6
+
+
+def test_bulk_send_retries_only_throttled_destinations():
+    clock = FakeClock()
+    ses = StubSes(clock, statuses=[['Success', 'AccountThrottled', 'Success'], ['Success']])
+    dispatcher = MailDispatcher(ses, send_rate=14, clock=clock, sleep=clock.sleep)
+
+    results = dispatcher.send_bulk_templated('no-reply@example.com', 'template', destinations(3))
+
+    assert [count for _, count in ses.sends] == [3, 1]
+    assert [result['id'] for result in results] == [0, 1, 2]
+    assert all(result['status'] == 'success' for result in results)
+
+
+def test_bulk_send_reports_failures_after_retries():
+    clock = FakeClock()
+    error = ClientError({'Error': {'Code': 'Throttling', 'Message': 'Maximum sending rate exceeded.'}}, 'SendBulkTemplatedEmail')
+    ses = StubSes(clock, error=error)
+    dispatcher = MailDispatcher(ses, send_rate=14, max_retries=2, clock=clock, sleep=clock.sleep)
+
+    results = dispatcher.send_bulk_templated('no-reply@example.com', 'template', destinations(2))
+
+    assert len(ses.sends) == 3
+    assert summarize_results(results) == {'sent': 0, 'failed': 2}
@@ -0,0 +1,120 @@
+import pytest
+
+from common import push_dispatcher
+from common.push_dispatcher import PushDispatcher, prune_subscriptions
+
+from .stubs import StubSns, create_table
+
+ORGANIZATION_ID = 'org-1'
+
+
+def endpoint(name):
+    return f'arn:aws:sns:ap-northeast-1:123456789012:endpoint/GCM/app/{name}'
+
+
+@pytest.fixture(autouse=True)
+def empty_health_cache(monkeypatch):
+    monkeypatch.setattr(push_dispatcher, '_dead_endpoints', {})
+
+
+@pytest.fixture
+def organizations(dynamodb):
+    table = create_table(dynamodb, 'dev-Organizations', 'organizationId')
+    table.put_item(Item={
+        'organizationId': ORGANIZATION_ID,
+        'features': {'notifySubscriptions': {
+            'admin-1': endpoint('a1'),
+            'admin-2': endpoint('a2'),
+            'admin-3': endpoint('a3')
+        }}
+    })
+    return table
+
+
+def subscriptions(table):
+    return table.get_item(Key={'organizationId': ORGANIZATION_ID})['Item']['features']['notifySubscriptions']
+
+
+@pytest.mark.parametrize('code', ['EndpointDisabled', 'NotFound'])
+def test_dead_endpoint_error_marks_endpoint_dead(code):
+    sns = StubSns(errors={endpoint('a2'): code})
+    dispatcher = PushDispatcher(sns)
+
+    result = dispatcher.publish({'admin-1': endpoint('a1'), 'admin-2': endpoint('a2')}, '{}')
+
+    assert result == {'sent': ['admin-1'], 'dead': {'admin-2': endpoint('a2')}, 'failed': []}
+    assert push_dispatcher.is_endpoint_dead(endpoint('a2'))
+    assert not push_dispatcher.is_endpoint_dead(endpoint('a1'))
+
+
+def test_other_errors_do_not_mark_endpoint_dead(monkeypatch):
+    monkeypatch.setattr(push_dispatcher, 'BACKOFF_BASE_SECONDS', 0)
+    sns = StubSns(errors={endpoint('a1'): 'InvalidParameter'})
+
+    result = PushDispatcher(sns).publish({'admin-1': endpoint('a1')}, '{}')
+
+    assert result == {'sent': [], 'dead': {}, 'failed': ['admin-1']}
+    assert not push_dispatcher.is_endpoint_dead(endpoint('a1'))
+
+
+def test_cached_dead_endpoint_is_skipped():
+    push_dispatcher.mark_endpoint_dead(endpoint('a2'))
+    sns = StubSns()
+
+    result = PushDispatcher(sns).publish({'admin-1': endpoint('a1'), 'admin-2': endpoint('a2')}, '{}')
+
+    assert sns.published == [endpoint('a1')]
+    assert result['dead'] == {'admin-2': endpoint('a2')}
+
+
+def test_dead_endpoint_is_retried_after_ttl(monkeypatch):
+    push_dispatcher.mark_endpoint_dead(endpoint('a1'))
+    monkeypatch.setattr(push_dispatcher, 'ENDPOINT_HEALTH_TTL_SECONDS', -1)
+    sns = StubSns()
+
+    result = PushDispatcher(sns).publish({'admin-1': endpoint('a1')}, '{}')
+
+    assert sns.published == [endpoint('a1')]
+    assert result['sent'] == ['admin-1']
+
+
+def test_prune_removes_dead_subscriptions(organizations):
+    dead = {'admin-1': endpoint('a1'), 'admin-2': endpoint('a2')}
+
+    assert prune_subscriptions(organizations, ORGANIZATION_ID, dead) == dead
+    assert subscriptions(organizations) == {'admin-3': endpoint('a3')}
+
+
+def test_prune_keeps_admin_who_re_registered(organizations):
+    # 無効と判定した後に admin-2 が別のエンドポイントで登録し直した
+    organizations.update_item(
+        Key={'organizationId': ORGANIZATION_ID},
+        UpdateExpression='SET features.notifySubscriptions.#a = :e',
+        ExpressionAttributeNames={'#a': 'admin-2'},
+        ExpressionAttributeValues={':e': endpoint('a2-new')}
+    )
+    dead = {'admin-1': endpoint('a1'), 'admin-2': endpoint('a2')}
+
+    assert prune_subscriptions(organizations, ORGANIZATION_ID, dead) == {'admin-1': endpoint('a1')}
+    assert subscriptions(organizations) == {'admin-2': endpoint('a2-new'), 'admin-3': endpoint('a3')}
+
+
+def test_prune_does_nothing_when_all_re_registered(organizations):
+    organizations.update_item(
+        Key={'organizationId': ORGANIZATION_ID},
+        UpdateExpression='REMOVE features.notifySubscriptions.#a',
+        ExpressionAttributeNames={'#a': 'admin-1'}
+    )
+
+    assert prune_subscriptions(organizations, ORGANIZATION_ID, {'admin-1': endpoint('a1')}) == {}
+    assert subscriptions(organizations) == {'admin-2': endpoint('a2'), 'admin-3': endpoint('a3')}
+
+
+def test_sweep_prunes_disabled_endpoints(organizations):
+    sns = StubSns(disabled={endpoint('a3')}, errors={endpoint('a1'): 'NotFound'})
+
+    result = push_dispatcher.sweep_endpoints(PushDispatcher(sns), organizations)
+
+    assert result == {'organizations': 1, 'checked': 3, 'pruned': 2}
+    assert subscriptions(organizations) == {'admin-2': endpoint('a2')}
+    assert sorted(sns.deleted) == [endpoint('a1'), endpoint('a3')]
@@ -0,0 +1,35 @@
+from .stubs import InMemoryQueue
+
+from common.queue_util import send_message_batches
+
+QUEUE_URL = 'https://sqs.ap-northeast-1.amazonaws.com/123456789012/dev-send-request'
+
+
+def messages(count):
+    return [{'payload': {'organizationId': f'org-{i}'}} for i in range(count)]
+
+
+def test_sends_in_batches_of_ten(queue):
+    result = send_message_batches(queue, QUEUE_URL, messages(25), sleep=lambda seconds: None)
+
+    assert result == {'sent': 25, 'failed': []}
+    assert [len(call) for call in queue.calls] == [10, 10, 5]
+    assert queue.messages == messages(25)
+
+
+def test_resends_only_failed_entries():
+    queue = InMemoryQueue(fail_ids={'3': 2})
+
+    result = send_message_batches(queue, QUEUE_URL, messages(5), sleep=lambda seconds: None)
+
+    assert result == {'sent': 5, 'failed': []}
+    assert queue.calls == [['0', '1', '2', '3', '4'], ['3'], ['3']]
+
+
+def test_gives_up_on_sender_fault():
+    queue = InMemoryQueue(fail_ids={'1': 1}, sender_fault=True)
+
+    result = send_message_batches(queue, QUEUE_URL, messages(2), sleep=lambda seconds: None)
+
+    assert result == {'sent': 1, 'failed': [messages(2)[1]]}
+    assert len(queue.calls) == 1
@@ -0,0 +1,32 @@
+import pytest
+
+from .stubs import InMemoryQueue, load_function
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    module = load_function('Schedule')
+    monkeypatch.setattr(module, 'query_all', lambda table, **kwargs: [{'organizationId': f'org-{i}'} for i in range(12)])
+    monkeypatch.setattr(module, 'SEND_REQUEST_QUEUE_URL', 'https://sqs.ap-northeast-1.amazonaws.com/123456789012/dev-send-request')
+    monkeypatch.setattr('common.queue_util.time.sleep', lambda seconds: None)
+    return module
+
+
+def test_enqueues_due_organizations(schedule, queue, monkeypatch):
+    monkeypatch.setattr(schedule, 'sqs_client', queue)
+
+    result = schedule.lambda_handler({}, None)
+
+    assert result == {'enqueued': 12, 'failed': []}
+    assert [message['payload']['organizationId'] for message in queue.messages] == [f'org-{i}' for i in range(12)]
+
+
+def test_partial_failure_is_returned_without_raising(schedule, monkeypatch):
+    # 例外を送出すると非同期呼び出しの再試行で投入済みの組織が再投入されるため、失敗分は返すのみ
+    queue = InMemoryQueue(fail_ids={'4': 10})
+    monkeypatch.setattr(schedule, 'sqs_client', queue)
+
+    result = schedule.lambda_handler({}, None)
+
+    assert result == {'enqueued': 11, 'failed': ['org-4']}
+    assert len(queue.messages) == 11
@@ -0,0 +1,104 @@
+import pytest
+
+from .stubs import load_function
+
+ORGANIZATION_ID = 'org-1'
+WEEK = '2024-W43'
+
+
+class StubDispatcher:
+    """MailDispatcherの代わりに、宛先ごとの送信結果を返すスタブ（fail_ids は指定回数だけ失敗させる）"""
+
+    chunk_size = 2
+
+    def __init__(self, fail_ids=None):
+        self.sent = []
+        self.fail_ids = dict(fail_ids or {})
+
+    def ensure_template(self, *args):
+        return True
+
+    def send_bulk_templated(self, source, template_name, destinations):
+        assert len(destinations) <= self.chunk_size
+        results = []
+        for destination in destinations:
+            if self.fail_ids.get(destination['id'], 0) > 0:
+                self.fail_ids[destination['id']] -= 1
+                results.append({'id': destination['id'], 'to': destination['to'], 'status': 'failed', 'messageId': None, 'error': 'stub'})
+                continue
+            self.sent.append(destination['id'])
+            results.append({'id': destination['id'], 'to': destination['to'], 'status': 'success', 'messageId': 'msg', 'error': None})
+        return results
+
+
+@pytest.fixture
+def send_request(monkeypatch):
+    module = load_function('SendRequest')
+    organization = {'organizationId': ORGANIZATION_ID, 'name': '組織', 'reportWeek': 0}
+    members = [{'memberUuid': f'member-{i}', 'name': f'メンバー{i}', 'email': f'member{i}@example.com'} for i in range(5)]
+
+    def record_requested_members(organization_id, week_string, member_uuids):
+        # 組織アイテムへの記録の代わり（週が変わった場合は置き換え、同じ週は追加する）
+        if organization.get('lastRequestedWeek') != week_string:
+            organization.update(lastRequestedWeek=week_string, requestedMembers=set())
+        organization['requestedMembers'].update(member_uuids)
+
+    monkeypatch.setattr(module, 'get_organization', lambda organization_id, consistent_read=False: dict(organization))
+    monkeypatch.setattr(module, 'iter_organization_members', lambda table, organization_id, attributes: iter(members))
+    monkeypatch.setattr(module, 'get_reports_by_organization', lambda organization_id, week_string: [])
+    monkeypatch.setattr(module, 'record_requested_members', record_requested_members)
+    monkeypatch.setattr(module, 'get_string_from_week', lambda now, offset: WEEK)
+    monkeypatch.setattr(module.common.publisher, 'get_from_address', lambda org: 'no-reply@example.com')
+    module.organization = organization
+    return module
+
+
+def queue_event():
+    return {'Records': [{'messageId': 'message-1', 'body': f'{{"organizationId": "{ORGANIZATION_ID}"}}'}]}
+
+
+def test_redelivery_sends_only_to_members_not_yet_mailed(send_request, monkeypatch):
+    dispatcher = StubDispatcher(fail_ids={'member-3': 1})
+    monkeypatch.setattr(send_request, 'dispatcher', dispatcher)
+
+    # 一部の宛先に送信できなかった場合は再試行させる
+    assert send_request.lambda_handler(queue_event(), None) == {'batchItemFailures': [{'itemIdentifier': 'message-1'}]}
+    assert send_request.organization['requestedMembers'] == {'member-0', 'member-1', 'member-2', 'member-4'}
+
+    assert send_request.lambda_handler(queue_event(), None) == {'batchItemFailures': []}
+    assert dispatcher.sent == ['member-0', 'member-1', 'member-2', 'member-4', 'member-3']
+
+    # 全員に送信済みの週は再配信されても送信しない
+    assert send_request.lambda_handler(queue_event(), None) == {'batchItemFailures': []}
+    assert len(dispatcher.sent) == 5
+
+
+def test_progress_is_recorded_per_chunk(send_request, monkeypatch):
+    # 途中の区切りで処理が中断しても、それまでに送信したメンバーは記録されている
+    dispatcher = StubDispatcher()
+    sends = dispatcher.send_bulk_templated
+
+    def interrupted(source, template_name, destinations):
+        if len(dispatcher.sent) >= 2:
+            raise TimeoutError('interrupted')
+        return sends(source, template_name, destinations)
+
+    monkeypatch.setattr(dispatcher, 'send_bulk_templated', interrupted)
+    monkeypatch.setattr(send_request, 'dispatcher', dispatcher)
+
+    assert send_request.lambda_handler(queue_event(), None) == {'batchItemFailures': [{'itemIdentifier': 'message-1'}]}
+    assert send_request.organization['requestedMembers'] == {'member-0', 'member-1'}
+
+    monkeypatch.setattr(dispatcher, 'send_bulk_templated', sends)
+    assert send_request.lambda_handler(queue_event(), None) == {'batchItemFailures': []}
+    assert dispatcher.sent == ['member-0', 'member-1', 'member-2', 'member-3', 'member-4']
+
+
+def test_new_week_sends_to_all_members(send_request, monkeypatch):
+    dispatcher = StubDispatcher()
+    monkeypatch.setattr(send_request, 'dispatcher', dispatcher)
+    send_request.organization.update(lastRequestedWeek='2024-W42', requestedMembers={'member-0', 'member-1'})
+
+    assert send_request.lambda_handler(queue_event(), None) == {'batchItemFailures': []}
+    assert len(dispatcher.sent) == 5
+    assert send_request.organization['lastRequestedWeek'] == WEEK
@@ -0,0 +1,119 @@
+import json
+import time
+
+import pytest
+
+stripe = pytest.importorskip('stripe')
+
+from .stubs import create_table, load_function, sign_stripe_payload, stripe_event, stripe_subscription
+
+WEBHOOK_SECRET = 'whsec_test'
+CUSTOMER_ID = 'cus_test'
+
+
+@pytest.fixture
+def payment(monkeypatch):
+    monkeypatch.setenv('STRIPE_SECRET_KEY', 'sk_test')
+    module = load_function('Payment')
+    monkeypatch.setattr(module.PaymentConfig, 'WEBHOOK_SECRET', WEBHOOK_SECRET)
+    return module
+
+
+@pytest.fixture
+def mirror(payment, dynamodb):
+    from subscription_mirror import SubscriptionMirror
+    return SubscriptionMirror(create_table(dynamodb, 'dev-StripeSubscriptions', 'customerId'), max_age_seconds=3600)
+
+
+def stored(mirror):
+    return mirror.table.get_item(Key={'customerId': CUSTOMER_ID})['Item']
+
+
+def test_out_of_order_update_is_discarded(mirror):
+    newer = stripe_event('customer.subscription.updated', stripe_subscription(plan_id='business'), created=200)
+    older = stripe_event('customer.subscription.updated', stripe_subscription(plan_id='standard'), created=100)
+
+    assert mirror.apply_event(newer) == 'applied'
+    assert mirror.apply_event(older) == 'stale'
+    assert stored(mirror)['planId'] == 'business'
+    assert stored(mirror)['version'] == 200
+
+    # 同じイベントの再送は同じ内容で上書きするだけ
+    assert mirror.apply_event(newer) == 'applied'
+    assert stored(mirror)['planId'] == 'business'
+
+
+def test_deleted_event_for_non_current_subscription_keeps_plan(mirror):
+    current = stripe_subscription(subscription_id='sub_new', plan_id='business')
+    previous = stripe_subscription(subscription_id='sub_old', status='canceled', plan_id='standard')
+    assert mirror.apply_event(stripe_event('customer.subscription.created', current, created=100)) == 'applied'
+
+    # プラン変更で解約した古いサブスクリプションの削除は、後から届いても現在のプランを消さない
+    assert mirror.apply_event(stripe_event('customer.subscription.deleted', previous, created=200)) == 'stale'
+    assert stored(mirror)['subscriptionId'] == 'sub_new'
+    assert stored(mirror)['planId'] == 'business'
+
+    canceled = stripe_subscription(subscription_id='sub_new', status='canceled', plan_id='business')
+    assert mirror.apply_event(stripe_event('customer.subscription.deleted', canceled, created=300)) == 'applied'
+    assert stored(mirror)['planId'] == 'free'
+
+
+def test_condition_only_guards_inactive_subscriptions(mirror):
+    assert mirror._condition_for(stripe_subscription(status='active')) is None
+    assert mirror._condition_for(stripe_subscription(status='canceled')) is not None
+
+
+def test_stale_record_is_served_when_stripe_fails(mirror):
+    from subscription_mirror import build_record
+    record = build_record(CUSTOMER_ID, stripe_subscription(plan_id='business'))
+    assert mirror._put(record, 100, 'webhook')
+    mirror.table.update_item(Key={'customerId': CUSTOMER_ID}, UpdateExpression='SET syncedAt = :old', ExpressionAttributeValues={':old': int(time.time()) - 7200})
+
+    def unavailable():
+        raise stripe.error.APIConnectionError('Stripe is down')
+
+    assert mirror.read(CUSTOMER_ID, unavailable)['planId'] == 'business'
+    with pytest.raises(stripe.error.APIConnectionError):
+        mirror.read('cus_unknown', unavailable)
+
+
+def webhook_request(payload, signature):
+    return {
+        'httpMethod': 'POST',
+        'path': '/payment/webhook',
+        'headers': {'Stripe-Signature': signature},
+        'body': payload
+    }
+
+
+class StubInvoiceHistory:
+    def __init__(self):
+        self.events = []
+
+    def apply_event(self, event):
+        self.events.append(event['type'])
+        return True
+
+
+def test_webhook_with_bad_signature_returns_400(payment, mirror, monkeypatch):
+    monkeypatch.setattr(payment, 'subscription_mirror', mirror)
+    payload = json.dumps(stripe_event('customer.subscription.updated', stripe_subscription()))
+
+    response = payment.handle_webhook(webhook_request(payload, sign_stripe_payload(payload, 'whsec_other')))
+
+    assert response['statusCode'] == 400
+    assert 'Item' not in mirror.table.get_item(Key={'customerId': CUSTOMER_ID})
+
+
+def test_signed_webhook_is_applied(payment, mirror, monkeypatch):
+    invoice_history = StubInvoiceHistory()
+    monkeypatch.setattr(payment, 'subscription_mirror', mirror)
+    monkeypatch.setattr(payment, 'invoice_history', invoice_history)
+    payload = json.dumps(stripe_event('customer.subscription.updated', stripe_subscription(plan_id='business')))
+
+    response = payment.handle_webhook(webhook_request(payload, sign_stripe_payload(payload, WEBHOOK_SECRET)))
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['result'] == 'applied'
+    assert stored(mirror)['planId'] == 'business'
+    assert invoice_history.events == ['customer.subscription.updated']
@@ -58,9 +58,9 @@ export const advisorRoles = {
   },
 }
 
-export const getWeeklyReportAdvice = async (memberUuid, weekString, advisorRole) => {
+export const getWeeklyReportAdvice = async (memberUuid, weekString, advisorRole, { regenerate = false } = {}) => {
   try {
-    const result = await apiClient.post(`${BASE_PATH}/advice`, { memberUuid, weekString, advisorRole })
+    const result = await apiClient.post(`${BASE_PATH}/advice`, { memberUuid, weekString, advisorRole, regenerate })
     return {
       advice: result.advice || '',
       weekString: result.weekString,
@@ -73,9 +73,50 @@ export const getWeeklyReportAdvice = async (memberUuid, weekString, advisorRole)
   }
 }
 
-export const getWeeklyReportSummary = async (memberUuid) => {
+const STREAM_POLL_INTERVAL_MS = 500
+const STREAM_TIMEOUT_MS = 60000
+
+// アドバイスを逐次生成し、途中経過のテキストをonChunkに渡す
+// （ストリーミングが無効なサーバーでは通常の応答をそのまま返す）
+export const streamWeeklyReportAdvice = async (memberUuid, weekString, advisorRole, onChunk, { regenerate = false } = {}) => {
+  try {
+    const result = await apiClient.post(`${BASE_PATH}/advice`, { memberUuid, weekString, advisorRole, regenerate, stream: true })
+    const advice = {
+      advice: result.advice || '',
+      weekString: result.weekString,
+      memberUuid: result.memberUuid,
+      remainingTickets: result.remainingTickets || 0
+    }
+    if (!result.streamId) {
+      onChunk?.(advice.advice)
+      return advice
+    }
+
+    const startedAt = Date.now()
+    while (Date.now() - startedAt < STREAM_TIMEOUT_MS) {
+      await new Promise(resolve => setTimeout(resolve, STREAM_POLL_INTERVAL_MS))
+      const stream = await apiClient.get(`${BASE_PATH}/advice/stream`, { streamId: result.streamId })
+      if (stream.error) {
+        throw new Error(stream.error)
+      }
+      onChunk?.(stream.text)
+      if (stream.done) {
+        return { ...advice, advice: stream.text }
+      }
+    }
+    throw new Error('アドバイスの生成がタイムアウトしました。')
+  } catch (error) {
+    console.error('Error streaming weekly report advice:', error)
+    // チケット不足（INSUFFICIENT_TICKETS）などを呼び出し元で判別できるようコードを引き継ぐ
+    const streamError = new Error('週次報告のアドバイス取得に失敗しました。')
+    streamError.code = error.code
+    throw streamError
+  }
+}
+
+export const getWeeklyReportSummary = async (memberUuid, { regenerate = false } = {}) => {
   try {
-    const result = await apiClient.post(`${BASE_PATH}/summary`, { memberUuid })
+    const result = await apiClient.post(`${BASE_PATH}/summary`, { memberUuid, regenerate })
     return {
       summary: result.data.summary || '',
       insights: {
@@ -32,8 +32,8 @@ export const createMember = async (member) => {
   return apiClient.post(BASE_PATH, member)
 }
 
-export const deleteMember = async (memberUuid) => {
-  return apiClient.delete(BASE_PATH, { memberUuid })
+export const deleteMember = async (memberUuid, { async = false } = {}) => {
+  return apiClient.delete(BASE_PATH, { memberUuid, mode: async ? 'async' : undefined })
 }
 
 export const listOrganizationMembers = async (organizationId) => {
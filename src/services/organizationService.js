@@ -22,8 +22,18 @@ export const deleteOrganization = async (organizationId) => {
   return apiClient.delete(BASE_PATH, { organizationId })
 }
 
+const MAX_DELETION_ATTEMPTS = 10
+
 export const deleteOrganizationCompletely = async (organizationId) => {
-  return apiClient.delete(BASE_PATH, { organizationId, mode: 'complete' })
+  // タイムアウト前に中断された場合（completed: false）は続きから再開する
+  let result
+  for (let attempt = 0; attempt < MAX_DELETION_ATTEMPTS; attempt++) {
+    result = await apiClient.delete(BASE_PATH, { organizationId, mode: 'complete' })
+    if (result?.completed !== false) {
+      return result
+    }
+  }
+  throw new Error('Organization deletion did not complete')
 }
 
 export const getOrganization = async (organizationId) => {
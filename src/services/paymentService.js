@@ -36,8 +36,8 @@ export const updatePaymentMethod = async ({ token, customerId }) => {
   return response
 }
 
-export const getInvoices = async (customerId) => {
-  const response = await apiClient.post(`${BASE_PATH}/invoices`, { customerId })
+export const getInvoices = async (customerId, startingAfter = null) => {
+  const response = await apiClient.post(`${BASE_PATH}/invoices`, { customerId, startingAfter })
   return response
 }
 
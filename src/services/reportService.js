@@ -26,16 +26,16 @@ export const listMemberReports = async (memberUuid) => {
   return apiClient.get(`${BASE_PATH}/member/${memberUuid}`)
 }
 
-export const exportReports = async (organizationId) => {
-  return apiClient.get(`${BASE_PATH}/export`, { organizationId })
+export const exportReports = async (organizationId, options = {}) => {
+  return apiClient.get(`${BASE_PATH}/export`, { organizationId, ...options })
 }
 
 export const getReportStatus = async (organizationId, weekString) => {
   return apiClient.get(`${BASE_PATH}/status`, { organizationId, weekString })
 }
 
-export const getStatsData = async (organizationId) => {
-  return apiClient.get(`${BASE_PATH}/stats`, { organizationId })
+export const getStatsData = async (organizationId, weeks) => {
+  return apiClient.get(`${BASE_PATH}/stats`, { organizationId, weeks })
 }
 
 export const submitFeedback = async (memberUuid, weekString, feedback) => {